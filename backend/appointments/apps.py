@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class AppointmentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'appointments'
+    
+    def ready(self):
+        from .booking import install_constraints
+        post_migrate.connect(install_constraints, sender=self)
@@ -0,0 +1,156 @@
+"""
+Free appointment slots over a date range.
+
+Candidate slots come from the weekly `TimeSlot` template and from
+`available` exceptions (cut into `APPOINTMENT_SLOT_MINUTES` slots). Busy time
+is every `unavailable` exception and every appointment that is not
+cancelled. Both are loaded with one query each for the whole range, sorted,
+and compared in a single sweep: busy intervals are merged, and a slot is
+free when the first busy interval ending after its start also starts at or
+after its end. A range costs three queries and O((slots + busy) log) work,
+however many days it spans.
+
+Times are naive wall-clock times in the current time zone, as `TimeSlot`
+and `Appointment` store them; exception datetimes are converted to match.
+An appointment whose end time is not after its start time runs past
+midnight, so it can block the first slots of the next day.
+"""
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Appointment, AvailabilityException, TimeSlot
+
+# Statuses that leave the slot free for someone else
+FREEING_STATUSES = ('cancelled',)
+
+Slot = namedtuple('Slot', ['start', 'end'])
+
+
+def local_naive(value):
+    """An aware datetime as naive wall-clock time in the current time zone."""
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.replace(tzinfo=None)
+
+
+def days(start_date, end_date):
+    day = start_date
+    while day <= end_date:
+        yield day
+        day += timedelta(days=1)
+
+
+def appointment_slot(day, start_time, end_time):
+    """The interval an appointment occupies, ending the next day when it runs past midnight."""
+    start, end = datetime.combine(day, start_time), datetime.combine(day, end_time)
+    if end <= start:
+        end += timedelta(days=1)
+    return Slot(start, end)
+
+
+def template_slots(start_date, end_date):
+    """The weekly template expanded over every day of the range."""
+    weekly = {}
+    for slot in TimeSlot.objects.filter(is_active=True).only('day_of_week', 'start_time', 'end_time'):
+        weekly.setdefault(slot.day_of_week, []).append((slot.start_time, slot.end_time))
+    for day in days(start_date, end_date):
+        for start_time, end_time in weekly.get(day.weekday(), ()):
+            yield Slot(datetime.combine(day, start_time), datetime.combine(day, end_time))
+
+
+def cut(start, end, length):
+    """Whole `length` slots from `start` to `end`."""
+    while start + length <= end:
+        yield Slot(start, start + length)
+        start += length
+
+
+def load_intervals(start_date, end_date):
+    """`(candidate slots, busy intervals)` overlapping the range, in three queries."""
+    range_start = datetime.combine(start_date, datetime.min.time())
+    range_end = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+    aware_start, aware_end = (
+        timezone.make_aware(value) if settings.USE_TZ else value for value in (range_start, range_end)
+    )
+
+    candidates = list(template_slots(start_date, end_date))
+    busy = []
+    exceptions = AvailabilityException.objects.filter(
+        start_datetime__lt=aware_end, end_datetime__gt=aware_start
+    ).values_list('exception_type', 'start_datetime', 'end_datetime')
+    length = timedelta(minutes=settings.APPOINTMENT_SLOT_MINUTES)
+    for exception_type, start, end in exceptions:
+        start, end = max(local_naive(start), range_start), min(local_naive(end), range_end)
+        if exception_type == 'available':
+            candidates.extend(cut(start, end, length))
+        else:
+            busy.append(Slot(start, end))
+
+    # The day before the range for appointments running past midnight into it
+    appointments = (
+        Appointment.objects.filter(date__range=(start_date - timedelta(days=1), end_date))
+        .exclude(status__in=FREEING_STATUSES)
+        .values_list('date', 'start_time', 'end_time')
+    )
+    busy.extend(appointment_slot(*row) for row in appointments)
+    return candidates, busy
+
+
+def merge(intervals):
+    """Sorted, non-overlapping union of `intervals`."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1].end:
+            if end > merged[-1].end:
+                merged[-1] = Slot(merged[-1].start, end)
+        else:
+            merged.append(Slot(start, end))
+    return merged
+
+
+def sweep(candidates, busy):
+    """The distinct candidates, in order, that overlap no busy interval."""
+    busy = merge(busy)
+    free = []
+    position = 0
+    for slot in sorted(set(candidates)):
+        while position < len(busy) and busy[position].end <= slot.start:
+            position += 1
+        if position == len(busy) or busy[position].start >= slot.end:
+            free.append(slot)
+    return free
+
+
+def free_slots(start_date, end_date, now=None, exclude=None):
+    """Free slots from `start_date` to `end_date` inclusive, leaving out any that have started.
+
+    Appointment `exclude` does not count as busy, so it can move within its own time.
+    """
+    candidates, busy = load_intervals(start_date, end_date)
+    if exclude is not None:
+        own = appointment_slot(exclude.date, exclude.start_time, exclude.end_time)
+        if own in busy:
+            busy.remove(own)
+    now = local_naive(now or timezone.now())
+    return [slot for slot in sweep(candidates, busy) if slot.start > now]
+
+
+def find_free_slot(date, start_time, exclude=None):
+    """The free slot starting at `start_time` on `date`, or None."""
+    start = datetime.combine(date, start_time)
+    for slot in free_slots(date, date, exclude=exclude):
+        if slot.start == start:
+            return slot
+    return None
+
+
+def calendar(start_date, end_date, now=None):
+    """Free slots grouped by day, every day of the range included."""
+    by_day = {day: [] for day in days(start_date, end_date)}
+    for slot in free_slots(start_date, end_date, now):
+        by_day[slot.start.date()].append(slot)
+    return by_day
@@ -0,0 +1,146 @@
+"""
+Race-free booking and rescheduling.
+
+Checking that a slot is free and then inserting is not enough on its own:
+two requests can both pass the check before either commits. Each booking
+therefore runs in one transaction that first serializes writers of the same
+day, then re-checks the slot and saves, and the database refuses whatever
+still gets through:
+
+- On PostgreSQL, `pg_advisory_xact_lock` is taken on the day, so bookings of
+  different days never wait on each other. An exclusion constraint, created
+  on post_migrate because it cannot be declared portably in model Meta,
+  rejects any two active appointments whose time ranges overlap. A slot
+  whose end time is not after its start time runs past midnight. The
+  constraint is only added once the existing appointments satisfy it; until
+  then `migrate` reports the overlapping ones.
+- On SQLite, which allows one writer at a time, the transaction starts with
+  a write so it holds the database write lock from the start; concurrent
+  bookings queue on the busy timeout instead of failing to upgrade a read
+  lock.
+- Everywhere, the `appointment_active_slot` unique constraint rejects a
+  second active appointment at the same date and start time.
+
+A booking that loses the race gets an IntegrityError, which is reported the
+same way as a slot that was already taken.
+"""
+
+import logging
+
+from django.db import IntegrityError, connections, router, transaction
+
+from .availability import FREEING_STATUSES, find_free_slot
+from .models import Appointment
+
+# First key of the per-day advisory locks, so they cannot collide with other users of pg_advisory_xact_lock.
+ADVISORY_LOCK_NAMESPACE = 0x41505054
+# Versioned so a changed definition replaces the constraint installed before it.
+EXCLUSION_CONSTRAINT = 'appointment_no_overlap_2'
+PREVIOUS_EXCLUSION_CONSTRAINTS = ('appointment_no_overlap',)
+# Overlapping pairs listed when the constraint cannot be added.
+OVERLAPS_REPORTED = 10
+
+logger = logging.getLogger(__name__)
+
+
+def lock_day(day, using):
+    """Serialize writers of `day` until the current transaction ends."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [ADVISORY_LOCK_NAMESPACE, day.toordinal()])
+        elif connection.vendor == 'sqlite':
+            # A write that matches nothing still takes the write lock for the rest of the transaction.
+            cursor.execute(f'UPDATE {Appointment._meta.db_table} SET id = id WHERE 0')
+
+
+def book(date, start_time, **fields):
+    """Create an appointment in the free slot starting at `start_time` on `date`.
+    
+    Returns None when the slot is not free, including when a concurrent booking took it first.
+    """
+    using = router.db_for_write(Appointment)
+    try:
+        with transaction.atomic(using=using):
+            lock_day(date, using)
+            slot = find_free_slot(date, start_time)
+            if slot is None:
+                return None
+            return Appointment.objects.using(using).create(
+                date=date, start_time=slot.start.time(), end_time=slot.end.time(), **fields
+            )
+    except IntegrityError:
+        return None
+
+
+def reschedule(appointment, date, start_time):
+    """Move `appointment` to the free slot starting at `start_time` on `date`.
+    
+    Returns the appointment, or None when the slot is not free.
+    """
+    using = router.db_for_write(Appointment, instance=appointment)
+    try:
+        with transaction.atomic(using=using):
+            lock_day(date, using)
+            slot = find_free_slot(date, start_time, exclude=appointment)
+            if slot is None:
+                return None
+            appointment.date = date
+            appointment.start_time = slot.start.time()
+            appointment.end_time = slot.end.time()
+            appointment.save(using=using, update_fields=['date', 'start_time', 'end_time', 'updated_at'])
+    except IntegrityError:
+        appointment.refresh_from_db(fields=['date', 'start_time', 'end_time'])
+        return None
+    return appointment
+
+
+def slot_range(alias=''):
+    """SQL for the time range of an appointment row, running into the next day when it ends at or before its start."""
+    prefix = f'{alias}.' if alias else ''
+    return (
+        f'tsrange({prefix}"date" + {prefix}start_time, {prefix}"date" + {prefix}end_time + '
+        f"CASE WHEN {prefix}end_time <= {prefix}start_time THEN interval '1 day' ELSE interval '0' END)"
+    )
+
+
+def install_constraints(sender, using='default', stdout=None, **kwargs):
+    """post_migrate receiver adding the PostgreSQL exclusion constraint on overlapping appointments.
+    
+    Existing overlaps would make the ALTER TABLE fail and break `migrate`, so they are reported
+    instead and the constraint is added by the first `migrate` after they are resolved.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    table = Appointment._meta.db_table
+    freeing = ', '.join(f"'{status}'" for status in FREEING_STATUSES)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_constraint WHERE conname = %s', [EXCLUSION_CONSTRAINT])
+        if cursor.fetchone():
+            return
+        cursor.execute(
+            f'SELECT a.id, b.id FROM {table} a JOIN {table} b ON a.id < b.id '
+            f'AND {slot_range("a")} && {slot_range("b")} '
+            f'WHERE a.status NOT IN ({freeing}) AND b.status NOT IN ({freeing}) '
+            f'ORDER BY a.id, b.id LIMIT {OVERLAPS_REPORTED}'
+        )
+        overlaps = cursor.fetchall()
+        if overlaps:
+            message = (
+                f'Not adding {EXCLUSION_CONSTRAINT}: these active appointments overlap (ids): '
+                f'{", ".join(f"{first} and {second}" for first, second in overlaps)}. '
+                'Cancel or move them and run migrate again.'
+            )
+            if stdout is not None:
+                stdout.write(message)
+            logger.warning(message)
+            return
+        with transaction.atomic(using=using):
+            for name in PREVIOUS_EXCLUSION_CONSTRAINTS:
+                cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}')
+            cursor.execute(
+                f'ALTER TABLE {table} ADD CONSTRAINT {EXCLUSION_CONSTRAINT} '
+                f'EXCLUDE USING gist ({slot_range()} WITH &&) '
+                f'WHERE (status NOT IN ({freeing}))'
+            )
@@ -0,0 +1,80 @@
+import statistics
+import time as clock
+from datetime import datetime, time, timedelta
+
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from appointments.availability import free_slots
+from appointments.models import Appointment, AvailabilityException, TimeSlot
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the free slot calculation over a dense calendar. The calendar is built '
+        'inside a transaction that is rolled back, so existing data is left untouched.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90)
+        parser.add_argument('--runs', type=int, default=20)
+        parser.add_argument('--slot-minutes', type=int, default=30)
+    
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            start_date = timezone.localdate() + timedelta(days=1)
+            end_date = start_date + timedelta(days=options['days'] - 1)
+            self.build_calendar(start_date, end_date, options['slot_minutes'])
+            
+            timings = []
+            with CaptureQueriesContext(connection) as queries:
+                for _ in range(options['runs']):
+                    started = clock.perf_counter()
+                    slots = free_slots(start_date, end_date)
+                    timings.append(clock.perf_counter() - started)
+            transaction.set_rollback(True)
+        
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(slots)} free slots over {options["days"]} days: '
+            f'median {statistics.median(timings) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms, '
+            f'{len(queries) // options["runs"]} queries per run.'
+        ))
+    
+    def build_calendar(self, start_date, end_date, slot_minutes):
+        """Weekday slots from 8:00 to 20:00, every other one booked, and an afternoon off each week."""
+        length = timedelta(minutes=slot_minutes)
+        starts = []
+        start = datetime.combine(start_date, time(8))
+        while start + length <= datetime.combine(start_date, time(20)):
+            starts.append(start)
+            start += length
+        TimeSlot.objects.bulk_create(
+            TimeSlot(day_of_week=day, start_time=start.time(), end_time=(start + length).time())
+            for day in range(5) for start in starts
+        )
+        
+        appointments = []
+        exceptions = []
+        day = start_date
+        while day <= end_date:
+            if day.weekday() < 5:
+                appointments.extend(
+                    Appointment(
+                        date=day, start_time=start.time(), end_time=(start + length).time(),
+                        first_name='Load', last_name='Test', email='load@example.com',
+                    )
+                    for start in starts[::2]
+                )
+            if day.weekday() == 2:
+                exceptions.append(AvailabilityException(
+                    description='Afternoon off',
+                    start_datetime=timezone.make_aware(datetime.combine(day, time(14))),
+                    end_datetime=timezone.make_aware(datetime.combine(day, time(18))),
+                ))
+            day += timedelta(days=1)
+        Appointment.objects.bulk_create(appointments, batch_size=500)
+        AvailabilityException.objects.bulk_create(exceptions)
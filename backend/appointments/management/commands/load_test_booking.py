@@ -0,0 +1,101 @@
+import random
+import time as clock
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from appointments.availability import FREEING_STATUSES
+from appointments.booking import book
+from appointments.models import Appointment, AvailabilityException
+
+LOAD_TEST_EMAIL = 'load-test@example.com'
+
+
+def double_bookings(start_date, end_date):
+    """Pairs of active appointments in the range whose times overlap."""
+    rows = (
+        Appointment.objects.filter(date__range=(start_date, end_date))
+        .exclude(status__in=FREEING_STATUSES)
+        .order_by('date', 'start_time')
+        .values_list('date', 'start_time', 'end_time')
+    )
+    overlaps = 0
+    previous = None
+    for day, start_time, end_time in rows:
+        if previous and previous[0] == day and start_time < previous[1]:
+            overlaps += 1
+        if not previous or previous[0] != day or end_time > previous[1]:
+            previous = (day, end_time)
+    return overlaps
+
+
+class Command(BaseCommand):
+    help = (
+        'Have many threads book the same slots at once and check that no slot is booked twice. '
+        'The slots are opened by a temporary availability exception on days far ahead, and '
+        'everything the test creates is deleted afterwards.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--days', type=int, default=1)
+        parser.add_argument('--offset-days', type=int, default=3650, help='How far ahead the test days are.')
+    
+    def handle(self, *args, **options):
+        start_date = timezone.localdate() + timedelta(days=options['offset_days'])
+        end_date = start_date + timedelta(days=options['days'] - 1)
+        opening = AvailabilityException.objects.create(
+            exception_type='available', description='Booking load test',
+            start_datetime=timezone.make_aware(datetime.combine(start_date, time(8))),
+            end_datetime=timezone.make_aware(datetime.combine(end_date, time(20))),
+        )
+        length = timedelta(minutes=settings.APPOINTMENT_SLOT_MINUTES)
+        slots = []
+        day = start_date
+        while day <= end_date:
+            start = datetime.combine(day, time(8))
+            while start + length <= datetime.combine(day, time(20)):
+                slots.append((day, start.time()))
+                start += length
+            day += timedelta(days=1)
+        
+        def attempt_all(worker):
+            # Every thread tries every slot, each in its own order.
+            outcomes = Counter()
+            order = random.Random(worker).sample(slots, len(slots))
+            try:
+                for day, start_time in order:
+                    try:
+                        appointment = book(
+                            day, start_time, first_name='Load', last_name=f'Test {worker}', email=LOAD_TEST_EMAIL,
+                        )
+                    except DatabaseError:
+                        outcomes['errors'] += 1
+                    else:
+                        outcomes['booked' if appointment else 'conflicts'] += 1
+            finally:
+                connection.close()
+            return outcomes
+        
+        try:
+            started = clock.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                outcomes = sum(pool.map(attempt_all, range(options['threads'])), Counter())
+            elapsed = clock.perf_counter() - started
+            overlaps = double_bookings(start_date, end_date)
+        finally:
+            Appointment.objects.filter(date__range=(start_date, end_date), email=LOAD_TEST_EMAIL).delete()
+            opening.delete()
+        
+        attempts = len(slots) * options['threads']
+        report = (
+            f'{options["threads"]} threads made {attempts} booking attempts on {len(slots)} slots in '
+            f'{elapsed:.2f} s ({attempts / elapsed:.0f} attempts/s): {outcomes["booked"]} booked, '
+            f'{outcomes["conflicts"]} conflicts, {outcomes["errors"]} errors, {overlaps} double bookings.'
+        )
+        self.stdout.write(self.style.SUCCESS(report) if not overlaps else self.style.ERROR(report))
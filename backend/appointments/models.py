@@ -53,6 +53,13 @@ class Appointment(models.Model):
     
     class Meta:
         ordering = ['date', 'start_time']
+        constraints = [
+            # One active appointment per slot; cancelled ones free it (see appointments.booking)
+            models.UniqueConstraint(
+                fields=['date', 'start_time'], condition=~models.Q(status='cancelled'),
+                name='appointment_active_slot',
+            ),
+        ]
     
     def __str__(self):
         return f"Appointment for {self.first_name} {self.last_name} on {self.date} at {self.start_time}"
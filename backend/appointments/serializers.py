@@ -1,5 +1,9 @@
+from datetime import timedelta
+
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.utils import timezone
 from services.serializers import ServiceSerializer, ServicePackageSerializer
 from .models import TimeSlot, Appointment, AppointmentReminder, AvailabilityException
 
@@ -14,22 +18,18 @@ class UserBasicSerializer(serializers.ModelSerializer):
 
 class TimeSlotSerializer(serializers.ModelSerializer):
     """Serializer for the TimeSlot model."""
-    service = ServiceSerializer(read_only=True)
-    service_id = serializers.PrimaryKeyRelatedField(
-        queryset=ServiceSerializer.Meta.model.objects.all(),
-        source='service',
-        write_only=True,
-        required=False,
-        allow_null=True
-    )
     
     class Meta:
         model = TimeSlot
-        fields = [
-            'id', 'day_of_week', 'start_time', 'end_time', 'service', 'service_id',
-            'is_available', 'created_at', 'updated_at'
-        ]
-        read_only_fields = ['created_at', 'updated_at']
+        fields = ['id', 'day_of_week', 'start_time', 'end_time', 'is_active']
+    
+    def validate(self, attrs):
+        """Validate that the slot ends after it starts."""
+        start_time = attrs.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = attrs.get('end_time', getattr(self.instance, 'end_time', None))
+        if start_time and end_time and end_time <= start_time:
+            raise serializers.ValidationError("end_time must be after start_time.")
+        return attrs
 
 
 class AppointmentReminderSerializer(serializers.ModelSerializer):
@@ -38,10 +38,10 @@ class AppointmentReminderSerializer(serializers.ModelSerializer):
     class Meta:
         model = AppointmentReminder
         fields = [
-            'id', 'appointment', 'reminder_type', 'reminder_time', 'is_sent',
-            'sent_at', 'created_at', 'updated_at'
+            'id', 'appointment', 'reminder_type', 'scheduled_time', 'status',
+            'sent_at', 'error_message', 'created_at'
         ]
-        read_only_fields = ['is_sent', 'sent_at', 'created_at', 'updated_at']
+        read_only_fields = ['status', 'sent_at', 'error_message', 'created_at']
 
 
 class AvailabilityExceptionSerializer(serializers.ModelSerializer):
@@ -49,12 +49,16 @@ class AvailabilityExceptionSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = AvailabilityException
-        fields = [
-            'id', 'title', 'description', 'start_datetime', 'end_datetime',
-            'is_recurring', 'recurrence_pattern', 'recurrence_end_date',
-            'created_at', 'updated_at'
-        ]
-        read_only_fields = ['created_at', 'updated_at']
+        fields = ['id', 'exception_type', 'description', 'start_datetime', 'end_datetime', 'created_at']
+        read_only_fields = ['created_at']
+    
+    def validate(self, attrs):
+        """Validate that the exception ends after it starts."""
+        start = attrs.get('start_datetime', getattr(self.instance, 'start_datetime', None))
+        end = attrs.get('end_datetime', getattr(self.instance, 'end_datetime', None))
+        if start and end and end <= start:
+            raise serializers.ValidationError("end_datetime must be after start_datetime.")
+        return attrs
 
 
 class AppointmentSerializer(serializers.ModelSerializer):
@@ -63,7 +67,9 @@ class AppointmentSerializer(serializers.ModelSerializer):
     user_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(),
         source='user',
-        write_only=True
+        write_only=True,
+        required=False,
+        allow_null=True
     )
     service = ServiceSerializer(read_only=True)
     service_id = serializers.PrimaryKeyRelatedField(
@@ -86,11 +92,11 @@ class AppointmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Appointment
         fields = [
-            'id', 'appointment_number', 'user', 'user_id', 'service', 'service_id',
-            'package', 'package_id', 'date', 'start_time', 'end_time', 'status',
-            'notes', 'location', 'meeting_link', 'reminders', 'created_at', 'updated_at'
+            'id', 'appointment_id', 'user', 'user_id', 'service', 'service_id',
+            'package', 'package_id', 'date', 'start_time', 'end_time', 'first_name',
+            'last_name', 'email', 'phone', 'notes', 'status', 'reminders', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['appointment_number', 'created_at', 'updated_at']
+        read_only_fields = ['appointment_id', 'created_at', 'updated_at']
         
     def validate(self, attrs):
         """Validate that at least one of service or package is provided."""
@@ -111,8 +117,11 @@ class AppointmentBookingSerializer(serializers.Serializer):
     package_id = serializers.IntegerField(required=False, allow_null=True)
     date = serializers.DateField(required=True)
     start_time = serializers.TimeField(required=True)
+    first_name = serializers.CharField(max_length=100, required=False)
+    last_name = serializers.CharField(max_length=100, required=False)
+    email = serializers.EmailField(required=False)
+    phone = serializers.CharField(max_length=20, required=False, allow_blank=True)
     notes = serializers.CharField(required=False, allow_blank=True)
-    location = serializers.CharField(required=False, allow_blank=True)
     
     def validate(self, attrs):
         """Validate that at least one of service_id or package_id is provided."""
@@ -128,14 +137,25 @@ class AppointmentBookingSerializer(serializers.Serializer):
 
 
 class AppointmentRescheduleSerializer(serializers.Serializer):
-    """Serializer for rescheduling appointments."""
-    appointment_id = serializers.UUIDField(required=True)
+    """Serializer for rescheduling appointments; the appointment comes from the URL."""
     new_date = serializers.DateField(required=True)
     new_start_time = serializers.TimeField(required=True)
 
 
 class AvailableSlotsSerializer(serializers.Serializer):
-    """Serializer for available time slots."""
-    date = serializers.DateField(required=False)
-    service_id = serializers.IntegerField(required=False)
-    package_id = serializers.IntegerField(required=False)
+    """Serializer for the date range of an availability query."""
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    
+    def validate(self, attrs):
+        """Default to two weeks from today and cap the range at AVAILABILITY_MAX_DAYS."""
+        start_date = attrs.get('start_date') or timezone.localdate()
+        end_date = attrs.get('end_date') or start_date + timedelta(days=13)
+        if end_date < start_date:
+            raise serializers.ValidationError("end_date must not be before start_date.")
+        if (end_date - start_date).days >= settings.AVAILABILITY_MAX_DAYS:
+            raise serializers.ValidationError(
+                f"A range may span at most {settings.AVAILABILITY_MAX_DAYS} days."
+            )
+        return {'start_date': start_date, 'end_date': end_date}
+
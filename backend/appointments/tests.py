@@ -1,3 +1,233 @@
-from django.test import TestCase
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from services.models import Service, ServiceCategory
+
+from .availability import Slot, calendar, free_slots, merge, sweep
+from .booking import book, reschedule
+from .models import Appointment, AvailabilityException, TimeSlot
+
+
+def next_monday():
+    today = timezone.localdate()
+    return today + timedelta(days=7 - today.weekday())
+
+
+def at(day, hour, minute=0):
+    return datetime.combine(day, time(hour, minute))
+
+
+class SweepTests(TestCase):
+    """The interval sweep keeps exactly the candidates no busy interval touches."""
+    
+    def test_merge_and_sweep(self):
+        day = date(2030, 1, 7)
+        busy = [Slot(at(day, 11), at(day, 12)), Slot(at(day, 9, 30), at(day, 10, 30)), Slot(at(day, 10), at(day, 11))]
+        self.assertEqual(merge(busy), [Slot(at(day, 9, 30), at(day, 12))])
+        
+        candidates = [Slot(at(day, hour), at(day, hour + 1)) for hour in (8, 9, 12, 13, 8)]
+        self.assertEqual(
+            sweep(candidates, busy),
+            [Slot(at(day, 8), at(day, 9)), Slot(at(day, 12), at(day, 13)), Slot(at(day, 13), at(day, 14))],
+        )
+
+
+@override_settings(ROOT_URLCONF='appointments.urls', APPOINTMENT_SLOT_MINUTES=60)
+class AvailabilityTests(TestCase):
+    """Free slots expand the weekly template minus exceptions and booked appointments."""
+    
+    def setUp(self):
+        self.monday = next_monday()
+        for day in range(5):
+            for hour in (9, 10, 11):
+                TimeSlot.objects.create(day_of_week=day, start_time=time(hour), end_time=time(hour + 1))
+        TimeSlot.objects.create(day_of_week=0, start_time=time(14), end_time=time(15), is_active=False)
+    
+    def book(self, day, hour, status='pending'):
+        return Appointment.objects.create(
+            date=day, start_time=time(hour), end_time=time(hour + 1),
+            first_name='Ada', last_name='Lovelace', email='ada@example.com', status=status,
+        )
+    
+    def hours(self, slots):
+        return [slot.start.hour for slot in slots]
+    
+    def test_template_exceptions_and_appointments(self):
+        tuesday, saturday = self.monday + timedelta(days=1), self.monday + timedelta(days=5)
+        self.book(self.monday, 9)
+        self.book(self.monday, 10, status='cancelled')
+        AvailabilityException.objects.create(
+            description='Dentist', start_datetime=timezone.make_aware(at(tuesday, 10, 30)),
+            end_datetime=timezone.make_aware(at(tuesday, 11, 15)),
+        )
+        AvailabilityException.objects.create(
+            description='Open Saturday', exception_type='available',
+            start_datetime=timezone.make_aware(at(saturday, 10)), end_datetime=timezone.make_aware(at(saturday, 12, 30)),
+        )
+        
+        days = calendar(self.monday, saturday)
+        
+        self.assertEqual(self.hours(days[self.monday]), [10, 11])
+        self.assertEqual(self.hours(days[tuesday]), [9])
+        self.assertEqual(self.hours(days[saturday]), [10, 11])
+        self.assertEqual(len(days), 6)
+    
+    def test_started_slots_are_left_out(self):
+        now = timezone.make_aware(at(self.monday, 10, 15))
+        self.assertEqual(self.hours(free_slots(self.monday, self.monday, now=now)), [11])
+    
+    def test_overnight_appointments_block_the_next_day(self):
+        sunday = self.monday - timedelta(days=1)
+        Appointment.objects.create(
+            date=sunday, start_time=time(23), end_time=time(9, 30),
+            first_name='Ada', last_name='Lovelace', email='ada@example.com',
+        )
+        self.assertEqual(self.hours(free_slots(self.monday, self.monday)), [10, 11])
+    
+    def test_queries_do_not_grow_with_the_range(self):
+        for offset in range(0, 90, 3):
+            self.book(self.monday + timedelta(days=offset), 9)
+        with CaptureQueriesContext(connection) as queries:
+            slots = free_slots(self.monday, self.monday + timedelta(days=89))
+        self.assertEqual(len(queries), 3)
+        # 65 weekdays of three slots, less the booked ones that fall on weekdays
+        booked_weekdays = sum(1 for offset in range(0, 90, 3) if (self.monday + timedelta(days=offset)).weekday() < 5)
+        self.assertEqual(len(slots), 65 * 3 - booked_weekdays)
+    
+    def test_range_endpoint(self):
+        response = self.client.get(reverse('available-slots'), {
+            'start_date': self.monday.isoformat(), 'end_date': (self.monday + timedelta(days=6)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        days = response.json()['days']
+        self.assertEqual(len(days), 7)
+        self.assertEqual(days[0]['slots'][0], {'start_time': '09:00', 'end_time': '10:00'})
+        self.assertEqual(days[6]['slots'], [])
+        
+        too_long = self.client.get(reverse('available-slots'), {
+            'start_date': self.monday.isoformat(), 'end_date': (self.monday + timedelta(days=200)).isoformat(),
+        })
+        self.assertEqual(too_long.status_code, 400)
+    
+    def test_date_endpoint(self):
+        self.book(self.monday, 11)
+        response = self.client.get(reverse('available-slots-for-date', args=[self.monday.isoformat()]))
+        self.assertEqual([slot['start_time'] for slot in response.json()['slots']], ['09:00', '10:00'])
+        self.assertEqual(self.client.get(reverse('available-slots-for-date', args=['soon'])).status_code, 400)
+
+
+@override_settings(ROOT_URLCONF='appointments.urls')
+class BookingTests(TestCase):
+    """Bookings take free slots only; rescheduling and cancelling move or free them."""
+    
+    def setUp(self):
+        self.monday = next_monday()
+        for hour in (9, 10):
+            TimeSlot.objects.create(day_of_week=0, start_time=time(hour), end_time=time(hour + 1))
+        self.user = User.objects.create_user('client', email='client@example.com', first_name='Grace', last_name='Hopper')
+        self.service = Service.objects.create(
+            name='Mock interview', short_description='Short', description='<p>Long</p>',
+            category=ServiceCategory.objects.create(name='Interviews'), price=Decimal('80.00'),
+        )
+    
+    def book(self, hour, **data):
+        return self.client.post(reverse('book-appointment'), {
+            'date': self.monday.isoformat(), 'start_time': f'{hour:02d}:00', 'service_id': self.service.pk, **data,
+        }, content_type='application/json')
+    
+    def test_book_reschedule_cancel(self):
+        self.client.force_login(self.user)
+        response = self.book(9)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['end_time'], response.json()['email']), ('10:00:00', 'client@example.com'))
+        self.assertEqual(self.book(9).status_code, 409)
+        # Not a template slot
+        self.assertEqual(self.book(12).status_code, 409)
+        
+        appointment_id = response.json()['appointment_id']
+        moved = self.client.post(
+            reverse('reschedule-appointment', args=[appointment_id]),
+            {'new_date': self.monday.isoformat(), 'new_start_time': '10:00'}, content_type='application/json',
+        )
+        self.assertEqual(moved.json()['start_time'], '10:00:00')
+        self.assertEqual(self.book(9).status_code, 201)
+        
+        self.client.post(reverse('cancel-appointment', args=[appointment_id]))
+        self.assertEqual(self.book(10).status_code, 201)
+        self.assertEqual(len(self.client.get(reverse('my-appointments')).json()), 3)
+    
+    def test_anonymous_bookings_need_contact_details(self):
+        self.assertEqual(self.book(9).status_code, 400)
+        response = self.book(9, first_name='Ada', last_name='Lovelace', email='ada@example.com')
+        self.assertEqual(response.status_code, 201)
+
+
+class RaceTests(TestCase):
+    """The database refuses a second active appointment in a slot, and losing that race reads as a taken slot."""
+    
+    def setUp(self):
+        self.monday = next_monday()
+        for hour in (9, 10):
+            TimeSlot.objects.create(day_of_week=0, start_time=time(hour), end_time=time(hour + 1))
+        self.contact = {'first_name': 'Ada', 'last_name': 'Lovelace', 'email': 'ada@example.com'}
+    
+    def test_active_slot_constraint(self):
+        slot = {'date': self.monday, 'start_time': time(9), 'end_time': time(10), **self.contact}
+        Appointment.objects.create(status='cancelled', **slot)
+        Appointment.objects.create(**slot)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Appointment.objects.create(**slot)
+    
+    def test_losing_the_race_is_a_conflict(self):
+        taken = book(self.monday, time(9), **self.contact)
+        other = book(self.monday, time(10), **self.contact)
+        # As if the slot had still been free when checked
+        stale = Slot(at(self.monday, 9), at(self.monday, 10))
+        with mock.patch('appointments.booking.find_free_slot', return_value=stale):
+            self.assertIsNone(book(self.monday, time(9), **self.contact))
+            self.assertIsNone(reschedule(other, self.monday, time(9)))
+        self.assertEqual(other.start_time, time(10))
+        self.assertEqual(Appointment.objects.filter(date=self.monday, start_time=time(9)).get(), taken)
+    
+    @override_settings(ROOT_URLCONF='appointments.urls')
+    def test_staff_writes_to_a_taken_slot_are_a_conflict(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        taken = book(self.monday, time(9), **self.contact)
+        other = book(self.monday, time(10), **self.contact)
+        service = Service.objects.create(
+            name='Mock interview', short_description='Short', description='<p>Long</p>',
+            category=ServiceCategory.objects.create(name='Interviews'), price=Decimal('80.00'),
+        )
+        slot = {
+            'date': self.monday.isoformat(), 'start_time': '09:00', 'end_time': '10:00',
+            'service_id': service.pk, **self.contact,
+        }
+        
+        created = self.client.post(reverse('appointment-list'), slot, content_type='application/json')
+        self.assertEqual(created.status_code, 409)
+        updated = self.client.put(reverse('appointment-detail', args=[other.pk]), slot, content_type='application/json')
+        self.assertEqual(updated.status_code, 409)
+        self.assertEqual(Appointment.objects.filter(date=self.monday, start_time=time(9)).get(), taken)
+
+
+@override_settings(APPOINTMENT_SLOT_MINUTES=60)
+class LoadTestTests(TransactionTestCase):
+    """Concurrent bookings of the same slots never double-book."""
+    
+    def test_load_test_command(self):
+        out = StringIO()
+        call_command('load_test_booking', '--threads', '8', stdout=out)
+        self.assertIn(' 12 booked', out.getvalue())
+        self.assertIn(' 0 double bookings', out.getvalue())
+        self.assertFalse(Appointment.objects.exists())
+        self.assertFalse(AvailabilityException.objects.exists())
@@ -1,3 +1,238 @@
-from django.shortcuts import render
+from datetime import date as date_type
 
-# Create your views here.
+from django.db import IntegrityError, transaction
+from django.shortcuts import get_object_or_404
+
+from rest_framework import viewsets, status
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+
+from services.models import Service, ServicePackage
+from .availability import calendar, free_slots
+from .booking import book, reschedule
+from .models import TimeSlot, Appointment, AvailabilityException
+from .serializers import (
+    TimeSlotSerializer, AppointmentSerializer, AvailabilityExceptionSerializer,
+    AppointmentBookingSerializer, AppointmentRescheduleSerializer, AvailableSlotsSerializer
+)
+
+# Appointments that can no longer be moved or cancelled
+CLOSED_STATUSES = ('cancelled', 'completed', 'no_show')
+
+
+def slot_data(slot):
+    return {'start_time': slot.start.strftime('%H:%M'), 'end_time': slot.end.strftime('%H:%M')}
+
+
+def appointments_for(user):
+    """The appointments `user` may see: all of them for staff, otherwise their own."""
+    queryset = Appointment.objects.select_related(
+        'user', 'service__category', 'package'
+    ).prefetch_related('reminders')
+    if user.is_staff:
+        return queryset
+    return queryset.filter(user=user)
+
+
+class TimeSlotViewSet(viewsets.ModelViewSet):
+    """ViewSet for the weekly TimeSlot template."""
+    queryset = TimeSlot.objects.all()
+    serializer_class = TimeSlotSerializer
+    
+    def get_permissions(self):
+        """Set permissions based on action."""
+        if self.action in ['list', 'retrieve']:
+            permission_classes = [AllowAny]
+        else:
+            permission_classes = [IsAdminUser]
+        return [permission() for permission in permission_classes]
+    
+    def get_queryset(self):
+        """Filter queryset based on user permissions."""
+        queryset = TimeSlot.objects.all()
+        
+        # Filter active slots for non-admin users
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(is_active=True)
+        
+        return queryset
+
+
+class AvailabilityExceptionViewSet(viewsets.ModelViewSet):
+    """ViewSet for the AvailabilityException model."""
+    queryset = AvailabilityException.objects.all()
+    serializer_class = AvailabilityExceptionSerializer
+    permission_classes = [IsAdminUser]
+
+
+class AppointmentViewSet(viewsets.ModelViewSet):
+    """ViewSet for the Appointment model."""
+    queryset = Appointment.objects.all()
+    serializer_class = AppointmentSerializer
+    
+    def get_permissions(self):
+        """Set permissions based on action."""
+        if self.action in ['list', 'retrieve']:
+            permission_classes = [IsAuthenticated]
+        else:
+            permission_classes = [IsAdminUser]
+        return [permission() for permission in permission_classes]
+    
+    def get_queryset(self):
+        """Filter queryset based on user permissions and query parameters."""
+        queryset = appointments_for(self.request.user)
+        
+        # Filter by status
+        appointment_status = self.request.query_params.get('status', None)
+        if appointment_status:
+            queryset = queryset.filter(status=appointment_status)
+        
+        return queryset
+    
+    def create(self, request, *args, **kwargs):
+        # Staff writes skip book(), so the database constraints are what refuse a taken slot.
+        try:
+            with transaction.atomic():
+                return super().create(request, *args, **kwargs)
+        except IntegrityError:
+            return Response({'error': 'This slot is not available.'}, status=status.HTTP_409_CONFLICT)
+    
+    def update(self, request, *args, **kwargs):
+        try:
+            with transaction.atomic():
+                return super().update(request, *args, **kwargs)
+        except IntegrityError:
+            return Response({'error': 'This slot is not available.'}, status=status.HTTP_409_CONFLICT)
+
+
+class AvailableSlotsView(APIView):
+    """View for getting the free slots of a date range, day by day."""
+    permission_classes = [AllowAny]
+    
+    def get(self, request):
+        serializer = AvailableSlotsSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        start_date, end_date = serializer.validated_data['start_date'], serializer.validated_data['end_date']
+        days = calendar(start_date, end_date)
+        return Response({
+            'start_date': start_date,
+            'end_date': end_date,
+            'days': [
+                {'date': day, 'slots': [slot_data(slot) for slot in slots]}
+                for day, slots in days.items()
+            ],
+        })
+
+
+class AvailableSlotsForDateView(APIView):
+    """View for getting the free slots of one date."""
+    permission_classes = [AllowAny]
+    
+    def get(self, request, date):
+        try:
+            day = date_type.fromisoformat(date)
+        except ValueError:
+            return Response({'error': 'Use a YYYY-MM-DD date.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'date': day,
+            'slots': [slot_data(slot) for slot in free_slots(day, day)],
+        })
+
+
+class BookAppointmentView(APIView):
+    """View for booking a free slot."""
+    permission_classes = [AllowAny]
+    
+    def post(self, request):
+        serializer = AppointmentBookingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        user = request.user if request.user.is_authenticated else None
+        
+        contact = {
+            'first_name': data.get('first_name') or (user.first_name if user else ''),
+            'last_name': data.get('last_name') or (user.last_name if user else ''),
+            'email': data.get('email') or (user.email if user else ''),
+        }
+        missing = [name for name, value in contact.items() if not value]
+        if missing:
+            return Response(
+                {name: ['This field is required.'] for name in missing}, status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        service = package = None
+        if data.get('service_id'):
+            service = get_object_or_404(Service, pk=data['service_id'], is_active=True)
+        if data.get('package_id'):
+            package = get_object_or_404(ServicePackage, pk=data['package_id'], is_active=True)
+        
+        appointment = book(
+            data['date'],
+            data['start_time'],
+            user=user,
+            service=service,
+            package=package,
+            phone=data.get('phone', ''),
+            notes=data.get('notes', ''),
+            **contact,
+        )
+        if appointment is None:
+            return Response({'error': 'This slot is not available.'}, status=status.HTTP_409_CONFLICT)
+        return Response(AppointmentSerializer(appointment).data, status=status.HTTP_201_CREATED)
+
+
+class RescheduleAppointmentView(APIView):
+    """View for moving an appointment to another free slot."""
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, appointment_id):
+        appointment = get_object_or_404(appointments_for(request.user), appointment_id=appointment_id)
+        if appointment.status in CLOSED_STATUSES:
+            return Response(
+                {'error': f'A {appointment.get_status_display().lower()} appointment cannot be rescheduled.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = AppointmentRescheduleSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        if reschedule(appointment, data['new_date'], data['new_start_time']) is None:
+            return Response({'error': 'This slot is not available.'}, status=status.HTTP_409_CONFLICT)
+        return Response(AppointmentSerializer(appointment).data)
+
+
+class CancelAppointmentView(APIView):
+    """View for cancelling an appointment, which frees its slot."""
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, appointment_id):
+        appointment = get_object_or_404(appointments_for(request.user), appointment_id=appointment_id)
+        if appointment.status in CLOSED_STATUSES:
+            return Response(
+                {'error': f'A {appointment.get_status_display().lower()} appointment cannot be cancelled.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        appointment.status = 'cancelled'
+        appointment.save(update_fields=['status', 'updated_at'])
+        return Response(AppointmentSerializer(appointment).data)
+
+
+class UserAppointmentsView(APIView):
+    """View for getting the current user's appointments."""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        appointments = appointments_for(request.user).filter(user=request.user)
+        serializer = AppointmentSerializer(appointments, many=True)
+        return Response(serializer.data)
+
+
+class AppointmentDetailsView(APIView):
+    """View for getting one of the current user's appointments."""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, appointment_id):
+        appointment = get_object_or_404(appointments_for(request.user), appointment_id=appointment_id)
+        serializer = AppointmentSerializer(appointment)
+        return Response(serializer.data)
@@ -1,9 +1,13 @@
 from django.contrib import admin
 from django.utils import timezone
-from .models import BlogCategory, BlogPost, Comment, RelatedResource
+from mptt.admin import MPTTModelAdmin
+from .comment_counts import refresh_comment_counts
+from .models import BlogCategory, BlogPost, BlogTagStats, Comment, RelatedResource
+from .signals import posts_published
+from .tag_stats import refresh_tag_stats
 
 @admin.register(BlogCategory)
-class BlogCategoryAdmin(admin.ModelAdmin):
+class BlogCategoryAdmin(MPTTModelAdmin):
     list_display = ('name', 'slug', 'parent', 'order', 'is_active')
     list_filter = ('is_active', 'parent')
     search_fields = ('name', 'description')
@@ -35,11 +39,11 @@ class RelatedResourceInline(admin.TabularInline):
 
 @admin.register(BlogPost)
 class BlogPostAdmin(admin.ModelAdmin):
-    list_display = ('title', 'author', 'category', 'status', 'is_featured', 'view_count', 'created_at', 'published_at')
+    list_display = ('title', 'author', 'category', 'status', 'is_featured', 'view_count', 'approved_comment_count', 'created_at', 'published_at')
     list_filter = ('status', 'is_featured', 'category', 'created_at', 'published_at')
     search_fields = ('title', 'excerpt', 'content')
     prepopulated_fields = {'slug': ('title',)}
-    readonly_fields = ('view_count', 'created_at', 'updated_at')
+    readonly_fields = ('view_count', 'approved_comment_count', 'created_at', 'updated_at')
     inlines = [RelatedResourceInline, CommentInline]
     actions = ['make_published']
     fieldsets = (
@@ -53,7 +57,7 @@ class BlogPostAdmin(admin.ModelAdmin):
             'fields': ('status', 'published_at', 'is_featured', 'tags')
         }),
         ('Statistics', {
-            'fields': ('view_count',),
+            'fields': ('view_count', 'approved_comment_count'),
             'classes': ('collapse',),
         }),
         ('Timestamps', {
@@ -63,7 +67,10 @@ class BlogPostAdmin(admin.ModelAdmin):
     )
     
     def make_published(self, request, queryset):
+        post_ids = list(queryset.values_list('pk', flat=True))
         updated = queryset.update(status='published', published_at=timezone.now())
+        # A bulk update skips post_save; this brings the same derived data up to date.
+        posts_published.send(sender=BlogPost, post_ids=post_ids)
         self.message_user(request, f'{updated} posts were marked as published.')
     make_published.short_description = "Mark selected posts as published"
 
@@ -72,11 +79,12 @@ class CommentAdmin(admin.ModelAdmin):
     list_display = ('name', 'email', 'post', 'is_approved', 'created_at')
     list_filter = ('is_approved', 'created_at')
     search_fields = ('name', 'email', 'content', 'post__title')
-    readonly_fields = ('created_at',)
+    # The thread position is fixed when a comment is created
+    readonly_fields = ('parent', 'depth', 'created_at')
     actions = ['approve_comments']
     fieldsets = (
         (None, {
-            'fields': ('post', 'name', 'email')
+            'fields': ('post', 'parent', 'depth', 'name', 'email')
         }),
         ('Content', {
             'fields': ('content', 'is_approved')
@@ -88,6 +96,24 @@ class CommentAdmin(admin.ModelAdmin):
     )
     
     def approve_comments(self, request, queryset):
+        # A bulk update skips the comment signals, so recount the affected posts.
+        post_ids = set(queryset.values_list('post_id', flat=True))
         updated = queryset.update(is_approved=True)
+        refresh_comment_counts(post_ids)
         self.message_user(request, f'{updated} comments were approved.')
     approve_comments.short_description = "Approve selected comments"
+
+@admin.register(BlogTagStats)
+class BlogTagStatsAdmin(admin.ModelAdmin):
+    list_display = ('tag', 'post_count', 'updated_at')
+    search_fields = ('tag__name',)
+    readonly_fields = ('tag', 'post_count', 'recent_post_ids', 'updated_at')
+    actions = ['recount_tags']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def recount_tags(self, request, queryset):
+        refreshed = refresh_tag_stats(queryset.values_list('tag_id', flat=True))
+        self.message_user(request, f'{refreshed} tags were recounted.')
+    recount_tags.short_description = "Recount selected tags"
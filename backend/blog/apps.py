@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog'
+    
+    def ready(self):
+        from core.search import install_indexes
+        from . import signals  # noqa: F401
+        from .categories import rebuild_category_tree
+        from .related import backfill_related_terms
+        from .tag_stats import backfill_tag_stats
+        from .threads import backfill_comment_paths
+        post_migrate.connect(install_indexes, sender=self)
+        post_migrate.connect(backfill_comment_paths, sender=self)
+        post_migrate.connect(rebuild_category_tree, sender=self)
+        post_migrate.connect(backfill_tag_stats, sender=self)
+        post_migrate.connect(backfill_related_terms, sender=self)
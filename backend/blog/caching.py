@@ -0,0 +1,17 @@
+from core.response_cache import ResponseCache
+from .models import BlogCategory, BlogPost, BlogTagStats
+
+
+def category_tree_sources():
+    return [
+        (BlogCategory.objects.all(), 'updated_at'),
+        (BlogPost.objects.filter(status='published'), 'updated_at'),
+    ]
+
+
+def tag_cloud_sources():
+    return [(BlogTagStats.objects.all(), 'updated_at')]
+
+
+category_tree_cache = ResponseCache('blog-category-tree', category_tree_sources)
+tag_cloud_cache = ResponseCache('blog-tag-cloud', tag_cloud_sources, params=('limit',))
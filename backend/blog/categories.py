@@ -0,0 +1,66 @@
+"""
+The blog category tree.
+
+Categories are stored as nested sets by django-mptt, so a category's
+descendants or ancestors are one range query on `(tree_id, lft)` and the
+whole tree is one ordered query assembled in Python.
+
+An inactive category hides itself and everything below it, both from the
+tree and from the post listings, and post counts cover only what is shown.
+"""
+
+from django.db.models import Exists, OuterRef
+
+from .models import BlogCategory, BlogPost
+
+
+def category_tree():
+    """The active categories as nested roots, each with `tree_children` and a cumulative `post_count`.
+
+    Categories under an inactive one are left out with it, and so are their posts.
+    """
+    categories = BlogCategory.objects.add_related_count(
+        BlogCategory.objects.order_by('tree_id', 'lft'), BlogPost, 'category', 'post_count',
+        extra_filters={'status': 'published'},
+    )
+    nodes = {}
+    roots = []
+    for category in categories:
+        category.tree_children = []
+        if not category.is_active:
+            continue
+        if category.parent_id is None:
+            roots.append(category)
+        elif category.parent_id in nodes:
+            nodes[category.parent_id].tree_children.append(category)
+        else:
+            continue
+        nodes[category.pk] = category
+    # Children follow their parent in `lft` order, so walking backwards totals each subtree before its parent.
+    for category in reversed(list(nodes.values())):
+        if category.parent_id in nodes:
+            nodes[category.parent_id].post_count += category.post_count
+    return roots
+
+
+def subtree(category):
+    """`category` and the descendants `category_tree` shows under it, as one range query.
+
+    A row is dropped when it or any category above it is inactive, which
+    empties the whole subtree when `category` itself sits under one.
+    """
+    hidden_above = BlogCategory.objects.filter(
+        tree_id=OuterRef('tree_id'), lft__lte=OuterRef('lft'), rght__gte=OuterRef('rght'), is_active=False,
+    )
+    return category.get_descendants(include_self=True).exclude(Exists(hidden_above))
+
+
+def category_posts(category):
+    """Published posts in `category` or any of its active subcategories."""
+    return BlogPost.objects.filter(category__in=subtree(category), status='published')
+
+
+def rebuild_category_tree(sender, using='default', **kwargs):
+    """post_migrate receiver numbering the nested sets of categories saved before the tree existed."""
+    if BlogCategory.objects.using(using).filter(lft=0).exists():
+        BlogCategory.objects.db_manager(using).rebuild()
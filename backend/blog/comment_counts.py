@@ -0,0 +1,29 @@
+"""
+The denormalized `BlogPost.approved_comment_count`.
+
+Comment signals keep it current one change at a time; bulk updates that skip
+the signals (such as the `approve_comments` admin action) recount the posts
+they touched.
+"""
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import BlogPost, Comment
+
+
+def adjust_comment_count(post_id, delta):
+    BlogPost.objects.filter(pk=post_id).update(approved_comment_count=F('approved_comment_count') + delta)
+
+
+def refresh_comment_counts(post_ids=None):
+    """Recount the approved comments of the given posts, or of every post, in one UPDATE."""
+    approved = (
+        Comment.objects.filter(post=OuterRef('pk'), is_approved=True)
+        .order_by()
+        .values('post')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    posts = BlogPost.objects.all() if post_ids is None else BlogPost.objects.filter(pk__in=post_ids)
+    return posts.update(approved_comment_count=Coalesce(Subquery(approved), Value(0)))
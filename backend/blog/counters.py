@@ -0,0 +1,178 @@
+"""
+Write-buffered blog post view counters.
+
+Reads only bump an in-memory or Redis counter; a flusher applies the
+accumulated increments to `BlogPost.view_count` with one batched
+`UPDATE ... SET view_count = view_count + CASE id WHEN ... END` statement,
+so a popular post no longer takes a row lock on every GET.
+
+What a crash can lose:
+
+* Memory buffer (no `REDIS_URL`): each process buffers its own views and
+  flushes every `VIEW_COUNT_FLUSH_INTERVAL` seconds and at normal exit. A
+  killed process loses at most its last interval of views. Only the web
+  process holding the views can flush them, so the `flush_view_counts`
+  command refuses to run in this mode.
+* Redis buffer: views survive process crashes; Redis keeps them according to
+  its own persistence settings. A flusher killed between claiming a batch and
+  committing the UPDATE loses that one batch; it is never applied twice.
+
+Stored counts lag the live count by up to one flush interval.
+"""
+
+import atexit
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY = 'blog:views:pending'
+# Ids per UPDATE statement.
+FLUSH_BATCH_SIZE = 500
+
+
+class MemoryBuffer:
+    """Per-process buffer; pending counts are only visible to this process."""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, pk, amount):
+        with self._lock:
+            self._counts[pk] = self._counts.get(pk, 0) + amount
+
+    def pending(self, pk):
+        with self._lock:
+            return self._counts.get(pk, 0)
+
+    def drain(self):
+        with self._lock:
+            counts, self._counts = self._counts, {}
+        return counts
+
+
+class RedisBuffer:
+    """Buffer shared by every process through one Redis hash."""
+
+    def __init__(self, key=REDIS_KEY):
+        self.key = key
+
+    @property
+    def client(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+
+    def add(self, pk, amount):
+        self.client.hincrby(self.key, pk, amount)
+
+    def pending(self, pk):
+        return int(self.client.hget(self.key, pk) or 0)
+
+    def drain(self):
+        # Renaming claims the batch atomically; views arriving meanwhile start a new hash.
+        from redis.exceptions import ResponseError
+        claimed = f'{self.key}:flushing:{uuid.uuid4().hex}'
+        client = self.client
+        try:
+            client.rename(self.key, claimed)
+        except ResponseError:
+            # Nothing buffered since the last flush.
+            return {}
+        counts = client.hgetall(claimed)
+        client.delete(claimed)
+        return {int(pk): int(amount) for pk, amount in counts.items()}
+
+
+class ViewCounter:
+    """Buffered `view_count` increments for one model, flushed periodically."""
+
+    def __init__(self, model_label, field='view_count'):
+        self.model_label = model_label
+        self.field = field
+        self._buffer = None
+        self._flusher = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        from django.apps import apps
+        return apps.get_model(self.model_label)
+
+    @property
+    def buffer(self):
+        if self._buffer is None:
+            with self._lock:
+                if self._buffer is None:
+                    self._buffer = RedisBuffer() if settings.REDIS_URL else MemoryBuffer()
+        return self._buffer
+
+    def increment(self, pk, amount=1):
+        self.buffer.add(pk, amount)
+        self.start_flusher()
+
+    def pending(self, pk):
+        """Views of `pk` not yet written to the database."""
+        return self.buffer.pending(pk)
+
+    def flush(self):
+        """Apply every buffered increment; returns the number of rows updated."""
+        counts = self.buffer.drain()
+        if not counts:
+            return 0
+        items = sorted(counts.items())
+        updated = 0
+        try:
+            with transaction.atomic():
+                for start in range(0, len(items), FLUSH_BATCH_SIZE):
+                    batch = items[start:start + FLUSH_BATCH_SIZE]
+                    increment = Case(
+                        *[When(pk=pk, then=Value(amount)) for pk, amount in batch],
+                        default=Value(0),
+                        output_field=IntegerField(),
+                    )
+                    updated += self.model.objects.filter(pk__in=[pk for pk, amount in batch]).update(
+                        **{self.field: F(self.field) + increment}
+                    )
+        except Exception:
+            # Nothing was written; hand the views back for the next flush.
+            for pk, amount in items:
+                self.buffer.add(pk, amount)
+            raise
+        return updated
+
+    def start_flusher(self):
+        """Start this process's background flusher, unless the interval is 0."""
+        interval = settings.VIEW_COUNT_FLUSH_INTERVAL
+        if self._flusher is not None or not interval:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._run, args=(interval,), name='view-counter', daemon=True
+                )
+                self._flusher.start()
+                atexit.register(self._flush_safely)
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            self._flush_safely()
+
+    def _flush_safely(self):
+        from django.db import connection
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Could not flush view counts')
+        finally:
+            connection.close()
+
+
+post_views = ViewCounter('blog.BlogPost')
@@ -0,0 +1,39 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from blog.models import BlogPost
+from blog.reading import READING_FIELDS, reading_metrics
+
+
+def measure(row):
+    pk, content, excerpt = row
+    return pk, reading_metrics(content, excerpt)
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored word count, reading time and automatic excerpt of every blog post.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes; defaults to one per CPU.')
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        rows = BlogPost.objects.order_by('pk').values_list('pk', 'content', 'excerpt')
+        updated = 0
+        last_pk = 0
+        # Text extraction is CPU bound, so it runs in processes; only this process touches the database.
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                batch = list(rows.filter(pk__gt=last_pk)[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1][0]
+                posts = [
+                    BlogPost(pk=pk, **metrics)
+                    for pk, metrics in pool.map(measure, batch, chunksize=max(1, batch_size // 8))
+                ]
+                BlogPost.objects.bulk_update(posts, READING_FIELDS)
+                updated += len(posts)
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} blog posts.'))
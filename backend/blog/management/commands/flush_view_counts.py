@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.counters import MemoryBuffer, post_views
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the buffered blog post view counts to the database. Needs the Redis buffer: '
+        'the memory buffer lives inside each web process and is flushed there.'
+    )
+
+    def handle(self, *args, **options):
+        if isinstance(post_views.buffer, MemoryBuffer):
+            raise CommandError(
+                'View counts are buffered in memory (no REDIS_URL), so this process has none to flush; '
+                'each web process flushes its own every VIEW_COUNT_FLUSH_INTERVAL seconds and at exit.'
+            )
+        updated = post_views.flush()
+        self.stdout.write(self.style.SUCCESS(f'Updated the view count of {updated} blog posts.'))
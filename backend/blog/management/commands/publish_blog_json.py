@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog.publishing import publish_all
+
+
+class Command(BaseCommand):
+    help = 'Pre-render the JSON of every published blog post and the first list pages for nginx.'
+
+    def handle(self, *args, **options):
+        posts = publish_all()
+        self.stdout.write(self.style.SUCCESS(f'Published {posts} blog posts.'))
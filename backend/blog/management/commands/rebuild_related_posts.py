@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog.related import rebuild_related_posts
+
+
+class Command(BaseCommand):
+    help = 'Recompute the related posts of every published blog post.'
+
+    def handle(self, *args, **options):
+        written = rebuild_related_posts()
+        self.stdout.write(self.style.SUCCESS(f'Stored {written} related posts.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog.tag_stats import rebuild_tag_stats
+
+
+class Command(BaseCommand):
+    help = 'Recount the published blog posts of every tag.'
+
+    def handle(self, *args, **options):
+        tags = rebuild_tag_stats()
+        self.stdout.write(self.style.SUCCESS(f'Stored stats for {tags} tags.'))
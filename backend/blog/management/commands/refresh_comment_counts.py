@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog.comment_counts import refresh_comment_counts
+
+
+class Command(BaseCommand):
+    help = 'Recount the approved comments of every blog post.'
+
+    def handle(self, *args, **options):
+        updated = refresh_comment_counts()
+        self.stdout.write(self.style.SUCCESS(f'Recounted the comments of {updated} blog posts.'))
@@ -1,14 +1,21 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
 from django.utils.text import slugify
 from django.contrib.auth.models import User
 from ckeditor.fields import RichTextField
+from mptt.models import MPTTModel, TreeForeignKey
 from taggit.managers import TaggableManager
+from taggit.models import Tag
 
-class BlogCategory(models.Model):
+from .reading import READING_FIELDS, reading_metrics
+from .threads import thread_path
+
+class BlogCategory(MPTTModel):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True, blank=True)
     description = models.TextField(blank=True)
-    parent = models.ForeignKey('self', on_delete=models.SET_NULL, blank=True, null=True, related_name='children')
+    # Nested-set columns (tree_id, lft, rght, level) are added and maintained by mptt
+    parent = TreeForeignKey('self', on_delete=models.SET_NULL, blank=True, null=True, related_name='children')
     image = models.ImageField(upload_to='blog_categories/', blank=True, null=True)
     order = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
@@ -19,6 +26,9 @@ class BlogCategory(models.Model):
         verbose_name_plural = 'Blog Categories'
         ordering = ['order', 'name']
     
+    class MPTTMeta:
+        order_insertion_by = ['order', 'name']
+    
     def __str__(self):
         return self.name
     
@@ -44,6 +54,14 @@ class BlogPost(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
     is_featured = models.BooleanField(default=False)
     view_count = models.PositiveIntegerField(default=0)
+    # Kept current by the comment signals (blog.comment_counts)
+    approved_comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # Derived from the content on save (blog.reading)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveSmallIntegerField(default=1, editable=False)
+    auto_excerpt = models.TextField(blank=True, editable=False)
+    # Maintained by blog.search on PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     published_at = models.DateTimeField(blank=True, null=True)
@@ -57,28 +75,55 @@ class BlogPost(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'content', 'excerpt'} & set(update_fields):
+            for name, value in reading_metrics(self.content, self.excerpt).items():
+                setattr(self, name, value)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *READING_FIELDS}
         super().save(*args, **kwargs)
     
     @property
-    def reading_time(self):
-        # Calculate reading time based on 200 words per minute
-        word_count = len(self.content.split())
-        minutes = word_count / 200
-        return max(1, round(minutes))
+    def summary(self):
+        return self.excerpt or self.auto_excerpt
 
 class Comment(models.Model):
     post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='comments')
+    # Fixed once the comment is created; `path` and `depth` are derived from it
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, blank=True, null=True, related_name='replies')
     name = models.CharField(max_length=100)
     email = models.EmailField()
     content = models.TextField()
     is_approved = models.BooleanField(default=False)
+    # Materialized path of zero-padded ids from the top-level comment down (blog.threads)
+    path = models.CharField(max_length=255, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Back keyset pagination of all comments and of one post's comments
+            models.Index(fields=['-created_at', '-id'], name='comment_keyset'),
+            models.Index(fields=['post', '-created_at', '-id'], name='comment_post_keyset'),
+            # Reads a post's threads in display order
+            models.Index(fields=['post', 'path'], name='comment_post_path'),
+        ]
     
     def __str__(self):
         return f'Comment by {self.name} on {self.post.title}'
+    
+    def save(self, *args, **kwargs):
+        if self.pk is None:
+            self.depth = self.parent.depth + 1 if self.parent_id else 0
+            # The path ends with our own id, so it is written once the row exists;
+            # a comment is never left without one.
+            with transaction.atomic(using=kwargs.get('using')):
+                super().save(*args, **kwargs)
+                self.path = thread_path(self)
+                Comment.objects.filter(pk=self.pk).update(path=self.path)
+        else:
+            super().save(*args, **kwargs)
 
 class RelatedResource(models.Model):
     RESOURCE_TYPE_CHOICES = [
@@ -100,3 +145,52 @@ class RelatedResource(models.Model):
     
     def __str__(self):
         return f'{self.title} - {self.get_resource_type_display()}'
+
+class RelatedPost(models.Model):
+    """One of a post's most similar published posts, precomputed by blog.related."""
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='related_to')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+    
+    class Meta:
+        ordering = ['post', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'rank'], name='related_post_rank'),
+        ]
+    
+    def __str__(self):
+        return f'{self.post} -> {self.related} ({self.score:.3f})'
+
+class RelatedTerm(models.Model):
+    """One weighted term of a published post's related-posts vector; together the postings of blog.related."""
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='related_terms')
+    term = models.CharField(max_length=120)
+    weight = models.FloatField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'term'], name='related_term_unique'),
+        ]
+        indexes = [
+            # Document frequencies and the posts sharing a term
+            models.Index(fields=['term', 'post', 'weight'], name='related_term_postings'),
+        ]
+    
+    def __str__(self):
+        return f'{self.post}: {self.term} ({self.weight:.3f})'
+
+class BlogTagStats(models.Model):
+    """Published post count and newest published post ids of one tag, kept by blog.tag_stats."""
+    tag = models.OneToOneField(Tag, on_delete=models.CASCADE, primary_key=True, related_name='blog_stats')
+    post_count = models.PositiveIntegerField(default=0)
+    # Newest first, in the (-created_at, -id) order posts are listed in
+    recent_post_ids = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-post_count', 'tag__name']
+        verbose_name_plural = 'blog tag stats'
+    
+    def __str__(self):
+        return f'{self.tag} ({self.post_count})'
@@ -0,0 +1,237 @@
+"""
+Pre-rendered JSON of published blog posts, served by nginx.
+
+When a post is published, edited or unpublished, its detail response and
+the first `LIST_PAGES` pages of the public post list are rendered by the API
+views themselves and written under `PUBLISHED_ROOT` (see core.published):
+
+    api/blog/posts/<slug>.json        GET /api/blog/posts/<slug>/
+    api/blog/posts/pages/<n>.json     GET /api/blog/posts/?page=<n>
+
+nginx answers anonymous, parameterless GETs from these files and passes
+everything else, and any miss, to Django. Files are only rewritten when
+their bytes change, so nginx's ETag and Last-Modified act as the version.
+
+Publishing or unpublishing shifts every list page (and changes the count
+each one carries), so all of them are rewritten; any other edit rewrites
+only the post's own page. The rendering runs after commit in a background
+worker (`BLOG_PUBLISHING_WORKERS`), never in the request that saved the
+post; a change queued again before the worker reaches it is rendered once.
+
+nginx mirrors every read of a post to Django only to count the view. Those
+requests resolve the slug with `published_pk`, from the cache or the
+pre-rendered file itself, so counting a view never queries the database.
+"""
+
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Q
+from django.test import RequestFactory
+from django.urls import reverse
+from rest_framework.settings import api_settings
+
+from core.published import publish, published_path, unpublish
+
+from .models import BlogPost
+
+logger = logging.getLogger(__name__)
+
+# Deeper list pages are rarely read; Django answers those.
+LIST_PAGES = 10
+# Sent with internal renders so they are not counted as views.
+SKIP_VIEW_COUNT = {'HTTP_X_BLOG_VIEW_COUNT': 'skip'}
+
+_executor = None
+_executor_lock = threading.Lock()
+# Jobs submitted to the worker and not yet started
+_queued = set()
+
+
+def detail_path(slug):
+    return f'api/blog/posts/{slug}.json'
+
+
+def list_path(page):
+    return f'api/blog/posts/pages/{page}.json'
+
+
+def pk_key(slug):
+    return f'blog:published-pk:{slug}'
+
+
+def published_pk(slug):
+    """The pk of the published post `slug`, or None; never queries the database."""
+    pk = cache.get(pk_key(slug))
+    if pk is None:
+        try:
+            with open(published_path(detail_path(slug)), 'rb') as fh:
+                pk = json.load(fh)['id']
+        except (OSError, ValueError, KeyError):
+            return None
+        cache.set(pk_key(slug), pk, None)
+    return pk
+
+
+def unpublish_post(slug):
+    unpublish(detail_path(slug))
+    cache.delete(pk_key(slug))
+
+
+def api_get(action, path, query=None, **kwargs):
+    """Render `action` of the post viewset for an anonymous GET of `path` on the public API origin (`API_URL`)."""
+    from .views import BlogPostViewSet
+    api = urlsplit(settings.API_URL)
+    request = RequestFactory().get(
+        path, query or {}, HTTP_HOST=api.netloc, HTTP_ACCEPT='application/json',
+        secure=api.scheme == 'https', **SKIP_VIEW_COUNT,
+    )
+    request.user = AnonymousUser()
+    response = BlogPostViewSet.as_view({'get': action})(request, **kwargs)
+    response.render()
+    return response
+
+
+def write_post(slug):
+    response = api_get('retrieve', reverse('blogpost-detail', args=[slug]), slug=slug)
+    if response.status_code == 200:
+        publish(detail_path(slug), response.content)
+        cache.set(pk_key(slug), response.data['id'], None)
+    else:
+        unpublish_post(slug)
+
+
+def write_list_page(page):
+    """Write one list page; returns False once past the last page."""
+    # Page 1 is rendered without `?page=` so its links match what Django serves.
+    response = api_get('list', reverse('blogpost-list'), {'page': page} if page > 1 else None)
+    if response.status_code != 200:
+        unpublish(list_path(page))
+        return False
+    publish(list_path(page), response.content)
+    return True
+
+
+def write_list_pages():
+    pages = iter(range(1, LIST_PAGES + 1))
+    for page in pages:
+        if not write_list_page(page):
+            break
+    # Pages the list no longer reaches
+    for page in pages:
+        unpublish(list_path(page))
+
+
+def list_page_of(post):
+    """The list page `post` is on, in the `-created_at, -id` order of the list."""
+    newer = BlogPost.objects.filter(status='published').filter(
+        Q(created_at__gt=post.created_at) | Q(created_at=post.created_at, pk__gt=post.pk)
+    )
+    return newer.count() // api_settings.PAGE_SIZE + 1
+
+
+def refresh_post(pk, previous_slug=None, was_published=False):
+    """Rewrite what a change to post `pk` can affect, given its slug and state before the change."""
+    post = BlogPost.objects.filter(pk=pk).first()
+    published = post is not None and post.status == 'published'
+    if previous_slug and (not published or previous_slug != post.slug):
+        unpublish_post(previous_slug)
+    if published:
+        write_post(post.slug)
+    if published != was_published:
+        write_list_pages()
+    elif published:
+        page = list_page_of(post)
+        if page <= LIST_PAGES:
+            write_list_page(page)
+
+
+def publish_posts(post_ids):
+    """Rewrite the given posts' files and every list page, for bulk changes."""
+    posts = BlogPost.objects.filter(pk__in=post_ids).values_list('slug', 'status')
+    for slug, status in posts:
+        if status == 'published':
+            write_post(slug)
+        else:
+            unpublish_post(slug)
+    write_list_pages()
+
+
+def publish_all():
+    """Rewrite every published post and list page, removing files of posts no longer published.
+
+    Returns the number of posts written.
+    """
+    slugs = set(BlogPost.objects.filter(status='published').values_list('slug', flat=True))
+    for slug in sorted(slugs):
+        write_post(slug)
+    write_list_pages()
+    directory = os.path.dirname(published_path(detail_path('-')))
+    for name in os.listdir(directory) if os.path.isdir(directory) else ():
+        slug = name[:-len('.json')]
+        if name.endswith('.json') and slug not in slugs:
+            unpublish_post(slug)
+    return len(slugs)
+
+
+def _run_safely(function, *args):
+    try:
+        function(*args)
+    except Exception:
+        logger.exception('Could not publish blog JSON')
+
+
+def _work(job):
+    try:
+        _run_safely(*job)
+    finally:
+        connections.close_all()
+
+
+def _background(job):
+    with _executor_lock:
+        # Changes saved from here on queue the job again.
+        _queued.discard(job)
+    _work(job)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BLOG_PUBLISHING_WORKERS, thread_name_prefix='blog-publishing'
+            )
+        return _executor
+
+
+def submit(function, *args):
+    """Run `function(*args)` in the worker unless the same job is already waiting there."""
+    if not settings.BLOG_PUBLISHING_WORKERS:
+        _run_safely(function, *args)
+        return
+    job = (function, *(tuple(arg) if isinstance(arg, (list, set)) else arg for arg in args))
+    executor = get_executor()
+    try:
+        with _executor_lock:
+            if job in _queued:
+                return
+            _queued.add(job)
+    except TypeError:
+        # Jobs with unhashable arguments (such as dicts) are never merged.
+        executor.submit(_work, job)
+        return
+    executor.submit(_background, job)
+
+
+def schedule(function, *args):
+    """Run `function(*args)` in the worker once the current transaction commits; failures are logged, not raised."""
+    transaction.on_commit(lambda: submit(function, *args))
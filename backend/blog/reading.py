@@ -0,0 +1,24 @@
+"""
+Reading metrics derived from a post's rich-text content.
+"""
+
+from django.utils.text import Truncator
+
+from core.text import html_to_text
+
+WORDS_PER_MINUTE = 200
+EXCERPT_WORDS = 55
+
+# The BlogPost columns written from `reading_metrics`.
+READING_FIELDS = ('word_count', 'reading_time', 'auto_excerpt')
+
+
+def reading_metrics(content, excerpt=''):
+    """Word count, reading time in minutes and, when `excerpt` is blank, an automatic excerpt."""
+    text = html_to_text(content)
+    word_count = len(text.split())
+    return {
+        'word_count': word_count,
+        'reading_time': max(1, round(word_count / WORDS_PER_MINUTE)),
+        'auto_excerpt': '' if excerpt else Truncator(text).words(EXCERPT_WORDS),
+    }
@@ -0,0 +1,232 @@
+"""
+Precomputed related posts by content similarity.
+
+Every published post is turned into a TF-IDF vector over the words of its
+title, excerpt and content plus its tags, with title words and tags weighted
+up. The `TOP_K` posts with the highest cosine similarity are stored as
+`RelatedPost` rows, so the related-posts endpoint is a single indexed lookup.
+
+The normalised vectors are stored as `RelatedTerm` rows, which double as the
+inverted index: a term's rows are its postings and their count is its
+document frequency. Similarities are accumulated from the postings in plain
+Python; a blog-sized corpus does not need NumPy.
+
+When posts change, only they are re-read and re-vectorised, against the
+document frequencies in the table. Then only posts sharing a term with them
+are scored: the changed posts get new neighbours, as do posts that listed
+them and posts they now outrank a neighbour of. Other vectors keep the IDF
+weights of their last computation until `rebuild_related_posts` recomputes
+everything.
+"""
+
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count, Min
+from taggit.models import TaggedItem
+
+from core.text import html_to_text
+
+from .models import BlogPost, RelatedPost, RelatedTerm
+
+TOP_K = 5
+# Term frequency multipliers for the title and for each tag.
+TITLE_WEIGHT = 3
+TAG_WEIGHT = 3
+MIN_WORD_LENGTH = 3
+# Longer words are not words; they would not fit RelatedTerm.term either.
+MAX_WORD_LENGTH = 100
+
+STOP_WORDS = frozenset('''
+    about after again also and any are because been before being between both but can could did
+    does doing down during each few for from further had has have having her here hers herself him
+    himself his how into its itself just more most not now off once only other our ours ourselves
+    out over own same she should some such than that the their theirs them themselves then there
+    these they this those through too under until very was were what when where which while who
+    whom why will with would you your yours yourself yourselves
+'''.split())
+
+WORD = re.compile(r'[^\W\d_]+')
+
+
+def terms(text):
+    return [
+        word for word in WORD.findall(text.lower())
+        if MIN_WORD_LENGTH <= len(word) <= MAX_WORD_LENGTH and word not in STOP_WORDS
+    ]
+
+
+def load_documents(post_ids=None):
+    """Term counts of every published post, or of the published ones among `post_ids`, in two queries."""
+    documents = {}
+    posts = BlogPost.objects.filter(status='published')
+    if post_ids is not None:
+        posts = posts.filter(pk__in=post_ids)
+    for pk, title, excerpt, content in posts.values_list('pk', 'title', 'excerpt', 'content'):
+        counts = Counter(terms(f'{excerpt} {html_to_text(content)}'))
+        for word in terms(title):
+            counts[word] += TITLE_WEIGHT
+        documents[pk] = counts
+
+    tagged = TaggedItem.objects.filter(
+        content_type=ContentType.objects.get_for_model(BlogPost), object_id__in=list(documents)
+    ).values_list('object_id', 'tag__slug')
+    for pk, slug in tagged:
+        documents[pk][f'#{slug}'] += TAG_WEIGHT
+    return documents
+
+
+def vectorize(counts, frequency, total):
+    """L2-normalised TF-IDF vector (sublinear term frequency, smoothed IDF) of one post's term counts."""
+    vector = {
+        term: (1 + math.log(count)) * (math.log((1 + total) / (1 + frequency[term])) + 1)
+        for term, count in counts.items()
+    }
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {term: weight / norm for term, weight in vector.items()} if norm else {}
+
+
+def build_vectors(documents):
+    """Vectors of a whole corpus, with document frequencies taken from it."""
+    frequency = Counter(term for counts in documents.values() for term in counts)
+    return {pk: vectorize(counts, frequency, len(documents)) for pk, counts in documents.items()}
+
+
+def build_postings(vectors):
+    """Inverted index: term -> [(post id, weight), ...]."""
+    postings = defaultdict(list)
+    for pk, vector in vectors.items():
+        for term, weight in vector.items():
+            postings[term].append((pk, weight))
+    return postings
+
+
+def load_vectors(post_ids):
+    """The stored vectors of `post_ids`."""
+    vectors = defaultdict(dict)
+    for pk, term, weight in RelatedTerm.objects.filter(post_id__in=post_ids).values_list('post_id', 'term', 'weight'):
+        vectors[pk][term] = weight
+    return vectors
+
+
+def load_postings(terms):
+    """The stored postings of `terms` only."""
+    postings = defaultdict(list)
+    rows = RelatedTerm.objects.filter(term__in=list(terms)).values_list('term', 'post_id', 'weight')
+    for term, pk, weight in rows:
+        postings[term].append((pk, weight))
+    return postings
+
+
+def store_vectors(vectors):
+    RelatedTerm.objects.bulk_create(
+        [
+            RelatedTerm(post_id=pk, term=term, weight=weight)
+            for pk, vector in vectors.items() for term, weight in vector.items()
+        ],
+        batch_size=1000,
+    )
+
+
+def similarities(vector, postings):
+    """Cosine similarity of `vector` with every post sharing a term with it."""
+    scores = defaultdict(float)
+    for term, weight in vector.items():
+        for pk, other in postings.get(term, ()):
+            scores[pk] += weight * other
+    return scores
+
+
+def nearest(pk, vectors, postings):
+    """The `TOP_K` `(score, post id)` pairs most similar to post `pk`, best first."""
+    scores = similarities(vectors[pk], postings)
+    scores.pop(pk, None)
+    return heapq.nlargest(TOP_K, ((score, other) for other, score in scores.items() if score > 0))
+
+
+def write_rows(post_ids, vectors, postings):
+    """Replace the stored neighbours of `post_ids`; posts without a vector just lose theirs."""
+    rows = [
+        RelatedPost(post_id=pk, related_id=other, score=score, rank=rank)
+        for pk in post_ids if vectors.get(pk)
+        for rank, (score, other) in enumerate(nearest(pk, vectors, postings))
+    ]
+    with transaction.atomic():
+        RelatedPost.objects.filter(post_id__in=post_ids).delete()
+        RelatedPost.objects.bulk_create(rows)
+    return len(rows)
+
+
+def rebuild_related_posts():
+    """Recompute every vector and the neighbours of every published post. Returns the rows written."""
+    vectors = build_vectors(load_documents())
+    postings = build_postings(vectors)
+    with transaction.atomic():
+        RelatedTerm.objects.all().delete()
+        store_vectors(vectors)
+        RelatedPost.objects.all().delete()
+        return write_rows(list(vectors), vectors, postings)
+
+
+def update_related_posts(post_ids):
+    """Rewrite the vectors and rows affected by changes to `post_ids` (edited, published, unpublished or deleted).
+
+    Returns the ids of the posts whose neighbours were recomputed.
+    """
+    changed = set(post_ids)
+    documents = load_documents(changed)
+    if not documents and not RelatedTerm.objects.filter(post_id__in=changed).exists():
+        # Drafts that never took part in the index, or deleted posts whose rows went with them.
+        return set()
+
+    with transaction.atomic():
+        RelatedTerm.objects.filter(post_id__in=changed).delete()
+        # Document frequencies of the changed posts' terms, counting the changed posts themselves
+        frequency = Counter(dict(
+            RelatedTerm.objects.filter(term__in=list({term for counts in documents.values() for term in counts}))
+            .values('term').annotate(posts=Count('id')).values_list('term', 'posts')
+        ))
+        for counts in documents.values():
+            frequency.update(counts.keys())
+        total = BlogPost.objects.filter(status='published').count()
+        fresh = {pk: vectorize(counts, frequency, total) for pk, counts in documents.items()}
+        store_vectors(fresh)
+
+    affected = set(changed)
+    affected.update(RelatedPost.objects.filter(related_id__in=changed).values_list('post_id', flat=True))
+    postings = load_postings({term for vector in fresh.values() for term in vector})
+    scores = defaultdict(float)
+    for pk, vector in fresh.items():
+        for other, score in similarities(vector, postings).items():
+            if other not in changed:
+                scores[other] = max(scores[other], score)
+    if scores:
+        # Posts a changed post now outranks the weakest neighbour of
+        full = dict(
+            RelatedPost.objects.filter(post_id__in=list(scores)).order_by().values('post_id')
+            .annotate(rows=Count('id'), weakest=Min('score')).filter(rows__gte=TOP_K)
+            .values_list('post_id', 'weakest')
+        )
+        affected.update(other for other, score in scores.items() if score > full.get(other, 0))
+
+    vectors = load_vectors(affected)
+    write_rows(affected, vectors, load_postings({term for vector in vectors.values() for term in vector}))
+    return affected
+
+
+def backfill_related_terms(sender, using='default', **kwargs):
+    """post_migrate receiver computing the vectors of posts published before they were stored."""
+    published = BlogPost.objects.using(using).filter(status='published')
+    if not RelatedTerm.objects.using(using).exists() and published.exists():
+        rebuild_related_posts()
+
+
+def schedule_update(post_ids):
+    """Update the related posts affected by `post_ids` once the current transaction commits."""
+    post_ids = set(post_ids)
+    if post_ids:
+        transaction.on_commit(lambda: update_related_posts(post_ids))
@@ -0,0 +1,55 @@
+"""
+Ranked full-text search over published blog posts.
+
+The text relevance from `core.search` is multiplied by a recency boost that
+doubles every `RECENCY_HALF_LIFE_DAYS` of publication date. The boost grows
+from a fixed epoch rather than decaying from "now", so a post's score does
+not change between requests and keyset cursors over it stay valid.
+"""
+
+from datetime import date
+
+from django.db.models import F, FloatField, Func, Value
+from django.db.models.functions import Coalesce, Power
+
+from core import search
+from .models import BlogPost
+
+# A hit in the title outranks one in the excerpt, which outranks the body.
+post_index = search.register(BlogPost, [
+    ('title', 'A'),
+    ('excerpt', 'B'),
+    ('content', 'C'),
+])
+
+RECENCY_HALF_LIFE_DAYS = 730
+RECENCY_EPOCH = date(2024, 1, 1)
+
+
+class EpochDays(Func):
+    """Days between the Unix epoch and a datetime, as a float."""
+    output_field = FloatField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='(julianday(%(expressions)s) - 2440587.5)', **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='(EXTRACT(EPOCH FROM %(expressions)s) / 86400.0)::double precision',
+            **extra_context,
+        )
+
+
+def recency_boost():
+    """Factor doubling every half-life of publication date after `RECENCY_EPOCH`."""
+    epoch_days = (RECENCY_EPOCH - date(1970, 1, 1)).days
+    published = EpochDays(Coalesce('published_at', 'created_at'))
+    return Power(Value(2.0), (published - Value(float(epoch_days))) / Value(float(RECENCY_HALF_LIFE_DAYS)))
+
+
+def search_posts(queryset, query):
+    """Filter `queryset` to posts matching `query` and annotate `search_score`, best first."""
+    queryset = post_index.search(queryset, query)
+    rank = F('search_rank') if 'search_rank' in queryset.query.annotations else Value(1.0)
+    return queryset.annotate(search_score=rank * recency_boost()).order_by('-search_score', '-id')
@@ -1,18 +1,44 @@
+from django.conf import settings
+from django.db.models import Prefetch
 from rest_framework import serializers
 from taggit.serializers import TagListSerializerField, TaggitSerializer
 from django.contrib.auth.models import User
+from core.search import highlight
+from core.serializers import DynamicFieldsMixin, RenderedHTMLField, RenderedHTMLListSerializer, include_field, expand_field
+from core.text import html_to_text
+from imaging.fields import ImageVariantsField
 from .models import BlogCategory, BlogPost, Comment, RelatedResource
+from .threads import approved_thread, build_tree
 
 
 class BlogCategorySerializer(serializers.ModelSerializer):
     """Serializer for the BlogCategory model."""
+    image_variants = ImageVariantsField(source='image')
     
     class Meta:
         model = BlogCategory
-        fields = ['id', 'name', 'description', 'slug', 'icon', 'is_active', 'created_at', 'updated_at']
+        fields = [
+            'id', 'name', 'description', 'slug', 'image', 'image_variants', 'is_active', 
+            'created_at', 'updated_at'
+        ]
         read_only_fields = ['slug', 'created_at', 'updated_at']
 
 
+class BlogCategoryTreeSerializer(serializers.ModelSerializer):
+    """Serializer for a category and its subcategories, as assembled by blog.categories."""
+    image_variants = ImageVariantsField(source='image')
+    post_count = serializers.IntegerField(read_only=True)
+    children = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = BlogCategory
+        fields = ['id', 'name', 'slug', 'description', 'image', 'image_variants', 'post_count', 'children']
+    
+    def get_children(self, obj):
+        """Get the subcategories attached by `category_tree`; nothing is queried."""
+        return BlogCategoryTreeSerializer(obj.tree_children, many=True, context=self.context).data
+
+
 class AuthorSerializer(serializers.ModelSerializer):
     """Serializer for blog post authors."""
     
@@ -26,11 +52,10 @@ class RelatedResourceSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = RelatedResource
-        fields = ['id', 'title', 'description', 'resource_type', 'url', 'file', 'created_at', 'updated_at']
-        read_only_fields = ['created_at', 'updated_at']
+        fields = ['id', 'title', 'resource_type', 'url', 'related_post', 'order']
 
 
-class BlogPostSerializer(TaggitSerializer, serializers.ModelSerializer):
+class BlogPostSerializer(DynamicFieldsMixin, TaggitSerializer, serializers.ModelSerializer):
     """Serializer for the BlogPost model."""
     category = BlogCategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
@@ -44,44 +69,121 @@ class BlogPostSerializer(TaggitSerializer, serializers.ModelSerializer):
         source='author',
         write_only=True
     )
+    content = RenderedHTMLField()
     tags = TagListSerializerField()
+    featured_image_variants = ImageVariantsField(source='featured_image')
     related_resources = RelatedResourceSerializer(many=True, read_only=True)
-    comment_count = serializers.SerializerMethodField()
+    comment_count = serializers.IntegerField(source='approved_comment_count', read_only=True)
+    summary = serializers.CharField(read_only=True)
+    
+    class Meta:
+        model = BlogPost
+        list_serializer_class = RenderedHTMLListSerializer
+        fields = [
+            'id', 'title', 'slug', 'content', 'excerpt', 'summary', 'featured_image', 
+            'featured_image_variants', 'category', 'category_id', 'author', 'author_id', 'tags', 
+            'is_featured', 'status', 'published_at', 'related_resources',
+            'comment_count', 'word_count', 'reading_time', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['slug', 'created_at', 'updated_at']
+        expandable_fields = ['category', 'author', 'related_resources']
+        # The excerpt as written, or the one generated from the content
+        field_columns = {'summary': ['excerpt', 'auto_excerpt']}
+    
+    @staticmethod
+    def setup_eager_loading(queryset, fields=None, expand=None):
+        """Load the nested category, author, tags and resources in a fixed number of queries.
+        
+        The comment count is a column kept current by the comment signals.
+        """
+        queryset = queryset.defer('search_vector')
+        if expand_field('category', fields, expand):
+            queryset = queryset.select_related('category')
+        if expand_field('author', fields, expand):
+            queryset = queryset.select_related('author')
+        if include_field('tags', fields):
+            queryset = queryset.prefetch_related('tags')
+        if expand_field('related_resources', fields, expand):
+            queryset = queryset.prefetch_related('related_resources')
+        elif include_field('related_resources', fields):
+            queryset = queryset.prefetch_related(
+                Prefetch('related_resources', queryset=RelatedResource.objects.only('id', 'post'))
+            )
+        return queryset
+
+
+class BlogSearchResultSerializer(serializers.ModelSerializer):
+    """Serializer for a ranked blog search hit with a highlighted snippet."""
+    category = BlogCategorySerializer(read_only=True)
+    summary = serializers.CharField(read_only=True)
+    score = serializers.FloatField(source='search_score', read_only=True)
+    snippet = serializers.SerializerMethodField()
     
     class Meta:
         model = BlogPost
         fields = [
-            'id', 'title', 'slug', 'content', 'excerpt', 'featured_image', 
-            'category', 'category_id', 'author', 'author_id', 'tags', 
-            'is_featured', 'is_published', 'published_date', 'related_resources',
-            'comment_count', 'meta_title', 'meta_description', 'created_at', 
-            'updated_at'
+            'id', 'title', 'slug', 'summary', 'snippet', 'category', 'published_at',
+            'reading_time', 'score'
         ]
-        read_only_fields = ['slug', 'created_at', 'updated_at', 'comment_count']
     
-    def get_comment_count(self, obj):
-        """Get the count of approved comments for the blog post."""
-        return obj.comments.filter(is_approved=True).count()
+    def get_snippet(self, obj):
+        """Get the passage of the content around the search terms, with the terms marked."""
+        request = self.context.get('request')
+        query = request.query_params.get('q', '') if request else ''
+        return highlight(html_to_text(obj.content), query)
+
+
+class CommentPostSerializer(serializers.ModelSerializer):
+    """The post a comment belongs to, as shown with the comment."""
+    
+    class Meta:
+        model = BlogPost
+        fields = ['id', 'title', 'slug']
 
 
 class CommentSerializer(serializers.ModelSerializer):
     """Serializer for the Comment model."""
-    post = BlogPostSerializer(read_only=True)
+    post = CommentPostSerializer(read_only=True)
     post_id = serializers.PrimaryKeyRelatedField(
         queryset=BlogPost.objects.all(),
         source='post',
         write_only=True
     )
-    author_name = serializers.CharField(required=True)
-    author_email = serializers.EmailField(required=True)
     
     class Meta:
         model = Comment
         fields = [
-            'id', 'post', 'post_id', 'author_name', 'author_email', 'author_website',
-            'content', 'is_approved', 'parent', 'created_at', 'updated_at'
+            'id', 'post', 'post_id', 'parent', 'depth', 'name', 'email', 'content', 'is_approved',
+            'created_at'
         ]
-        read_only_fields = ['is_approved', 'created_at', 'updated_at']
+        read_only_fields = ['depth', 'is_approved', 'created_at']
+        # Commenters' addresses are collected, never shown.
+        extra_kwargs = {'email': {'write_only': True}}
+    
+    def validate(self, attrs):
+        """Replies must answer an approved comment on the same post, within the depth limit."""
+        parent = attrs.get('parent')
+        if parent is not None:
+            if parent.post_id != attrs['post'].pk:
+                raise serializers.ValidationError({'parent': 'The parent comment belongs to another post.'})
+            if not parent.is_approved:
+                raise serializers.ValidationError({'parent': 'The parent comment is not approved.'})
+            if parent.depth >= settings.COMMENT_MAX_DEPTH:
+                raise serializers.ValidationError({'parent': 'Replies cannot be nested any deeper.'})
+        return attrs
+
+
+class CommentThreadSerializer(serializers.ModelSerializer):
+    """Serializer for a comment and its replies, as assembled by blog.threads."""
+    replies = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Comment
+        fields = ['id', 'parent', 'depth', 'name', 'content', 'created_at', 'replies']
+    
+    def get_replies(self, obj):
+        """Get the replies attached by `build_tree`; nothing is queried."""
+        return CommentThreadSerializer(obj.thread_replies, many=True, context=self.context).data
 
 
 class BlogPostDetailSerializer(BlogPostSerializer):
@@ -92,6 +194,6 @@ class BlogPostDetailSerializer(BlogPostSerializer):
         fields = BlogPostSerializer.Meta.fields + ['comments']
     
     def get_comments(self, obj):
-        """Get approved comments for the blog post."""
-        comments = obj.comments.filter(is_approved=True, parent=None)
-        return CommentSerializer(comments, many=True).data
+        """Get the approved comment threads of the blog post, in one query."""
+        comments = build_tree(approved_thread(obj))
+        return CommentThreadSerializer(comments, many=True, context=self.context).data
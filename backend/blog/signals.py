@@ -0,0 +1,223 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import Signal, receiver
+from taggit.models import Tag
+
+from core.richtext import prerender
+
+from .caching import category_tree_cache
+from .comment_counts import adjust_comment_count
+from .models import BlogCategory, BlogPost, Comment, RelatedPost, RelatedResource
+from .publishing import publish_posts, refresh_post as refresh_published_post, schedule as schedule_publishing
+from .related import schedule_update as schedule_related_update
+from .search import post_index
+from .tag_stats import refresh_post_tags, refresh_tag_stats, touch_tag_stats
+
+# BlogPost fields the related-posts vectors are built from.
+RELATED_FIELDS = {'title', 'excerpt', 'content', 'status'}
+
+# Sent with `post_ids` after a bulk update, which sends no post_save, publishes posts of the sender model.
+posts_published = Signal()
+
+
+@receiver(pre_save, sender=Comment)
+def remember_approval(sender, instance, raw=False, **kwargs):
+    instance._previous_approval = None
+    if instance.pk and not raw:
+        instance._previous_approval = (
+            Comment.objects.filter(pk=instance.pk).values_list('post_id', 'is_approved').first()
+        )
+
+
+@receiver(post_save, sender=Comment)
+def count_approved_comment(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_approval', None)
+    before = {previous[0]} if previous and previous[1] else set()
+    after = {instance.post_id} if instance.is_approved else set()
+    for post_id in before - after:
+        adjust_comment_count(post_id, -1)
+    for post_id in after - before:
+        adjust_comment_count(post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_approved_comment(sender, instance, **kwargs):
+    if instance.is_approved:
+        adjust_comment_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=BlogPost)
+def index_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        post_index.update(instance)
+
+
+@receiver(post_delete, sender=BlogPost)
+def unindex_post(sender, instance, **kwargs):
+    post_index.remove(instance)
+
+
+@receiver(post_save, sender=BlogPost)
+def prerender_post(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and (update_fields is None or 'content' in update_fields):
+        prerender(sender, instance.content)
+
+
+@receiver(post_save, sender=BlogPost)
+def relate_post(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and (update_fields is None or RELATED_FIELDS & set(update_fields)):
+        schedule_related_update([instance.pk])
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def relate_retagged_post(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, BlogPost):
+        schedule_related_update([instance.pk])
+
+
+@receiver(posts_published, sender=BlogPost)
+def relate_published_posts(sender, post_ids, **kwargs):
+    schedule_related_update(post_ids)
+
+
+@receiver(pre_delete, sender=BlogPost)
+def unrelate_post(sender, instance, **kwargs):
+    # The cascade removes the rows listing this post; their posts need new neighbours.
+    listing = RelatedPost.objects.filter(related=instance).values_list('post_id', flat=True)
+    schedule_related_update([instance.pk, *listing])
+
+
+@receiver(post_save, sender=BlogCategory)
+@receiver(post_delete, sender=BlogCategory)
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+@receiver(posts_published, sender=BlogPost)
+def invalidate_category_tree(sender, **kwargs):
+    # The tree embeds categories and counts their published posts.
+    category_tree_cache.invalidate()
+
+
+@receiver(pre_save, sender=BlogPost)
+def remember_publication(sender, instance, raw=False, **kwargs):
+    previous = None
+    if instance.pk and not raw:
+        previous = BlogPost.objects.filter(pk=instance.pk).values_list('slug', 'status').first()
+    instance._previous_slug = previous[0] if previous else None
+    instance._was_published = bool(previous and previous[1] == 'published')
+
+
+@receiver(post_save, sender=BlogPost)
+def count_published_tags(sender, instance, raw=False, **kwargs):
+    # Only publishing or unpublishing moves a post in or out of its tags' stats.
+    if not raw and getattr(instance, '_was_published', False) != (instance.status == 'published'):
+        refresh_post_tags([instance.pk])
+
+
+@receiver(posts_published, sender=BlogPost)
+def count_published_posts_tags(sender, post_ids, **kwargs):
+    refresh_post_tags(post_ids)
+
+
+@receiver(pre_delete, sender=BlogPost)
+def remember_deleted_tags(sender, instance, **kwargs):
+    instance._deleted_tag_ids = list(instance.tags.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=BlogPost)
+def uncount_deleted_tags(sender, instance, **kwargs):
+    if instance.status == 'published':
+        refresh_tag_stats(getattr(instance, '_deleted_tag_ids', []))
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def count_retagged_post(sender, instance, action, pk_set=None, **kwargs):
+    if not isinstance(instance, BlogPost) or instance.status != 'published':
+        return
+    if action == 'pre_clear':
+        instance._cleared_tag_ids = list(instance.tags.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        refresh_tag_stats(pk_set or ())
+    elif action == 'post_clear':
+        refresh_tag_stats(getattr(instance, '_cleared_tag_ids', []))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_stats(sender, instance, raw=False, created=False, **kwargs):
+    # The cloud shows tag names and sorts ties by them; new tags have no posts yet.
+    if not raw and not created:
+        touch_tag_stats(instance.pk)
+
+
+@receiver(post_save, sender=BlogPost)
+def publish_post_json(sender, instance, raw=False, **kwargs):
+    was_published = getattr(instance, '_was_published', False)
+    if not raw and (was_published or instance.status == 'published'):
+        schedule_publishing(
+            refresh_published_post, instance.pk, getattr(instance, '_previous_slug', None), was_published
+        )
+
+
+@receiver(posts_published, sender=BlogPost)
+def publish_published_posts_json(sender, post_ids, **kwargs):
+    schedule_publishing(publish_posts, post_ids)
+
+
+@receiver(post_delete, sender=BlogPost)
+def unpublish_post_json(sender, instance, **kwargs):
+    if instance.status == 'published':
+        schedule_publishing(refresh_published_post, instance.pk, instance.slug, True)
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def publish_retagged_post_json(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, BlogPost):
+        if instance.status == 'published':
+            schedule_publishing(refresh_published_post, instance.pk, instance.slug, True)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=RelatedResource)
+@receiver(post_delete, sender=RelatedResource)
+def publish_post_json_parts(sender, instance, raw=False, **kwargs):
+    # The detail embeds approved comments and resources; the list page shows the comment count.
+    if raw:
+        return
+    if sender is Comment:
+        previous = getattr(instance, '_previous_approval', None)
+        if not instance.is_approved and not (previous and previous[1]):
+            return
+    post = BlogPost.objects.filter(pk=instance.post_id, status='published').values_list('slug', flat=True).first()
+    if post:
+        schedule_publishing(refresh_published_post, instance.post_id, post, True)
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tagged_posts(sender, instance, **kwargs):
+    instance._published_post_ids = list(
+        BlogPost.objects.filter(tags=instance, status='published').values_list('pk', flat=True)
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def publish_tagged_post_json(sender, instance, raw=False, created=False, **kwargs):
+    # Posts embed their tag names.
+    if raw or created:
+        return
+    post_ids = getattr(instance, '_published_post_ids', None)
+    if post_ids is None:
+        post_ids = list(BlogPost.objects.filter(tags=instance, status='published').values_list('pk', flat=True))
+    if post_ids:
+        schedule_publishing(publish_posts, post_ids)
+
+
+@receiver(post_save, sender=BlogCategory)
+def publish_category_post_json(sender, instance, raw=False, created=False, **kwargs):
+    # Posts embed their category.
+    if not raw and not created:
+        post_ids = list(instance.posts.filter(status='published').values_list('pk', flat=True))
+        if post_ids:
+            schedule_publishing(publish_posts, post_ids)
@@ -0,0 +1,136 @@
+"""
+Per-tag statistics of published blog posts.
+
+`BlogTagStats` holds each tag's published post count and its newest
+published post ids, so the tag cloud is one small table read and the first
+page of a tag's posts is a primary-key lookup instead of a join through
+taggit. Signals refresh only the tags of a post whose publication or tags
+changed; bulk updates that skip the signals (such as the `make_published`
+admin action) refresh the tags of the posts they touched. Renaming or
+deleting a tag touches its stats, since the cloud shows and sorts by name.
+"""
+
+import math
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from taggit.models import TaggedItem
+
+from .caching import tag_cloud_cache
+from .models import BlogPost, BlogTagStats
+
+# Enough ids to serve the first page at any page size clients commonly ask for.
+RECENT_POSTS = 50
+# Tag cloud weights run from 1 to this.
+CLOUD_WEIGHTS = 5
+# Tags recounted per query.
+TAG_BATCH_SIZE = 500
+
+
+def blog_tag_ids(post_ids=None):
+    """Ids of the tags on the given posts, or on any post."""
+    tagged = TaggedItem.objects.filter(content_type=ContentType.objects.get_for_model(BlogPost))
+    if post_ids is not None:
+        tagged = tagged.filter(object_id__in=post_ids)
+    return set(tagged.values_list('tag_id', flat=True))
+
+
+def refresh_tag_stats(tag_ids):
+    """Recount the published posts of `tag_ids`, dropping the stats of tags with none."""
+    tag_ids = sorted(set(tag_ids))
+    counts = {}
+    recent = {}
+    for start in range(0, len(tag_ids), TAG_BATCH_SIZE):
+        # One windowed query per batch: each tag's count and its newest posts, ranked per tag.
+        rows = (
+            BlogPost.objects.filter(status='published', tags__id__in=tag_ids[start:start + TAG_BATCH_SIZE])
+            .annotate(
+                tag_id=F('tags__id'),
+                post_count=Window(Count('pk'), partition_by=F('tags__id')),
+                rank=Window(RowNumber(), partition_by=F('tags__id'), order_by=[F('created_at').desc(), F('id').desc()]),
+            )
+            .filter(rank__lte=RECENT_POSTS)
+            .order_by('tag_id', 'rank')
+            .values_list('tag_id', 'post_count', 'pk')
+        )
+        for tag_id, post_count, pk in rows:
+            counts[tag_id] = post_count
+            recent.setdefault(tag_id, []).append(pk)
+    rows = [
+        BlogTagStats(tag_id=tag_id, post_count=counts[tag_id], recent_post_ids=recent[tag_id])
+        for tag_id in tag_ids if tag_id in counts
+    ]
+    empty = [tag_id for tag_id in tag_ids if tag_id not in counts]
+    if rows:
+        BlogTagStats.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['tag'],
+            update_fields=['post_count', 'recent_post_ids', 'updated_at'],
+        )
+    if empty:
+        BlogTagStats.objects.filter(tag_id__in=empty).delete()
+    tag_cloud_cache.invalidate()
+    return len(rows)
+
+
+def touch_tag_stats(tag_id):
+    """Mark the stats of a renamed or deleted tag changed and retire the cached cloud."""
+    BlogTagStats.objects.filter(tag_id=tag_id).update(updated_at=timezone.now())
+    tag_cloud_cache.invalidate()
+
+
+def refresh_post_tags(post_ids):
+    """Refresh the stats of every tag on the given posts."""
+    return refresh_tag_stats(blog_tag_ids(post_ids))
+
+
+def rebuild_tag_stats():
+    """Recompute the stats of every tag from scratch; returns the number of tags with posts."""
+    tag_ids = blog_tag_ids()
+    BlogTagStats.objects.exclude(tag_id__in=tag_ids).delete()
+    return refresh_tag_stats(tag_ids)
+
+
+def tag_cloud(limit=None):
+    """The tags with published posts, busiest first, each weighted 1..CLOUD_WEIGHTS by log count."""
+    stats = list(BlogTagStats.objects.select_related('tag')[:limit])
+    if not stats:
+        return []
+    low = math.log(min(entry.post_count for entry in stats))
+    spread = math.log(max(entry.post_count for entry in stats)) - low
+    return [
+        {
+            'name': entry.tag.name,
+            'slug': entry.tag.slug,
+            'count': entry.post_count,
+            'weight': 1 + round((CLOUD_WEIGHTS - 1) * (math.log(entry.post_count) - low) / spread) if spread else 1,
+        }
+        for entry in stats
+    ]
+
+
+def first_page_ids(tag_slug, page_size):
+    """Ids of the first page of a tag's posts, or None when the stats cannot answer it.
+
+    One id past the page is included so callers can tell whether more follow.
+    """
+    stats = (
+        BlogTagStats.objects.filter(tag__slug=tag_slug)
+        .values_list('post_count', 'recent_post_ids')
+        .order_by('pk')
+        .first()
+    )
+    if stats is None:
+        # No published post carries the tag.
+        return []
+    post_count, ids = stats
+    if len(ids) <= page_size and len(ids) < post_count:
+        return None
+    return ids[:page_size + 1]
+
+
+def backfill_tag_stats(sender, using='default', **kwargs):
+    """post_migrate receiver computing the stats of posts tagged before the table existed."""
+    if not BlogTagStats.objects.using(using).exists() and blog_tag_ids():
+        rebuild_tag_stats()
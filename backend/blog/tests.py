@@ -1,3 +1,867 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from taggit.models import Tag
+
+from core.pagination import approximate_count
+from core.richtext import RichTextRenderer, render_rich_text
+from core.text import html_to_text
+from imaging.models import ImageVariant
+from imaging.pipeline import manifest_key
+from imaging.signals import variants_generated
+
+from .counters import post_views
+from .models import BlogCategory, BlogPost, BlogTagStats, Comment, RelatedPost, RelatedResource, RelatedTerm
+from .publishing import detail_path, get_executor, list_path, pk_key, submit
+from .serializers import BlogPostSerializer
+from .tag_stats import rebuild_tag_stats, refresh_tag_stats
+
+
+class ReadingMetricsTests(TestCase):
+    """Word count, reading time and the automatic excerpt are stored on save."""
+
+    def setUp(self):
+        self.author = User.objects.create_user('author')
+
+    def create_post(self, content, **kwargs):
+        return BlogPost.objects.create(title='Post', author=self.author, content=content, **kwargs)
+
+    def test_counts_text_not_markup(self):
+        post = self.create_post('<p class="lead">Hello <strong>world</strong></p><script>var x = 1;</script>')
+        self.assertEqual(post.word_count, 2)
+        self.assertEqual(post.reading_time, 1)
+        self.assertEqual(post.summary, 'Hello world')
+
+        post.content = '<p>%s</p>' % ' '.join(['word'] * 1000)
+        post.save(update_fields=['content'])
+        post.refresh_from_db()
+        self.assertEqual((post.word_count, post.reading_time), (1000, 5))
+        self.assertTrue(post.auto_excerpt.endswith('…'))
+
+    def test_written_excerpt_wins(self):
+        post = self.create_post('<p>Body text</p>', excerpt='Hand written')
+        self.assertEqual(post.auto_excerpt, '')
+        self.assertEqual(post.summary, 'Hand written')
+
+    def test_backfill_command(self):
+        post = self.create_post('<p>One two three</p>')
+        BlogPost.objects.update(word_count=0, reading_time=0, auto_excerpt='')
+        call_command('backfill_reading_metrics', '--workers', '2', '--batch-size', '1', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual((post.word_count, post.reading_time, post.auto_excerpt), (3, 1, 'One two three'))
+
+
+@override_settings(ROOT_URLCONF='blog.urls', VIEW_COUNT_FLUSH_INTERVAL=0)
+class BufferedViewCountTests(TestCase):
+    """Views are buffered in memory and written with one batched UPDATE."""
+
+    def setUp(self):
+        author = User.objects.create_user('author')
+        self.posts = [
+            BlogPost.objects.create(title=f'Post {i}', author=author, content='<p>Text</p>')
+            for i in range(3)
+        ]
+        self.addCleanup(post_views.buffer.drain)
+
+    def test_flush_applies_increments_in_one_query(self):
+        for post, views in zip(self.posts, (3, 1, 0)):
+            for _ in range(views):
+                post_views.increment(post.pk)
+        self.assertEqual(post_views.pending(self.posts[0].pk), 3)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(post_views.flush(), 2)
+        updates = [query for query in context.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        counts = dict(BlogPost.objects.values_list('pk', 'view_count'))
+        self.assertEqual([counts[post.pk] for post in self.posts], [3, 1, 0])
+        self.assertEqual(post_views.pending(self.posts[0].pk), 0)
+
+    def test_staff_live_count(self):
+        post = self.posts[0]
+        BlogPost.objects.filter(pk=post.pk).update(view_count=10)
+        post_views.increment(post.pk, 2)
+        url = reverse('blogpost-views', args=[post.slug])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_user('editor', is_staff=True))
+        self.assertEqual(self.client.get(url).json(), {'stored': 10, 'pending': 2, 'live': 12})
+
+    def test_flush_command_needs_the_shared_buffer(self):
+        post_views.increment(self.posts[0].pk)
+        with self.assertRaisesMessage(CommandError, 'buffered in memory'):
+            call_command('flush_view_counts', stdout=StringIO())
+        self.assertEqual(post_views.pending(self.posts[0].pk), 1)
+
+
+class CommentCountTests(TestCase):
+    """The approved comment count follows approvals, moves and deletions."""
+
+    def setUp(self):
+        author = User.objects.create_user('author')
+        self.post, self.other = [
+            BlogPost.objects.create(title=f'Post {i}', author=author, content='<p>Text</p>')
+            for i in range(2)
+        ]
+
+    def counts(self):
+        return [
+            BlogPost.objects.values_list('approved_comment_count', flat=True).get(pk=post.pk)
+            for post in (self.post, self.other)
+        ]
+
+    def test_signals(self):
+        comment = Comment.objects.create(post=self.post, name='A', email='a@example.com', content='Hi')
+        self.assertEqual(self.counts(), [0, 0])
+        comment.is_approved = True
+        comment.save()
+        self.assertEqual(self.counts(), [1, 0])
+        comment.post = self.other
+        comment.save()
+        self.assertEqual(self.counts(), [0, 1])
+        comment.delete()
+        self.assertEqual(self.counts(), [0, 0])
+
+    def test_admin_approval_recounts(self):
+        for post in (self.post, self.post, self.other):
+            Comment.objects.create(post=post, name='A', email='a@example.com', content='Hi')
+        request = RequestFactory().post('/')
+        request.user = User.objects.create_user('editor', is_staff=True)
+        request._messages = CookieStorage(request)
+        site._registry[Comment].approve_comments(request, Comment.objects.filter(post=self.post))
+        self.assertEqual(self.counts(), [2, 0])
+
+        BlogPost.objects.update(approved_comment_count=7)
+        call_command('refresh_comment_counts', stdout=StringIO())
+        self.assertEqual(self.counts(), [2, 0])
+
+
+def cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+@override_settings(ROOT_URLCONF='blog.urls')
+class CommentKeysetPaginationTests(TestCase):
+    """Comment cursors walk every approved comment once, both ways, newest first."""
+
+    def setUp(self):
+        author = User.objects.create_user('author')
+        self.post = BlogPost.objects.create(title='Post', author=author, content='<p>Text</p>')
+        self.comments = [
+            Comment.objects.create(post=self.post, name='A', email='a@example.com', content=f'{i}', is_approved=True)
+            for i in range(7)
+        ]
+        Comment.objects.create(post=self.post, name='B', email='b@example.com', content='Pending')
+        # Three comments share a timestamp, so only the id breaks the tie.
+        tied = datetime(2030, 1, 1, tzinfo=timezone.utc)
+        Comment.objects.filter(pk__in=[comment.pk for comment in self.comments[2:5]]).update(created_at=tied)
+        self.expected = list(
+            Comment.objects.filter(is_approved=True).order_by('-created_at', '-id').values_list('pk', flat=True)
+        )
+
+    def ids(self, response):
+        return [comment['id'] for comment in response.json()['results']]
+
+    def test_forward_and_back(self):
+        pages = [self.client.get(reverse('comment-list'), {'pagination': 'cursor', 'page_size': 2})]
+        while pages[-1].json()['next']:
+            pages.append(self.client.get(pages[-1].json()['next']))
+        self.assertEqual([comment_id for page in pages for comment_id in self.ids(page)], self.expected)
+        self.assertEqual([len(self.ids(page)) for page in pages], [2, 2, 2, 1])
+        self.assertIsNone(pages[0].json()['previous'])
+
+        back = self.client.get(pages[-1].json()['previous'])
+        self.assertEqual(self.ids(back), self.ids(pages[-2]))
+        back = self.client.get(back.json()['previous'])
+        self.assertEqual(self.ids(back), self.ids(pages[-3]))
+        self.assertEqual(self.ids(self.client.get(back.json()['next'])), self.ids(pages[-2]))
+
+    def test_invalid_cursors(self):
+        url = reverse('comment-list')
+        for value in ('not-base64!', cursor({'x': 1}), cursor({'k': ['yesterday', 1]}), cursor({'k': [1]})):
+            self.assertEqual(self.client.get(url, {'cursor': value}).status_code, 404, value)
+
+    def test_public_output(self):
+        comment = self.client.get(reverse('comment-detail', args=[self.comments[0].pk])).json()
+        self.assertNotIn('email', comment)
+        self.assertEqual(comment['post'], {'id': self.post.pk, 'title': 'Post', 'slug': 'post'})
+
+    def test_query_budget(self):
+        for size in (2, 7):
+            with self.subTest(size=size), self.assertNumQueries(1):
+                self.client.get(reverse('comment-list'), {'pagination': 'cursor', 'page_size': size})
+
+    def test_page_numbers_without_opt_in(self):
+        data = self.client.get(reverse('comment-list')).json()
+        self.assertEqual(data['count'], 7)
+        self.assertNotIn('approximate_count', data)
+
+    def test_approximate_count(self):
+        # SQLite keeps no planner statistics
+        data = self.client.get(reverse('comment-list'), {'pagination': 'cursor', 'count': 'approximate'}).json()
+        self.assertIsNone(data['approximate_count'])
+        self.assertEqual(len(data['results']), 7)
+
+        plan = mock.MagicMock(vendor='postgresql')
+        plan.cursor.return_value.__enter__.return_value.fetchone.return_value = ('[{"Plan": {"Plan Rows": 4200}}]',)
+        with mock.patch('core.pagination.connections', {'default': plan}):
+            self.assertEqual(approximate_count(Comment.objects.filter(is_approved=True)), 4200)
+        sql = plan.cursor.return_value.__enter__.return_value.execute.call_args[0][0]
+        self.assertTrue(sql.startswith('EXPLAIN (FORMAT JSON) SELECT'))
+
+
+@override_settings(ROOT_URLCONF='blog.urls')
+class BlogListQueryBudgetTests(TestCase):
+    """The post lists run a fixed number of queries, whatever the number of posts."""
+
+    def assertQueryBudget(self, budget, url):
+        for size in (1, 8):
+            with self.subTest(size=size):
+                BlogPost.objects.all().delete()
+                author = User.objects.get_or_create(username='author')[0]
+                category = BlogCategory.objects.get_or_create(name='Careers')[0]
+                for i in range(size):
+                    post = BlogPost.objects.create(
+                        title=f'Post {i}', author=author, category=category, content='<p>Text</p>',
+                        status='published', is_featured=True,
+                    )
+                    post.tags.add('cv', 'interview')
+                    RelatedResource.objects.create(post=post, title='Guide', resource_type='external')
+                    Comment.objects.create(
+                        post=post, name='A', email='a@example.com', content='Hi', is_approved=True
+                    )
+                with self.assertNumQueries(budget):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_post_list(self):
+        self.assertQueryBudget(4, reverse('blogpost-list'))
+        response = self.client.get(reverse('blogpost-list'))
+        self.assertEqual(response.json()['results'][0]['comment_count'], 1)
+
+    def test_featured_posts(self):
+        self.assertQueryBudget(3, reverse('featured-posts'))
+
+    def test_posts_by_category(self):
+        self.assertQueryBudget(4, reverse('posts-by-category', args=['careers']))
+
+    def test_posts_by_tag(self):
+        # The tag stats lookup replaces the join through taggit.
+        self.assertQueryBudget(4, reverse('posts-by-tag', args=['cv']))
+
+
+@override_settings(ROOT_URLCONF='blog.urls')
+class RelatedPostTests(TestCase):
+    """Related posts are precomputed from content similarity and kept current on save."""
+
+    def setUp(self):
+        self.author = User.objects.create_user('author')
+
+    def create_post(self, title, content, tags=(), status='published'):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = BlogPost.objects.create(title=title, author=self.author, content=content, status=status)
+            post.tags.add(*tags)
+        return post
+
+    def neighbours(self, post):
+        return list(RelatedPost.objects.filter(post=post).values_list('related__title', flat=True))
+
+    def test_ranked_by_similarity(self):
+        cv = self.create_post('Writing a CV', '<p>Keep your CV short and list achievements.</p>', ['cv'])
+        self.create_post('CV achievements', '<p>Achievements make a CV stand out.</p>', ['cv'])
+        self.create_post('Interview nerves', '<p>Breathe before the interview starts.</p>', ['interview'])
+        self.create_post('CV layout', '<p>Pick a clean layout for the CV.</p>', status='draft')
+        self.assertEqual(self.neighbours(cv), ['CV achievements'])
+
+        url = reverse('related-posts', args=[cv.slug])
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual([row['title'] for row in response.json()], ['CV achievements'])
+
+    def test_incremental_updates(self):
+        first = self.create_post('Salary negotiation', '<p>Negotiate salary with market data.</p>')
+        second = self.create_post('Salary research', '<p>Research salary ranges and market data.</p>')
+        self.assertEqual(self.neighbours(first), ['Salary research'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.status = 'draft'
+            second.save()
+        self.assertEqual(self.neighbours(first), [])
+
+        third = self.create_post('Market data', '<p>Where to find salary market data.</p>')
+        self.assertEqual(self.neighbours(first), ['Market data'])
+        with self.captureOnCommitCallbacks(execute=True):
+            third.delete()
+        self.assertEqual(RelatedPost.objects.count(), 0)
+
+        call_command('rebuild_related_posts', stdout=StringIO())
+        self.assertEqual(RelatedPost.objects.count(), 0)
+
+    def test_bulk_publishing_relates_posts(self):
+        first = self.create_post('Salary negotiation', '<p>Negotiate salary with market data.</p>')
+        second = self.create_post('Salary research', '<p>Research salary ranges and market data.</p>', status='draft')
+        request = RequestFactory().post('/')
+        request._messages = CookieStorage(request)
+        with self.captureOnCommitCallbacks(execute=True):
+            site._registry[BlogPost].make_published(request, BlogPost.objects.filter(pk=second.pk))
+        self.assertEqual(self.neighbours(first), ['Salary research'])
+        self.assertEqual(self.neighbours(second), ['Salary negotiation'])
+
+    def test_saves_only_read_the_changed_post(self):
+        cv = self.create_post('Writing a CV', '<p>Keep your CV short.</p>', ['cv'])
+        self.create_post('CV achievements', '<p>Achievements make a CV stand out.</p>', ['cv'])
+        interview = self.create_post('Interview nerves', '<p>Breathe before the interview.</p>')
+        untouched = set(RelatedTerm.objects.exclude(post=interview).values_list('pk', flat=True))
+
+        interview.content = '<p>Breathe, keep answers short and list achievements.</p>'
+        with mock.patch('blog.related.html_to_text', wraps=html_to_text) as parsed:
+            with self.captureOnCommitCallbacks(execute=True):
+                interview.save()
+
+        self.assertEqual(parsed.call_count, 1)
+        self.assertTrue(untouched <= set(RelatedTerm.objects.values_list('pk', flat=True)))
+        self.assertIn('Interview nerves', self.neighbours(cv))
+        self.assertEqual(self.neighbours(interview)[0], 'CV achievements')
+
+        # Unpublishing drops the post from the postings and from its neighbours' rows.
+        interview.status = 'draft'
+        with self.captureOnCommitCallbacks(execute=True):
+            interview.save()
+        self.assertFalse(RelatedTerm.objects.filter(post=interview).exists())
+        self.assertNotIn('Interview nerves', self.neighbours(cv))
+
+
+@override_settings(ROOT_URLCONF='blog.urls')
+class BlogSearchTests(TestCase):
+    """Published posts are ranked by relevance and recency and paged by cursor."""
+
+    def setUp(self):
+        self.author = User.objects.create_user('author')
+
+    def create_post(self, title, content, published_at, status='published'):
+        return BlogPost.objects.create(
+            title=title, author=self.author, content=content, status=status,
+            published_at=datetime(*published_at, tzinfo=timezone.utc),
+        )
+
+    def search(self, **params):
+        return self.client.get(reverse('blogpost-search'), params).json()
+
+    def test_ranking_and_snippets(self):
+        self.create_post('Old interview guide', '<p>Interview questions.</p>', (2024, 1, 1))
+        self.create_post('New interview guide', '<p>Interview questions.</p>', (2025, 1, 1))
+        self.create_post('Networking', '<p>Meet people &amp; ask about the <b>interview</b> process.</p>', (2025, 1, 1))
+        self.create_post('Draft interview', '<p>Interview.</p>', (2025, 1, 1), status='draft')
+        for i in range(5):
+            # Unrelated posts give the query term a realistic document frequency.
+            self.create_post(f'Careers {i}', '<p>Career advice.</p>', (2025, 1, 1))
+
+        results = self.search(q='interview')['results']
+        self.assertEqual(
+            [row['title'] for row in results],
+            ['New interview guide', 'Old interview guide', 'Networking'],
+        )
+        self.assertEqual(
+            results[2]['snippet'], 'Meet people &amp; ask about the <mark>interview</mark> process.'
+        )
+        self.assertEqual(self.search(q='')['results'], [])
+
+    def test_cursor_pagination(self):
+        for year in range(2019, 2026):
+            self.create_post(f'Salary tips {year}', '<p>Salary.</p>', (year, 6, 1))
+        titles = []
+        page = self.search(q='salary', page_size=3)
+        while True:
+            titles += [row['title'] for row in page['results']]
+            if not page['next']:
+                break
+            page = self.client.get(page['next']).json()
+        self.assertEqual(titles, [f'Salary tips {year}' for year in range(2025, 2018, -1)])
+
+
+@override_settings(ALLOWED_HOSTS=['example.com'], IMAGE_VARIANT_FORMATS=['webp', 'jpeg'])
+class RichTextRenderTests(TestCase):
+    """Rich text is sanitized, post-processed and cached by content hash."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_sanitizes(self):
+        html = (
+            '<p onclick="steal()" style="text-align: center; background: url(x)">Hi<script>alert(1)</script></p>'
+            '<a href="javascript:alert(1)">x</a><iframe src="https://evil.test"><p>inside</p></iframe><font>kept'
+        )
+        self.assertEqual(
+            render_rich_text(html),
+            '<p style="text-align: center">Hi</p><a>x</a>kept',
+        )
+
+    def test_post_processing(self):
+        html = (
+            '<h2>Getting started</h2><h2>Getting started</h2>'
+            '<p><a href="https://other.test/">out</a> <a href="https://example.com/in">in</a></p>'
+            '<img src="/media/uploads/cv.jpg" alt="CV">'
+        )
+        rendered = render_rich_text(html)
+        self.assertIn('<h2 id="getting-started">Getting started</h2><h2 id="getting-started-2">', rendered)
+        self.assertIn('<a href="https://other.test/" rel="noopener noreferrer nofollow">out</a>', rendered)
+        self.assertIn('<a href="https://example.com/in">in</a>', rendered)
+        self.assertIn('<img src="/media/uploads/cv.jpg" alt="CV" loading="lazy" decoding="async">', rendered)
+
+        # Variants arriving later replace the render that was waiting for them.
+        for image_format, extension in (('webp', 'webp'), ('jpeg', 'jpg')):
+            ImageVariant.objects.create(
+                source='uploads/cv.jpg', format=image_format, width=320, height=200,
+                file=f'variants/uploads/cv.abc.320w.{extension}',
+            )
+        cache.delete(manifest_key('uploads/cv.jpg'))
+        variants_generated.send(sender=BlogPost, source='uploads/cv.jpg', manifest={})
+        rendered = render_rich_text(html)
+        self.assertIn(
+            '<picture><source type="image/webp" srcset="/media/variants/uploads/cv.abc.320w.webp 320w" '
+            'sizes="(max-width: 320px) 100vw, 320px"><img src="/media/uploads/cv.jpg"',
+            rendered,
+        )
+
+    def test_cached_by_content_hash(self):
+        author = User.objects.create_user('author')
+        BlogPost.objects.create(title='Post', author=author, content='<h3>Tips</h3>')
+        with mock.patch.object(RichTextRenderer, 'render') as render:
+            self.assertEqual(render_rich_text('<h3>Tips</h3>'), '<h3 id="tips">Tips</h3>')
+        render.assert_not_called()
+
+    @override_settings(ALLOWED_HOSTS=[], SITE_URL='https://career.example')
+    def test_site_links_are_internal(self):
+        rendered = render_rich_text('<a href="https://career.example/blog/">in</a><a href="https://other.test/">out</a>')
+        self.assertIn('<a href="https://career.example/blog/">in</a>', rendered)
+        self.assertIn('<a href="https://other.test/" rel="noopener noreferrer nofollow">out</a>', rendered)
+
+    def test_list_renders_fetched_together(self):
+        author = User.objects.create_user('author')
+        for title in ('One', 'Two', 'Three'):
+            BlogPost.objects.create(title=title, author=author, content=f'<h2>{title}</h2>')
+        posts = BlogPostSerializer.setup_eager_loading(BlogPost.objects.order_by('title'))
+        with mock.patch('core.serializers.render_rich_text') as render_one, \
+                mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many:
+            data = BlogPostSerializer(posts, many=True, fields={'content'}).data
+        self.assertEqual([row['content'] for row in data], ['<h2 id="one">One</h2>', '<h2 id="three">Three</h2>', '<h2 id="two">Two</h2>'])
+        get_many.assert_called_once()
+        render_one.assert_not_called()
+
+
+@override_settings(ROOT_URLCONF='blog.urls', COMMENT_MAX_DEPTH=2)
+class CommentThreadTests(TestCase):
+    """Comments nest by materialized path and threads load without per-level queries."""
+
+    def setUp(self):
+        author = User.objects.create_user('author')
+        self.post = BlogPost.objects.create(title='Post', author=author, content='<p>Text</p>', status='published')
+
+    def comment(self, name, parent=None, is_approved=True):
+        return Comment.objects.create(
+            post=self.post, parent=parent, name=name, email='a@example.com', content=name,
+            is_approved=is_approved,
+        )
+
+    def names(self, threads):
+        return [(thread['name'], self.names(thread['replies'])) for thread in threads]
+
+    def test_paths_and_threads(self):
+        first = self.comment('first')
+        second = self.comment('second')
+        reply = self.comment('reply', first)
+        self.comment('nested', reply)
+        hidden = self.comment('hidden', first, is_approved=False)
+        self.comment('orphan', hidden)
+        self.comment('later', second)
+        self.assertEqual(reply.path, f'{first.path}/{reply.pk:010d}')
+        self.assertEqual(reply.depth, 1)
+
+        url = reverse('blogpost-comments', args=[self.post.slug])
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'page_size': 1})
+        page = response.json()
+        self.assertEqual(self.names(page['results']), [('first', [('reply', [('nested', [])])])])
+        page = self.client.get(page['next']).json()
+        self.assertEqual(self.names(page['results']), [('second', [('later', [])])])
+        self.assertIsNone(page['next'])
+
+        page = self.client.get(url, {'max_depth': 0}).json()
+        self.assertEqual(self.names(page['results']), [('first', []), ('second', [])])
+
+        detail = self.client.get(reverse('blogpost-detail', args=[self.post.slug])).json()
+        self.assertEqual(
+            self.names(detail['comments']),
+            [('first', [('reply', [('nested', [])])]), ('second', [('later', [])])],
+        )
+
+    def test_reply_validation(self):
+        top = self.comment('top')
+        reply = self.comment('reply', top)
+        deepest = self.comment('deepest', reply)
+        other = BlogPost.objects.create(title='Other', author=self.post.author, content='<p>Text</p>')
+        url = reverse('comment-list')
+        data = {'post_id': self.post.pk, 'name': 'A', 'email': 'a@example.com', 'content': 'Hi'}
+        self.assertEqual(self.client.post(url, {**data, 'parent': reply.pk}).status_code, 201)
+        self.assertEqual(self.client.post(url, {**data, 'parent': deepest.pk}).status_code, 400)
+        self.assertEqual(self.client.post(url, {**data, 'post_id': other.pk, 'parent': top.pk}).status_code, 400)
+
+    def test_max_depth_values(self):
+        first = self.comment('first')
+        self.comment('nested', self.comment('reply', first))
+        url = reverse('blogpost-comments', args=[self.post.slug])
+        for max_depth, expected in (('-5', []), ('1', [('reply', [])]), ('9', [('reply', [('nested', [])])])):
+            with self.subTest(max_depth=max_depth):
+                page = self.client.get(url, {'max_depth': max_depth}).json()
+                self.assertEqual(self.names(page['results']), [('first', expected)])
+        for max_depth in ('deep', '1.5', ''):
+            with self.subTest(max_depth=max_depth):
+                response = self.client.get(url, {'max_depth': max_depth})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('max_depth', response.json())
+
+    def test_failed_path_write_leaves_no_comment(self):
+        with mock.patch('blog.models.thread_path', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            self.comment('lost')
+        self.assertFalse(Comment.objects.exists())
+
+
+@override_settings(ROOT_URLCONF='blog.urls')
+class CategoryTreeTests(TestCase):
+    """Category listings include subcategories and the tree is served from the cache."""
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user('author')
+        self.careers = BlogCategory.objects.create(name='Careers')
+        self.cv = BlogCategory.objects.create(name='CV', parent=self.careers)
+        self.layout = BlogCategory.objects.create(name='Layout', parent=self.cv)
+        self.hidden = BlogCategory.objects.create(name='Hidden', parent=self.careers, is_active=False)
+        for category in (self.careers, self.layout, self.hidden):
+            BlogPost.objects.create(
+                title=f'In {category.name}', author=author, category=category, content='<p>Text</p>',
+                status='published',
+            )
+
+    def titles(self, response):
+        data = response.json()
+        posts = data['results'] if isinstance(data, dict) else data
+        return sorted(post['title'] for post in posts)
+
+    def test_listings_include_descendants(self):
+        self.assertEqual(
+            self.titles(self.client.get(reverse('posts-by-category', args=['careers']))),
+            ['In Careers', 'In Layout'],
+        )
+        self.assertEqual(
+            self.titles(self.client.get(reverse('blogpost-list'), {'category': 'cv'})),
+            ['In Layout'],
+        )
+        ancestors = self.client.get(reverse('blogcategory-ancestors', args=['layout'])).json()
+        self.assertEqual([category['slug'] for category in ancestors], ['careers', 'cv', 'layout'])
+
+    def test_cached_tree(self):
+        url = reverse('blogcategory-tree')
+        with self.assertNumQueries(3):
+            tree = self.client.get(url).json()
+        self.assertEqual(len(tree), 1)
+        self.assertEqual((tree[0]['slug'], tree[0]['post_count']), ('careers', 2))
+        self.assertEqual([child['slug'] for child in tree[0]['children']], ['cv'])
+        self.assertEqual(tree[0]['children'][0]['children'][0]['post_count'], 1)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BlogCategory.objects.create(name='Interviews')
+        self.assertEqual(len(self.client.get(url).json()), 2)
+
+    def test_bulk_publishing_refreshes_the_tree(self):
+        url = reverse('blogcategory-tree')
+        self.assertEqual(self.client.get(url).json()[0]['post_count'], 2)
+        BlogPost.objects.create(
+            title='Draft', author=User.objects.get(username='author'), category=self.cv, content='<p>Text</p>',
+        )
+        request = RequestFactory().post('/')
+        request._messages = CookieStorage(request)
+        with self.captureOnCommitCallbacks(execute=True):
+            site._registry[BlogPost].make_published(request, BlogPost.objects.filter(title='Draft'))
+        self.assertEqual(self.client.get(url).json()[0]['post_count'], 3)
+
+    def test_inactive_ancestor_hides_descendants_everywhere(self):
+        self.cv.is_active = False
+        self.cv.save()
+        tree = self.client.get(reverse('blogcategory-tree')).json()
+        self.assertEqual((tree[0]['post_count'], tree[0]['children']), (1, []))
+        self.assertEqual(
+            self.titles(self.client.get(reverse('posts-by-category', args=['careers']))), ['In Careers']
+        )
+        self.assertEqual(self.titles(self.client.get(reverse('posts-by-category', args=['layout']))), [])
+        self.assertEqual(self.titles(self.client.get(reverse('blogpost-list'), {'category': 'layout'})), [])
+
+
+@override_settings(ROOT_URLCONF='blog.urls')
+class TagStatsTests(TestCase):
+    """Tag counts and newest post ids follow publication and retagging, and serve the tag views."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author')
+
+    def create_post(self, title, tags=(), status='published'):
+        post = BlogPost.objects.create(title=title, author=self.author, content='<p>Text</p>', status=status)
+        post.tags.add(*tags)
+        return post
+
+    def stats(self):
+        return {
+            entry.tag.slug: (entry.post_count, entry.recent_post_ids)
+            for entry in BlogTagStats.objects.select_related('tag')
+        }
+
+    def test_stats_follow_publication_and_tags(self):
+        first = self.create_post('First', ['cv'])
+        second = self.create_post('Second', ['cv', 'salary'])
+        draft = self.create_post('Draft', ['cv'], status='draft')
+        self.assertEqual(self.stats(), {'cv': (2, [second.pk, first.pk]), 'salary': (1, [second.pk])})
+
+        draft.status = 'published'
+        draft.save()
+        self.assertEqual(self.stats()['cv'], (3, [draft.pk, second.pk, first.pk]))
+
+        second.status = 'draft'
+        second.save()
+        self.assertNotIn('salary', self.stats())
+
+        first.tags.remove('cv')
+        draft.tags.clear()
+        self.assertNotIn('cv', self.stats())
+
+        first.tags.add('salary')
+        first.delete()
+        self.assertEqual(self.stats(), {})
+
+    def test_refresh_runs_a_fixed_number_of_queries(self):
+        for i in range(4):
+            self.create_post(f'Post {i}', ['cv', f'tag-{i}'])
+        tag_ids = list(Tag.objects.values_list('pk', flat=True))
+        BlogTagStats.objects.all().delete()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(refresh_tag_stats(tag_ids), 5)
+        self.assertEqual(len([query for query in queries if 'blog_blogpost' in query['sql']]), 1)
+        self.assertEqual(self.stats()['cv'][0], 4)
+
+    def test_rebuild_matches_incremental_stats(self):
+        for i in range(3):
+            self.create_post(f'Post {i}', ['cv', f'tag-{i}'])
+        incremental = self.stats()
+        BlogTagStats.objects.all().delete()
+
+        self.assertEqual(rebuild_tag_stats(), 4)
+        self.assertEqual(self.stats(), incremental)
+
+    def test_tag_cloud(self):
+        for i in range(4):
+            self.create_post(f'Post {i}', ['cv'] if i else ['cv', 'salary'])
+        url = reverse('tag-cloud')
+
+        with self.assertNumQueries(2):
+            cloud = self.client.get(url).json()
+        self.assertEqual(
+            [(tag['slug'], tag['count'], tag['weight']) for tag in cloud], [('cv', 4, 5), ('salary', 1, 1)]
+        )
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        self.assertEqual(len(self.client.get(url, {'limit': 1}).json()), 1)
+
+    def test_tag_changes_refresh_the_cloud(self):
+        self.create_post('Post', ['cv', 'salary'])
+        url = reverse('tag-cloud')
+        etag = self.client.get(url)['ETag']
+
+        tag = Tag.objects.get(name='cv')
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.name = 'resume'
+            tag.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry['name'] for entry in response.json()], ['resume', 'salary'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.delete()
+        self.assertEqual([entry['name'] for entry in self.client.get(url).json()], ['salary'])
+
+    def test_posts_by_tag_pages_newest_first(self):
+        posts = [self.create_post(f'Post {i}', ['cv']) for i in range(3)]
+        url = reverse('posts-by-tag', args=['cv'])
+
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get(url, {'page_size': 2}).json()
+        self.assertNotIn('taggit_taggeditem', queries[1]['sql'])
+        self.assertEqual([post['title'] for post in first['results']], ['Post 2', 'Post 1'])
+        rest = self.client.get(first['next']).json()
+        self.assertEqual([post['title'] for post in rest['results']], ['Post 0'])
+        self.assertIsNone(rest['next'])
+
+        posts[2].status = 'draft'
+        posts[2].save()
+        data = self.client.get(url).json()
+        self.assertEqual([post['title'] for post in data['results']], ['Post 1', 'Post 0'])
+        self.assertEqual(self.client.get(reverse('posts-by-tag', args=['unknown'])).json()['results'], [])
+
+
+@override_settings(ROOT_URLCONF='blog.urls', API_URL='http://testserver', VIEW_COUNT_FLUSH_INTERVAL=0)
+class PublishedJSONTests(TestCase):
+    """Published posts and list pages are pre-rendered to the bytes Django itself serves."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        settings = override_settings(PUBLISHED_ROOT=self.root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(post_views.buffer.drain)
+        self.author = User.objects.create_user('author')
+
+    def create_post(self, title, status='published'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return BlogPost.objects.create(title=title, author=self.author, content='<p>Text</p>', status=status)
+
+    def published(self, relative):
+        path = os.path.join(self.root, relative)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as fh:
+            return json.loads(fh.read())
+
+    def test_files_match_django_responses(self):
+        post = self.create_post('Interview tips')
+        with self.captureOnCommitCallbacks(execute=True):
+            post.tags.add('interview')
+
+        detail = self.client.get(reverse('blogpost-detail', args=[post.slug]), HTTP_X_BLOG_VIEW_COUNT='skip')
+        self.assertEqual(self.published(detail_path(post.slug)), detail.json())
+        self.assertEqual(self.published(list_path(1)), self.client.get(reverse('blogpost-list')).json())
+        self.assertEqual(self.published(detail_path(post.slug))['tags'], ['interview'])
+
+    def test_drafts_and_unpublished_posts_have_no_files(self):
+        draft = self.create_post('Draft', status='draft')
+        post = self.create_post('Live')
+        self.assertIsNone(self.published(detail_path(draft.slug)))
+
+        post.status = 'draft'
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+
+        self.assertIsNone(self.published(detail_path(post.slug)))
+        self.assertEqual(self.published(list_path(1))['count'], 0)
+
+    def test_approved_comments_and_renames_are_republished(self):
+        post = self.create_post('Salary talks')
+        with self.captureOnCommitCallbacks(execute=True):
+            comment = Comment.objects.create(post=post, name='A', email='a@example.com', content='Hi')
+        self.assertEqual(self.published(detail_path(post.slug))['comments'], [])
+
+        comment.is_approved = True
+        with self.captureOnCommitCallbacks(execute=True):
+            comment.save()
+        self.assertEqual(len(self.published(detail_path(post.slug))['comments']), 1)
+        self.assertEqual(self.published(list_path(1))['results'][0]['comment_count'], 1)
+
+        old_slug = post.slug
+        post.slug = 'negotiating-salary'
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+        self.assertIsNone(self.published(detail_path(old_slug)))
+        self.assertEqual(self.published(detail_path('negotiating-salary'))['title'], 'Salary talks')
+
+    @override_settings(
+        DEBUG=False, ALLOWED_HOSTS=['api.example.com'], API_URL='https://api.example.com',
+        SITE_URL='https://www.example.com',
+    )
+    def test_links_point_at_the_api(self):
+        for i in range(11):
+            self.create_post(f'Post {i}')
+        page = self.published(list_path(1))
+        self.assertEqual(page['next'], 'https://api.example.com/posts/?page=2')
+        self.assertEqual(self.published(list_path(2))['previous'], 'https://api.example.com/posts/')
+
+    def test_list_pages_follow_publication(self):
+        posts = [self.create_post(f'Post {i}', status='draft') for i in range(11)]
+        request = RequestFactory().post('/')
+        request._messages = CookieStorage(request)
+        with self.captureOnCommitCallbacks(execute=True):
+            site._registry[BlogPost].make_published(request, BlogPost.objects.all())
+
+        self.assertEqual(self.published(detail_path(posts[0].slug))['status'], 'published')
+        self.assertEqual(self.published(list_path(1))['count'], 11)
+        self.assertEqual([post['title'] for post in self.published(list_path(2))['results']], ['Post 0'])
+        self.assertIsNone(self.published(list_path(3)))
+
+        posts[10].status = 'draft'
+        with self.captureOnCommitCallbacks(execute=True):
+            posts[10].save()
+        self.assertIsNone(self.published(list_path(2)))
+
+    def test_view_count_headers(self):
+        post = self.create_post('Counted')
+        url = reverse('blogpost-detail', args=[post.slug])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_X_BLOG_VIEW_COUNT='only').status_code, 204)
+        self.client.get(url, HTTP_X_BLOG_VIEW_COUNT='skip')
+        self.client.get(url)
+        # Resolved from the pre-rendered file once the cache has forgotten the slug
+        cache.delete(pk_key(post.slug))
+        with self.assertNumQueries(0):
+            self.client.get(url, HTTP_X_BLOG_VIEW_COUNT='only')
+        # Not published, not counted
+        self.client.get(reverse('blogpost-detail', args=['missing']), HTTP_X_BLOG_VIEW_COUNT='only')
+
+        self.assertEqual(post_views.pending(post.pk), 3)
+
+    def test_worker_renders_a_queued_change_once(self):
+        started, release = threading.Event(), threading.Event()
+        runs = []
+
+        def hold():
+            started.set()
+            release.wait(5)
+
+        def record(name):
+            runs.append(name)
+
+        with override_settings(BLOG_PUBLISHING_WORKERS=1):
+            submit(hold)
+            started.wait(5)
+            for name in ('page', 'page', 'post', 'page', {'feed': 'rss'}, {'feed': 'rss'}):
+                submit(record, name)
+            release.set()
+            get_executor().submit(lambda: None).result(5)
+
+        # Jobs with unhashable arguments cannot be matched, so each one runs.
+        self.assertEqual(runs, ['page', 'post', {'feed': 'rss'}, {'feed': 'rss'}])
+
+    def test_publish_blog_json_prunes_stale_posts(self):
+        post = self.create_post('Kept')
+        BlogPost.objects.filter(pk=post.pk).update(slug='renamed')
+        out = StringIO()
+
+        call_command('publish_blog_json', stdout=out)
+
+        self.assertIn('Published 1 blog posts.', out.getvalue())
+        self.assertIsNone(self.published(detail_path('kept')))
+        self.assertEqual(self.published(detail_path('renamed'))['title'], 'Kept')
@@ -0,0 +1,74 @@
+"""
+Threaded blog comments stored as materialized paths.
+
+Each comment's `path` is its ancestors' ids and its own, zero-padded and
+joined with '/', so sorting a post's comments by path lists every thread in
+display order: each top-level comment followed by its replies, depth first,
+oldest first at every level. A whole thread, or a page of threads, is one
+range scan on the `(post, path)` index, and the tree is assembled in Python.
+"""
+
+from django.conf import settings
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, LPad
+
+# Digits per path segment; ids up to 10^10 - 1 keep paths sortable.
+SEGMENT_WIDTH = 10
+
+
+def segment(pk):
+    return str(pk).zfill(SEGMENT_WIDTH)
+
+
+def thread_path(comment):
+    """The path of a saved comment, under its parent's path."""
+    if comment.parent_id:
+        return f'{comment.parent.path}/{segment(comment.pk)}'
+    return segment(comment.pk)
+
+
+def build_tree(comments):
+    """Attach each comment's replies as `thread_replies` and return the top-level ones.
+
+    `comments` must be in path order. Replies whose parent is not among them
+    (e.g. unapproved or beyond the depth limit) are left out with it.
+    """
+    nodes = {}
+    roots = []
+    for comment in comments:
+        comment.thread_replies = []
+        if comment.parent_id is None:
+            roots.append(comment)
+        elif comment.parent_id in nodes:
+            nodes[comment.parent_id].thread_replies.append(comment)
+        else:
+            continue
+        nodes[comment.pk] = comment
+    return roots
+
+
+def approved_thread(post, max_depth=None):
+    """The approved comments of `post` in display order, to `max_depth` levels of replies."""
+    if max_depth is None:
+        max_depth = settings.COMMENT_MAX_DEPTH
+    return post.comments.filter(is_approved=True, depth__lte=max_depth).order_by('path')
+
+
+def threads_for(post, roots, max_depth=None):
+    """The threads of the top-level comments `roots` (consecutive in path order), in one query."""
+    if not roots:
+        return []
+    # Any later top-level path differs from the last one within its first segment, so
+    # appending '0' (which sorts after '/') bounds the last root's replies.
+    comments = approved_thread(post, max_depth).filter(
+        path__gte=roots[0].path, path__lt=f'{roots[-1].path}0'
+    )
+    return build_tree(comments)
+
+
+def backfill_comment_paths(sender, using='default', **kwargs):
+    """post_migrate receiver giving comments saved before threading their top-level path."""
+    from .models import Comment
+    Comment.objects.using(using).filter(path='').update(
+        path=LPad(Cast('id', CharField()), SEGMENT_WIDTH, Value('0')), depth=0
+    )
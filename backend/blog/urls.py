@@ -12,6 +12,7 @@ urlpatterns = [
     path('featured-posts/', views.FeaturedPostsView.as_view(), name='featured-posts'),
     path('posts/by-category/<slug:category_slug>/', views.PostsByCategoryView.as_view(), name='posts-by-category'),
     path('posts/by-tag/<slug:tag_slug>/', views.PostsByTagView.as_view(), name='posts-by-tag'),
+    path('tags/', views.TagCloudView.as_view(), name='tag-cloud'),
     path('posts/<slug:slug>/related/', views.RelatedPostsView.as_view(), name='related-posts'),
 ]
 
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db.models import Q, Count
 from django.shortcuts import get_object_or_404
 
@@ -5,13 +6,24 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 
+from core.mixins import SparseFieldsetMixin
+from core.pagination import KeysetPagination, PathKeysetPagination, RecentKeysetPagination, SearchRankPagination
+from .caching import category_tree_cache, tag_cloud_cache
+from .categories import category_posts, category_tree, subtree
+from .counters import post_views
 from .models import BlogCategory, BlogPost, Comment, RelatedResource
+from .publishing import published_pk
+from .search import post_index, search_posts
 from .serializers import (
-    BlogCategorySerializer, BlogPostSerializer, CommentSerializer,
-    RelatedResourceSerializer, BlogPostDetailSerializer
+    BlogCategorySerializer, BlogCategoryTreeSerializer, BlogPostSerializer, CommentSerializer,
+    RelatedResourceSerializer, BlogPostDetailSerializer, BlogSearchResultSerializer,
+    CommentThreadSerializer
 )
+from .tag_stats import first_page_ids, tag_cloud
+from .threads import threads_for
 
 
 class BlogCategoryViewSet(viewsets.ModelViewSet):
@@ -22,7 +34,7 @@ class BlogCategoryViewSet(viewsets.ModelViewSet):
     
     def get_permissions(self):
         """Set permissions based on action."""
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'tree', 'ancestors']:
             permission_classes = [AllowAny]
         else:
             permission_classes = [IsAdminUser]
@@ -37,9 +49,25 @@ class BlogCategoryViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(is_active=True)
             
         return queryset
+    
+    @action(detail=False, methods=['get'])
+    @category_tree_cache
+    def tree(self, request):
+        """Get the active categories as a nested tree with cumulative post counts."""
+        serializer = BlogCategoryTreeSerializer(
+            category_tree(), many=True, context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    def ancestors(self, request, slug=None):
+        """Get the path from the top-level category down to this one."""
+        category = self.get_object()
+        serializer = self.get_serializer(category.get_ancestors(include_self=True), many=True)
+        return Response(serializer.data)
 
 
-class BlogPostViewSet(viewsets.ModelViewSet):
+class BlogPostViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for the BlogPost model."""
     queryset = BlogPost.objects.all()
     serializer_class = BlogPostSerializer
@@ -47,7 +75,7 @@ class BlogPostViewSet(viewsets.ModelViewSet):
     
     def get_permissions(self):
         """Set permissions based on action."""
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'search', 'comments']:
             permission_classes = [AllowAny]
         else:
             permission_classes = [IsAdminUser]
@@ -59,28 +87,33 @@ class BlogPostViewSet(viewsets.ModelViewSet):
         
         # Filter published posts for non-admin users
         if not self.request.user.is_staff:
-            queryset = queryset.filter(is_published=True)
+            queryset = queryset.filter(status='published')
         
-        # Filter by category
+        # Filter by category, including its subcategories
         category_slug = self.request.query_params.get('category', None)
         if category_slug:
-            queryset = queryset.filter(category__slug=category_slug)
+            category = BlogCategory.objects.filter(slug=category_slug).first()
+            queryset = queryset.filter(category__in=subtree(category)) if category else queryset.none()
         
         # Filter by tag
         tag = self.request.query_params.get('tag', None)
         if tag:
             queryset = queryset.filter(tags__name__in=[tag])
         
-        # Search by title or content
+        # Full-text search, best matches first
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) | 
-                Q(content__icontains=search) |
-                Q(excerpt__icontains=search)
-            )
-            
-        return queryset
+            queryset = post_index.search(queryset, search)
+        
+        return self.setup_eager_loading(queryset)
+    
+    def setup_eager_loading(self, queryset):
+        """Shape the queryset for whatever the current action serializes."""
+        if self.action in ['views', 'comments', 'related_resources']:
+            # These only look the post up; they do not serialize it.
+            return queryset
+        queryset = self.get_serializer_class().setup_eager_loading(queryset, *self.get_field_selection())
+        return self.restrict_queryset(queryset)
     
     def get_serializer_class(self):
         """Return different serializer for detail view."""
@@ -88,13 +121,72 @@ class BlogPostViewSet(viewsets.ModelViewSet):
             return BlogPostDetailSerializer
         return super().get_serializer_class()
     
+    def retrieve(self, request, *args, **kwargs):
+        """Return a blog post and count the view in the write buffer.
+        
+        nginx answers most reads from pre-rendered files (blog.publishing) and
+        mirrors each one here with `X-Blog-View-Count: only`, which just counts
+        the view, without a database query. Its fallback to this view sends
+        `skip` so views count once.
+        """
+        counting = request.headers.get('X-Blog-View-Count')
+        if counting == 'only':
+            pk = published_pk(kwargs[self.lookup_url_kwarg or self.lookup_field])
+            if pk is not None:
+                post_views.increment(pk)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        instance = self.get_object()
+        if counting != 'skip':
+            post_views.increment(instance.pk)
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+    
+    @action(
+        detail=False, methods=['get'],
+        serializer_class=BlogSearchResultSerializer, pagination_class=SearchRankPagination,
+    )
+    def search(self, request):
+        """Search published posts by relevance and recency, with highlighted snippets."""
+        queryset = search_posts(
+            BlogPost.objects.filter(status='published'), request.query_params.get('q', None)
+        )
+        queryset = queryset.select_related('category').defer('search_vector')
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    def views(self, request, slug=None):
+        """Get the stored, still buffered and live view counts of a blog post."""
+        post = self.get_object()
+        pending = post_views.pending(post.pk)
+        return Response({
+            'stored': post.view_count,
+            'pending': pending,
+            'live': post.view_count + pending,
+        })
+    
     @action(detail=True, methods=['get'])
     def comments(self, request, slug=None):
-        """Get approved comments for a blog post."""
+        """Get a page of approved comment threads for a blog post.
+        
+        Top-level comments are paged by cursor; `max_depth` limits how many
+        levels of replies are included.
+        """
         post = self.get_object()
-        comments = post.comments.filter(is_approved=True, parent=None)
-        serializer = CommentSerializer(comments, many=True)
-        return Response(serializer.data)
+        max_depth = settings.COMMENT_MAX_DEPTH
+        if 'max_depth' in request.query_params:
+            try:
+                max_depth = max(0, min(int(request.query_params['max_depth']), max_depth))
+            except ValueError:
+                raise ValidationError({'max_depth': 'A whole number is required.'})
+        paginator = PathKeysetPagination()
+        roots = paginator.paginate_queryset(
+            post.comments.filter(is_approved=True, parent=None), request, view=self
+        )
+        threads = threads_for(post, roots, max_depth)
+        serializer = CommentThreadSerializer(threads, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
     
     @action(detail=True, methods=['get'])
     def related_resources(self, request, slug=None):
@@ -109,6 +201,7 @@ class CommentViewSet(viewsets.ModelViewSet):
     """ViewSet for the Comment model."""
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
+    pagination_class = KeysetPagination
     
     def get_permissions(self):
         """Set permissions based on action."""
@@ -122,7 +215,7 @@ class CommentViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filter queryset based on user permissions."""
-        queryset = Comment.objects.all()
+        queryset = Comment.objects.select_related('post')
         
         # Filter approved comments for non-admin users
         if not self.request.user.is_staff:
@@ -145,30 +238,54 @@ class FeaturedPostsView(APIView):
     permission_classes = [AllowAny]
     
     def get(self, request):
-        posts = BlogPost.objects.filter(is_featured=True, is_published=True)
+        posts = BlogPostSerializer.setup_eager_loading(
+            BlogPost.objects.filter(is_featured=True, status='published')
+        )
         serializer = BlogPostSerializer(posts, many=True)
         return Response(serializer.data)
 
 
 class PostsByCategoryView(APIView):
-    """View for getting blog posts by category."""
+    """View for getting blog posts by category, including its subcategories."""
     permission_classes = [AllowAny]
     
     def get(self, request, category_slug):
         category = get_object_or_404(BlogCategory, slug=category_slug, is_active=True)
-        posts = BlogPost.objects.filter(category=category, is_published=True)
+        posts = BlogPostSerializer.setup_eager_loading(category_posts(category))
         serializer = BlogPostSerializer(posts, many=True)
         return Response(serializer.data)
 
 
 class PostsByTagView(APIView):
-    """View for getting blog posts by tag."""
+    """View for getting blog posts by tag, newest first, a cursor page at a time."""
     permission_classes = [AllowAny]
     
     def get(self, request, tag_slug):
-        posts = BlogPost.objects.filter(tags__slug=tag_slug, is_published=True)
-        serializer = BlogPostSerializer(posts, many=True)
-        return Response(serializer.data)
+        paginator = RecentKeysetPagination()
+        ids = None
+        if paginator.cursor_query_param not in request.query_params:
+            ids = first_page_ids(tag_slug, paginator.get_page_size(request))
+        if ids is not None:
+            # The tag stats list the newest ids, so the first page skips the join through taggit
+            posts = BlogPost.objects.filter(pk__in=ids, status='published')
+        else:
+            posts = BlogPost.objects.filter(tags__slug=tag_slug, status='published')
+        page = paginator.paginate_queryset(BlogPostSerializer.setup_eager_loading(posts), request, view=self)
+        serializer = BlogPostSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class TagCloudView(APIView):
+    """View for getting the tags of published posts with their counts and cloud weights."""
+    permission_classes = [AllowAny]
+    
+    @tag_cloud_cache
+    def get(self, request):
+        try:
+            limit = max(int(request.query_params['limit']), 1)
+        except (KeyError, ValueError):
+            limit = None
+        return Response(tag_cloud(limit))
 
 
 class RelatedPostsView(APIView):
@@ -176,12 +293,12 @@ class RelatedPostsView(APIView):
     permission_classes = [AllowAny]
     
     def get(self, request, slug):
-        post = get_object_or_404(BlogPost, slug=slug, is_published=True)
+        post = get_object_or_404(BlogPost, slug=slug, status='published')
         
-        # Get posts with the same category or tags
-        related_posts = BlogPost.objects.filter(
-            Q(category=post.category) | Q(tags__in=post.tags.all())
-        ).exclude(id=post.id).distinct().filter(is_published=True)[:5]
+        # Precomputed content-similarity neighbours (blog.related), best first
+        related_posts = BlogPostSerializer.setup_eager_loading(
+            BlogPost.objects.filter(related_to__post=post, status='published').order_by('related_to__rank')
+        )
         
         serializer = BlogPostSerializer(related_posts, many=True)
         return Response(serializer.data)
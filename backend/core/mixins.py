@@ -0,0 +1,60 @@
+"""
+View mixins shared by the project's apps.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.permissions import SAFE_METHODS
+
+from .serializers import DynamicFieldsMixin, parse_field_list
+
+
+class SparseFieldsetMixin:
+    """Pass `?fields=` and `?expand=` to the serializer and trim the queryset to match.
+
+    Only read requests are affected; writes always see the full serializer.
+    """
+
+    def get_field_selection(self):
+        """Return the requested `(fields, expand)` sets, each None when not given."""
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in SAFE_METHODS:
+            return None, None
+        return (
+            parse_field_list(request.query_params.get('fields')),
+            parse_field_list(request.query_params.get('expand')),
+        )
+
+    def get_serializer(self, *args, **kwargs):
+        if issubclass(self.get_serializer_class(), DynamicFieldsMixin):
+            fields, expand = self.get_field_selection()
+            kwargs.setdefault('fields', fields)
+            kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
+
+    def restrict_queryset(self, queryset):
+        """Load only the columns behind the requested fields.
+        
+        Fields computed from several columns list them in the serializer's
+        `Meta.field_columns`.
+        """
+        fields, expand = self.get_field_selection()
+        if fields is None:
+            return queryset
+        opts = queryset.model._meta
+        columns = {opts.pk.name}
+        serializer_class = self.get_serializer_class()
+        field_columns = getattr(serializer_class.Meta, 'field_columns', {})
+        for name, field in serializer_class().fields.items():
+            if name not in fields or field.write_only:
+                continue
+            if name in field_columns:
+                columns.update(field_columns[name])
+                continue
+            try:
+                model_field = opts.get_field(field.source.split('.')[0])
+            except FieldDoesNotExist:
+                continue
+            # Reverse one-to-ones are joined with select_related and must not be deferred.
+            if model_field.concrete or model_field.one_to_one:
+                columns.add(model_field.name)
+        return queryset.only(*columns)
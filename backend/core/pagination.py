@@ -0,0 +1,191 @@
+"""
+Keyset (cursor) pagination for large, append-mostly tables.
+
+Pages are sliced with a row comparison on a stable composite key such as
+`(created_at, id)`, so every page is an index range scan: no COUNT(*) and no
+OFFSET. Cursors are opaque to clients.
+"""
+
+import base64
+import json
+from collections import OrderedDict
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def approximate_count(queryset):
+    """Estimate the number of rows in `queryset` from planner statistics.
+
+    Returns None where the database keeps no usable statistics.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination over a composite key, opted into with `?pagination=cursor`.
+
+    Without the opt-in the endpoint keeps page-number pagination, so existing
+    clients are unaffected. `?count=approximate` adds a planner estimate of the
+    total instead of an exact count.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    opt_in_query_param = 'pagination'
+    count_query_param = 'count'
+    fallback_class = PageNumberPagination
+
+    def __init__(self):
+        self.fallback = None
+        self.descending = self.ordering[0].startswith('-')
+        assert all(key.startswith('-') == self.descending for key in self.ordering), (
+            'KeysetPagination keys must all sort in the same direction.'
+        )
+        self.keys = [key.lstrip('-') for key in self.ordering]
+
+    def use_keyset(self, request):
+        return (
+            request.query_params.get(self.opt_in_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, row, reverse):
+        values = [getattr(row, key) for key in self.keys]
+        payload = {'k': [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]}
+        if reverse:
+            payload['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            values = [self.key_to_python(model, key, value) for key, value in zip(self.keys, payload['k'])]
+        except (TypeError, ValueError, KeyError, ValidationError) as exc:
+            raise NotFound('Invalid cursor.') from exc
+        if len(values) != len(self.keys):
+            raise NotFound('Invalid cursor.')
+        return values, bool(payload.get('r'))
+
+    def key_to_python(self, model, key, value):
+        try:
+            field = model._meta.get_field(key)
+        except FieldDoesNotExist:
+            # Annotated keys are numbers, which survive the JSON round trip unchanged.
+            return float(value)
+        return field.to_python(value)
+
+    def keyset_filter(self, values, forward):
+        """Rows strictly after (forward) or before the key `values` in page order."""
+        lookup = 'lt' if self.descending == forward else 'gt'
+        clauses = []
+        for position, key in enumerate(self.keys):
+            clause = {f'{key}__{lookup}': values[position]}
+            clause.update({self.keys[earlier]: values[earlier] for earlier in range(position)})
+            clauses.append(Q(**clause))
+        return reduce(or_, clauses)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.use_keyset(request):
+            self.fallback = self.fallback_class()
+            return self.fallback.paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.base_url = remove_query_param(request.build_absolute_uri(), 'page')
+        page_size = self.get_page_size(request)
+        values, reverse = self.decode_cursor(request, queryset.model)
+
+        self.total = None
+        if request.query_params.get(self.count_query_param) == 'approximate':
+            self.total = approximate_count(queryset)
+
+        order = list(self.ordering)
+        if reverse:
+            order = [key[1:] if key.startswith('-') else f'-{key}' for key in order]
+        queryset = queryset.order_by(*order)
+        if values is not None:
+            queryset = queryset.filter(self.keyset_filter(values, forward=not reverse))
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_link = None
+        self.previous_link = None
+        if rows:
+            if has_more or reverse:
+                self.next_link = self.encode_cursor(rows[-1], reverse=False)
+            if values is not None and (has_more or not reverse):
+                self.previous_link = self.encode_cursor(rows[0], reverse=True)
+        return rows
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        payload = OrderedDict([
+            ('next', self.next_link),
+            ('previous', self.previous_link),
+            ('results', data),
+        ])
+        if self.request.query_params.get(self.count_query_param) == 'approximate':
+            payload['approximate_count'] = self.total
+        return Response(payload)
+
+
+class RecentKeysetPagination(KeysetPagination):
+    """Keyset pagination on `(created_at, id)`, newest first, always by cursor."""
+
+    def use_keyset(self, request):
+        return True
+
+
+class PathKeysetPagination(KeysetPagination):
+    """Keyset pagination of tree rows in materialized `path` order, always by cursor."""
+    ordering = ('path',)
+
+    def use_keyset(self, request):
+        return True
+
+
+class SearchRankPagination(KeysetPagination):
+    """Keyset pagination of ranked search results on `(search_score, id)`, best first.
+
+    The score is an annotation, so it must not depend on when the page is
+    requested. Search results have no page numbers; cursors are always used.
+    """
+    ordering = ('-search_score', '-id')
+
+    def use_keyset(self, request):
+        return True
@@ -0,0 +1,57 @@
+"""
+Files written for nginx to serve without touching Django.
+
+Every file is written atomically under `settings.PUBLISHED_ROOT` together
+with a gzip copy, so nginx's `gzip_static` can send the precompressed bytes.
+Unchanged content is not rewritten, which keeps modification times (and so
+nginx's ETags and Last-Modified headers) stable.
+"""
+
+import gzip
+import os
+import tempfile
+
+from django.conf import settings
+
+
+def published_path(relative_path):
+    return os.path.join(settings.PUBLISHED_ROOT, relative_path)
+
+
+def _write_atomic(path, data):
+    directory = os.path.dirname(path)
+    fd, temporary = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def publish(relative_path, content):
+    """Write `content` (str or bytes) and its .gz twin. Returns whether the file changed."""
+    data = content.encode() if isinstance(content, str) else content
+    path = published_path(relative_path)
+    try:
+        with open(path, 'rb') as fh:
+            if fh.read() == data:
+                return False
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    # mtime=0 makes the compressed bytes depend on the content alone.
+    _write_atomic(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+    _write_atomic(path, data)
+    return True
+
+
+def unpublish(relative_path):
+    """Remove a published file and its .gz twin, if present."""
+    path = published_path(relative_path)
+    for name in (path, path + '.gz'):
+        try:
+            os.remove(name)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,128 @@
+"""
+Cache of rendered API responses with strong ETags.
+
+A cached view stores its rendered bytes together with an ETag derived from
+the newest modification time and row count of the data behind it. Conditional
+requests are answered with 304 from the cache alone, before any query runs.
+Entries are keyed by a generation counter that signal handlers bump, so an
+invalidation retires every rendered format at once.
+"""
+
+import functools
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, urlencode
+
+# Rendered entries outlive any sane invalidation gap; the generation key does the real work.
+DEFAULT_TIMEOUT = 60 * 60 * 24
+
+
+class ResponseCache:
+    """Rendered-response cache for one read-only endpoint.
+
+    `sources` is a callable returning `(queryset, timestamp_field)` pairs
+    describing the rows the response is built from. `params` names the query
+    parameters that select different responses; each combination is cached
+    separately. With `public_only`, staff requests bypass the cache because
+    they may see unpublished rows.
+    """
+
+    def __init__(self, name, sources, timeout=DEFAULT_TIMEOUT, params=(), public_only=False):
+        self.name = name
+        self.sources = sources
+        self.timeout = timeout
+        self.params = params
+        self.public_only = public_only
+
+    @property
+    def generation_key(self):
+        return f'response:{self.name}:generation'
+
+    def generation(self):
+        generation = cache.get(self.generation_key)
+        if generation is None:
+            # Seed from the clock so a lost counter never reuses an old generation.
+            cache.add(self.generation_key, time.time_ns(), timeout=None)
+            generation = cache.get(self.generation_key)
+        return generation
+
+    def variant(self, request):
+        """Normalized encoding of the request's values for `params`."""
+        values = [(name, request.query_params.get(name, '').strip()) for name in self.params]
+        return urlencode([(name, value) for name, value in values if value])
+
+    def entry_key(self, generation, media_type, variant=''):
+        key = f'response:{self.name}:{generation}:{media_type}'
+        if variant:
+            key += ':' + hashlib.sha1(variant.encode()).hexdigest()
+        return key
+
+    def compute_etag(self, generation, variant=''):
+        """Build a strong ETag from the generation and the sources' max timestamp and count."""
+        parts = [self.name, str(generation), variant]
+        for queryset, timestamp_field in self.sources():
+            stats = queryset.aggregate(latest=Max(timestamp_field), count=Count('pk'))
+            parts.append(f"{stats['latest'].isoformat() if stats['latest'] else '-'}/{stats['count']}")
+        return '"%s"' % hashlib.sha1(':'.join(parts).encode()).hexdigest()
+
+    def invalidate(self):
+        """Retire every cached rendering once the current transaction commits."""
+        transaction.on_commit(self._bump_generation)
+
+    def _bump_generation(self):
+        try:
+            cache.incr(self.generation_key)
+        except ValueError:
+            cache.set(self.generation_key, time.time_ns(), timeout=None)
+
+    def __call__(self, method):
+        """Decorate an APIView `get` handler."""
+
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            # The browsable API embeds per-user markup, so only JSON is shared.
+            if request.accepted_renderer.format != 'json':
+                return method(view, request, *args, **kwargs)
+            if self.public_only and request.user.is_staff:
+                return method(view, request, *args, **kwargs)
+            generation = self.generation()
+            variant = self.variant(request)
+            key = self.entry_key(generation, request.accepted_media_type, variant)
+            entry = cache.get(key)
+            if entry is None:
+                etag = self.compute_etag(generation, variant)
+                response = method(view, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                # Render now so the bytes can be stored; DRF will not render twice.
+                response.accepted_renderer = request.accepted_renderer
+                response.accepted_media_type = request.accepted_media_type
+                response.renderer_context = view.get_renderer_context()
+                response.render()
+                entry = {
+                    'etag': etag,
+                    'content': response.content,
+                    'content_type': response['Content-Type'],
+                }
+                cache.set(key, entry, self.timeout)
+
+            if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+            if if_none_match:
+                # If-None-Match uses the weak comparison, so W/ prefixes are ignored.
+                etags = [tag[2:] if tag.startswith('W/') else tag for tag in parse_etags(if_none_match)]
+                if '*' in etags or entry['etag'] in etags:
+                    response = HttpResponseNotModified()
+                    response['ETag'] = entry['etag']
+                    return response
+
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+            response['ETag'] = entry['etag']
+            response['Cache-Control'] = 'no-cache'
+            return response
+
+        return wrapper
@@ -0,0 +1,297 @@
+"""
+Sanitized, post-processed rendering of CKEditor rich text.
+
+CKEditor runs with `allowedContent: True`, so stored bodies may hold any
+markup. Before clients see a body it is rebuilt from an allowlist of tags,
+attributes, URL schemes and inline style properties, and then:
+
+* images get `loading="lazy"` and, when the imaging pipeline has variants
+  for them, a `srcset` (inside a `<picture>` for the extra formats);
+* `h2`-`h4` headings get a unique `id` anchor from their text;
+* links to hosts other than the site's (`SITE_URL`) and the API's
+  (`ALLOWED_HOSTS`) get `rel="noopener noreferrer nofollow"`.
+
+Renders are cached under a hash of the source HTML, so an unchanged body is
+never processed twice and an edited one never serves a stale render. Models
+prerender their bodies on save; anything else renders on the first miss.
+A render that references images still waiting for variants is cached
+briefly and dropped as soon as those variants are generated.
+"""
+
+import hashlib
+import re
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.dispatch import receiver
+from django.http.request import validate_host
+from django.utils.text import slugify
+
+from imaging.pipeline import MISSING_TIMEOUT, get_manifest, schedule
+from imaging.signals import variants_generated
+
+# Bump whenever the rendered output changes so old renders are not reused.
+RENDER_VERSION = 2
+CACHE_TIMEOUT = 30 * 24 * 60 * 60
+
+ALLOWED_TAGS = {
+    'a', 'abbr', 'b', 'blockquote', 'br', 'caption', 'cite', 'code', 'col', 'colgroup', 'dd', 'del',
+    'div', 'dl', 'dt', 'em', 'figcaption', 'figure', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'i',
+    'img', 'ins', 'li', 'mark', 'ol', 'p', 'pre', 'q', 's', 'small', 'span', 'strong', 'sub', 'sup',
+    'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'u', 'ul',
+}
+ALLOWED_ATTRIBUTES = {
+    '*': {'class', 'title', 'lang', 'dir', 'style'},
+    'a': {'href', 'target', 'rel'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan', 'scope'},
+    'ol': {'start', 'type'},
+    'col': {'span'},
+    **{f'h{level}': {'id'} for level in range(1, 7)},
+}
+# Dropped together with everything inside them.
+DROPPED_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript', 'textarea', 'svg', 'math'}
+VOID_TAGS = {'br', 'hr', 'img', 'col'}
+URL_SCHEMES = {'', 'http', 'https', 'mailto', 'tel'}
+# What the CKEditor toolbar (alignment, colours, font size, image size) writes.
+STYLE_PROPERTIES = {
+    'text-align', 'color', 'background-color', 'font-size', 'font-weight', 'font-style',
+    'text-decoration', 'float', 'width', 'height', 'margin-left', 'margin-right',
+}
+STYLE_VALUE = re.compile(r'^(?:[#\w\s.,%-]+|rgba?\([\d\s.,%]+\))$')
+ANCHOR_HEADINGS = {'h2', 'h3', 'h4'}
+EXTERNAL_REL = ('noopener', 'noreferrer', 'nofollow')
+MIME_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+
+def clean_style(value):
+    declarations = []
+    for declaration in value.split(';'):
+        name, colon, style = declaration.partition(':')
+        name, style = name.strip().lower(), style.strip()
+        if colon and name in STYLE_PROPERTIES and STYLE_VALUE.match(style):
+            declarations.append(f'{name}: {style}')
+    return '; '.join(declarations)
+
+
+def safe_url(value):
+    try:
+        scheme = urlsplit(value.strip()).scheme.lower()
+    except ValueError:
+        return False
+    return scheme in URL_SCHEMES
+
+
+def is_external(href):
+    parts = urlsplit(href)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        return False
+    hosts = [urlsplit(settings.SITE_URL).hostname, *(host for host in settings.ALLOWED_HOSTS if host != '*')]
+    return not validate_host(parts.hostname, hosts)
+
+
+def format_attributes(attrs):
+    return ''.join(f' {name}="{escape(value)}"' for name, value in attrs)
+
+
+class RichTextRenderer(HTMLParser):
+    """Stream parser writing the sanitized, post-processed HTML of one body."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.open_tags = []
+        self.dropped_tags = []
+        self.anchors = set()
+        self.heading = None
+        # Media sources of images that have no variants yet.
+        self.missing = set()
+
+    def render(self, html):
+        self.feed(html)
+        self.close()
+        return ''.join(self.parts)
+
+    def close(self):
+        super().close()
+        while self.open_tags:
+            self.end(self.open_tags.pop())
+
+    def clean_attributes(self, tag, attrs):
+        allowed = ALLOWED_ATTRIBUTES['*'] | ALLOWED_ATTRIBUTES.get(tag, set())
+        cleaned = {}
+        for name, value in attrs:
+            name = name.lower()
+            if name not in allowed or value is None:
+                continue
+            if name in ('href', 'src') and not safe_url(value):
+                continue
+            if name == 'style':
+                value = clean_style(value)
+                if not value:
+                    continue
+            cleaned[name] = value
+        return cleaned
+
+    def handle_starttag(self, tag, attrs):
+        if self.dropped_tags or tag in DROPPED_TAGS:
+            if tag not in VOID_TAGS:
+                self.dropped_tags.append(tag)
+            return
+        if tag not in ALLOWED_TAGS:
+            return
+        attrs = self.clean_attributes(tag, attrs)
+        if tag == 'img':
+            self.image(attrs)
+            return
+        if tag == 'a' and is_external(attrs.get('href', '')):
+            rel = attrs.get('rel', '').split()
+            attrs['rel'] = ' '.join(rel + [value for value in EXTERNAL_REL if value not in rel])
+        if tag in VOID_TAGS:
+            self.parts.append(f'<{tag}{format_attributes(attrs.items())}>')
+            return
+        self.open_tags.append(tag)
+        if tag in ANCHOR_HEADINGS and 'id' not in attrs and self.heading is None:
+            # The anchor comes from the heading text, so write the tag at its end.
+            self.heading = (len(self.parts), tag, attrs, [])
+            self.parts.append('')
+            return
+        self.parts.append(f'<{tag}{format_attributes(attrs.items())}>')
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self.dropped_tags:
+            if tag in self.dropped_tags:
+                while self.dropped_tags.pop() != tag:
+                    pass
+            return
+        if tag not in self.open_tags:
+            return
+        # Close anything left open inside `tag` too.
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.end(open_tag)
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self.dropped_tags:
+            return
+        if self.heading is not None:
+            self.heading[3].append(data)
+        self.parts.append(escape(data, quote=False))
+
+    def end(self, tag):
+        if self.heading is not None and tag == self.heading[1] and tag not in self.open_tags:
+            position, tag, attrs, text = self.heading
+            attrs['id'] = self.anchor(''.join(text))
+            self.parts[position] = f'<{tag}{format_attributes(attrs.items())}>'
+            self.heading = None
+        self.parts.append(f'</{tag}>')
+
+    def anchor(self, text):
+        base = slugify(text) or 'section'
+        anchor, suffix = base, 2
+        while anchor in self.anchors:
+            anchor, suffix = f'{base}-{suffix}', suffix + 1
+        self.anchors.add(anchor)
+        return anchor
+
+    def image(self, attrs):
+        if 'src' not in attrs:
+            return
+        attrs.setdefault('loading', 'lazy')
+        attrs.setdefault('decoding', 'async')
+        sources = []
+        if attrs['src'].startswith(settings.MEDIA_URL):
+            source = unquote(attrs['src'][len(settings.MEDIA_URL):])
+            manifest = get_manifest(source)
+            if not manifest:
+                self.missing.add(source)
+            formats = [image_format for image_format in settings.IMAGE_VARIANT_FORMATS if image_format in manifest]
+            if formats:
+                widest = max(width for width, name in manifest[formats[-1]])
+                sizes = f'(max-width: {widest}px) 100vw, {widest}px'
+                for image_format in formats:
+                    srcset = ', '.join(f'{default_storage.url(name)} {width}w' for width, name in manifest[image_format])
+                    sources.append((image_format, srcset, sizes))
+        if not sources:
+            self.parts.append(f'<img{format_attributes(attrs.items())}>')
+            return
+        # The last format is the fallback on the <img>; the others become <source>s.
+        image_format, attrs['srcset'], attrs['sizes'] = sources[-1]
+        self.parts.append('<picture>')
+        for image_format, srcset, sizes in sources[:-1]:
+            source_attrs = [('type', MIME_TYPES[image_format]), ('srcset', srcset), ('sizes', sizes)]
+            self.parts.append(f'<source{format_attributes(source_attrs)}>')
+        self.parts.append(f'<img{format_attributes(attrs.items())}></picture>')
+
+
+def cache_key(html):
+    digest = hashlib.sha256(html.encode()).hexdigest()
+    return f'richtext:{RENDER_VERSION}:{digest}'
+
+
+def waiting_key(source):
+    return 'richtext:waiting:%s' % hashlib.sha1(source.encode()).hexdigest()
+
+
+def render_and_store(html):
+    """Render `html`, cache the result and return `(html, sources missing variants)`."""
+    key = cache_key(html)
+    renderer = RichTextRenderer()
+    rendered = renderer.render(html)
+    if renderer.missing:
+        cache.set(key, rendered, MISSING_TIMEOUT)
+        for source in renderer.missing:
+            waiting = cache.get(waiting_key(source), [])
+            cache.set(waiting_key(source), [*waiting, key], MISSING_TIMEOUT)
+    else:
+        cache.set(key, rendered, CACHE_TIMEOUT)
+    return rendered, renderer.missing
+
+
+def render_rich_text(html):
+    """Return the sanitized, post-processed form of `html`, from the cache where possible."""
+    if not html:
+        return ''
+    rendered = cache.get(cache_key(html))
+    if rendered is None:
+        rendered = render_and_store(html)[0]
+    return rendered
+
+
+def render_rich_text_many(htmls):
+    """`{html: rendered}` for every non-empty body in `htmls`, with one cache round trip for the cached ones."""
+    htmls = {html for html in htmls if html}
+    keys = {cache_key(html): html for html in htmls}
+    rendered = {keys[key]: value for key, value in cache.get_many(list(keys)).items()}
+    for html in htmls - set(rendered):
+        rendered[html] = render_and_store(html)[0]
+    return rendered
+
+
+def prerender(model, html):
+    """Fill the render cache when `model` saves `html`, queueing variants for uploaded images without them."""
+    if not html:
+        return
+    for source in render_and_store(html)[1]:
+        if default_storage.exists(source):
+            schedule(model, source)
+
+
+@receiver(variants_generated)
+def forget_waiting_renders(sender, source, **kwargs):
+    """Drop renders made before `source` had variants so the next read picks them up."""
+    keys = cache.get(waiting_key(source))
+    if keys:
+        cache.delete_many([*keys, waiting_key(source)])
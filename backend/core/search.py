@@ -0,0 +1,191 @@
+"""
+Ranked full-text search shared by the catalog and the blog.
+
+On PostgreSQL each indexed model keeps a weighted tsvector in its
+`search_vector` column, backed by a GIN index. On SQLite the same plain-text
+document is mirrored into an FTS5 virtual table keyed by the row's primary key
+and ranked with bm25(). Neither the GIN index nor the FTS5 table can be
+declared portably in model Meta, so they are created on post_migrate.
+"""
+
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections, router
+from django.db.models import F, FloatField, TextField, Value
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+from .text import html_to_text
+
+# bm25() column weights standing in for the tsvector A-D labels.
+FTS5_WEIGHTS = {'A': 10.0, 'B': 4.0, 'C': 2.0, 'D': 1.0}
+# Search-as-you-type only needs the first few words.
+MAX_TERMS = 8
+# Words shown in a highlighted snippet.
+SNIPPET_WORDS = 30
+
+registry = []
+
+
+def search_terms(query):
+    """Split a user query into lower-cased word tokens safe to splice into a match expression."""
+    return re.findall(r'\w+', (query or '').lower())[:MAX_TERMS]
+
+
+def highlight(text, query, size=SNIPPET_WORDS):
+    """Return an HTML-escaped window of plain `text` around the first match of `query`.
+
+    Words starting with a query term are wrapped in `<mark>`, mirroring the
+    prefix matching of `SearchIndex.search`.
+    """
+    terms = search_terms(query)
+    words = text.split()
+
+    def matches(word):
+        word = re.sub(r'\W', '', word.lower())
+        return any(word.startswith(term) for term in terms)
+
+    first = next((position for position, word in enumerate(words) if matches(word)), 0)
+    start = max(0, min(first - size // 3, len(words) - size))
+    window = words[start:start + size]
+    snippet = ' '.join(f'<mark>{escape(word)}</mark>' if matches(word) else escape(word) for word in window)
+    if start > 0:
+        snippet = f'… {snippet}'
+    if start + size < len(words):
+        snippet = f'{snippet} …'
+    return snippet
+
+
+class SearchIndex:
+    """Weighted full-text index over some text fields of a model.
+
+    `fields` is a list of `(attribute, weight)` pairs, weights being the
+    PostgreSQL labels 'A' (most important) to 'D'. Attribute values are
+    stripped of HTML before indexing.
+    """
+
+    def __init__(self, model, fields, config='english'):
+        self.model = model
+        self.fields = fields
+        self.config = config
+
+    @property
+    def db_table(self):
+        return self.model._meta.db_table
+
+    @property
+    def fts_table(self):
+        return f'{self.db_table}_fts'
+
+    @property
+    def gin_index_name(self):
+        return f'{self.db_table}_search_gin'
+
+    def document(self, instance):
+        """Return the plain text indexed for each field of `instance`."""
+        return {field: html_to_text(getattr(instance, field)) for field, weight in self.fields}
+
+    def install(self, connection):
+        """Create the backend-specific index structures if they are missing."""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {self.gin_index_name} '
+                    f'ON {self.db_table} USING gin (search_vector)'
+                )
+            elif connection.vendor == 'sqlite':
+                columns = ', '.join(field for field, weight in self.fields)
+                cursor.execute(
+                    f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.fts_table} '
+                    f"USING fts5({columns}, tokenize='porter unicode61')"
+                )
+
+    def update(self, instance):
+        """Re-index a single saved instance."""
+        using = router.db_for_write(self.model, instance=instance)
+        connection = connections[using]
+        document = self.document(instance)
+        if connection.vendor == 'postgresql':
+            vector = None
+            for field, weight in self.fields:
+                part = SearchVector(
+                    Value(document[field], output_field=TextField()),
+                    weight=weight, config=self.config,
+                )
+                vector = part if vector is None else vector + part
+            # update() skips save() so the signal that called us is not re-fired.
+            self.model._default_manager.using(using).filter(pk=instance.pk).update(search_vector=vector)
+        elif connection.vendor == 'sqlite':
+            columns = [field for field, weight in self.fields]
+            placeholders = ', '.join(['%s'] * (len(columns) + 1))
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {self.fts_table} WHERE rowid = %s', [instance.pk])
+                cursor.execute(
+                    f'INSERT INTO {self.fts_table} (rowid, {", ".join(columns)}) VALUES ({placeholders})',
+                    [instance.pk] + [document[field] for field in columns],
+                )
+
+    def remove(self, instance):
+        """Drop a deleted instance from the index."""
+        connection = connections[router.db_for_write(self.model, instance=instance)]
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {self.fts_table} WHERE rowid = %s', [instance.pk])
+
+    def rebuild(self, batch_size=500):
+        """Re-index every row. Returns the number of rows indexed."""
+        count = 0
+        for instance in self.model._default_manager.all().iterator(chunk_size=batch_size):
+            self.update(instance)
+            count += 1
+        return count
+
+    def search(self, queryset, query):
+        """Filter `queryset` to rows matching `query`, best matches first.
+
+        Each term is matched as a prefix so partially typed words still hit.
+        The relevance is exposed as the `search_rank` annotation.
+        """
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+        vendor = connections[queryset.db].vendor
+        if vendor == 'postgresql':
+            search_query = SearchQuery(
+                ' & '.join(f'{term}:*' for term in terms),
+                search_type='raw', config=self.config,
+            )
+            return queryset.filter(search_vector=search_query).annotate(
+                search_rank=SearchRank(F('search_vector'), search_query)
+            ).order_by('-search_rank', 'pk')
+        if vendor == 'sqlite':
+            match = ' '.join(f'"{term}"*' for term in terms)
+            weights = ', '.join(str(FTS5_WEIGHTS[weight]) for field, weight in self.fields)
+            pk_column = self.model._meta.pk.column
+            # bm25() is lower-is-better, so negate it to sort like ts_rank.
+            rank = RawSQL(
+                f'SELECT -bm25({self.fts_table}, {weights}) FROM {self.fts_table} '
+                f'WHERE {self.fts_table} MATCH %s AND {self.fts_table}.rowid = {self.db_table}.{pk_column}',
+                (match,), output_field=FloatField(),
+            )
+            matches = RawSQL(f'SELECT rowid FROM {self.fts_table} WHERE {self.fts_table} MATCH %s', (match,))
+            return queryset.filter(pk__in=matches).annotate(search_rank=rank).order_by('-search_rank', 'pk')
+        # Other backends fall back to an unranked substring match on the top-weighted field.
+        field = self.fields[0][0]
+        return queryset.filter(**{f'{field}__icontains': query})
+
+
+def register(model, fields, config='english'):
+    """Create a SearchIndex for `model` and add it to the registry."""
+    index = SearchIndex(model, fields, config=config)
+    registry.append(index)
+    return index
+
+
+def install_indexes(sender, using='default', **kwargs):
+    """post_migrate receiver creating the index structures of the sender app's models."""
+    connection = connections[using]
+    for index in registry:
+        if index.model._meta.app_config is sender:
+            index.install(connection)
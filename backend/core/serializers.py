@@ -0,0 +1,94 @@
+"""
+Serializer helpers shared by the project's apps.
+"""
+
+from django.db import models
+from rest_framework import serializers
+
+from .richtext import render_rich_text, render_rich_text_many
+
+
+def parse_field_list(value):
+    """Parse a comma-separated query parameter into a set of names, or None if absent."""
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def include_field(name, fields):
+    """Whether `name` is part of the requested sparse fieldset."""
+    return fields is None or name in fields
+
+
+def expand_field(name, fields, expand):
+    """Whether the nested relation `name` is requested in full rather than as primary keys."""
+    return include_field(name, fields) and (expand is None or name in expand)
+
+
+class RenderedHTMLField(serializers.CharField):
+    """Rich text written as-is and read back sanitized and post-processed (see core.richtext)."""
+
+    def to_representation(self, value):
+        # Renders fetched up front by a RenderedHTMLListSerializer serializing the whole list
+        rendered = getattr(self.parent.parent, 'rendered_html', {}) if self.parent is not None else {}
+        if value in rendered:
+            return rendered[value]
+        return render_rich_text(value)
+
+
+class RenderedHTMLListSerializer(serializers.ListSerializer):
+    """Fetches the renders of every item's rich text in one cache round trip."""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        fields = [field for field in self.child.fields.values() if isinstance(field, RenderedHTMLField)]
+        self.rendered_html = render_rich_text_many(field.get_attribute(item) for item in items for field in fields)
+        return super().to_representation(items)
+
+
+class DynamicFieldsMixin:
+    """Sparse fieldsets and expansion control for a ModelSerializer.
+
+    `fields` keeps only the named fields. `expand` names the nested relations
+    (from `Meta.expandable_fields`) to render in full; the others collapse to
+    their primary keys. Leaving either out keeps the default representation.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        expand = kwargs.pop('expand', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+        if expand is not None:
+            for name in getattr(self.Meta, 'expandable_fields', ()):
+                if name in self.fields and name not in expand:
+                    self.fields[name] = self.collapse_field(name, self.fields[name])
+
+    @staticmethod
+    def collapse_field(name, field):
+        """Replace a nested serializer with a read-only primary key field."""
+        kwargs = {'read_only': True, 'many': isinstance(field, serializers.ListSerializer)}
+        # DRF rejects a source equal to the field name.
+        if field.source != name:
+            kwargs['source'] = field.source
+        return serializers.PrimaryKeyRelatedField(**kwargs)
+
+
+def select_fields(row, fields, expand, expandable_fields):
+    """Apply a sparse fieldset and expansion to an already serialized row."""
+    if fields is not None:
+        row = {name: value for name, value in row.items() if name in fields}
+    if expand is not None:
+        row = dict(row)
+        for name in expandable_fields:
+            if name in row and name not in expand:
+                value = row[name]
+                if isinstance(value, list):
+                    row[name] = [item['id'] for item in value]
+                elif value is not None:
+                    row[name] = value['id']
+    return row
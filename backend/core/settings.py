@@ -45,6 +45,7 @@ INSTALLED_APPS = [
     'django_filters',
     'ckeditor',
     'taggit',
+    'mptt',
     'crispy_forms',
     'crispy_bootstrap5',
     'scheduler',
@@ -56,6 +57,8 @@ INSTALLED_APPS = [
     'appointments',
     'dashboard',
     'users',
+    'imaging',
+    'feeds',
 ]
 
 MIDDLEWARE = [
@@ -183,6 +186,63 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Cache configuration
+# Redis is shared by every worker; without it each process gets its own memory cache.
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Serve public catalog reads from the in-memory snapshot (services.snapshot)
+CATALOG_SNAPSHOT_ENABLED = os.environ.get('CATALOG_SNAPSHOT_ENABLED', 'True') == 'True'
+
+# Seconds between flushes of buffered blog view counts (blog.counters); 0 disables the background flusher
+VIEW_COUNT_FLUSH_INTERVAL = int(os.environ.get('VIEW_COUNT_FLUSH_INTERVAL', 10))
+
+# How many levels replies may nest below a top-level blog comment (blog.threads)
+COMMENT_MAX_DEPTH = 4
+
+# Resized image variants (imaging.pipeline)
+IMAGE_VARIANT_WIDTHS = (320, 640, 1024, 1600)
+IMAGE_VARIANT_FORMATS = ('webp', 'jpeg')
+IMAGE_VARIANT_QUALITY = 80
+# Background threads per process; 0 generates variants inline after commit
+IMAGE_VARIANT_WORKERS = int(os.environ.get('IMAGE_VARIANT_WORKERS', 2))
+
+# Appointment availability (appointments.availability): slot length inside "available"
+# exceptions, and the longest date range one request may ask for
+APPOINTMENT_SLOT_MINUTES = 60
+AVAILABILITY_MAX_DAYS = 92
+
+# Public site that feeds and sitemaps link to
+SITE_URL = os.environ.get('FRONTEND_URL', 'http://localhost:3000').rstrip('/')
+# Public origin of this API; pre-rendered responses (blog.publishing) link to it, so its
+# host must be in ALLOWED_HOSTS
+API_URL = os.environ.get('API_URL', 'http://localhost:8000').rstrip('/')
+
+# Files nginx serves directly, each with a .gz twin for gzip_static (core.published)
+PUBLISHED_ROOT = os.environ.get('PUBLISHED_ROOT', os.path.join(BASE_DIR, 'published'))
+
+# Background threads rendering published blog JSON (blog.publishing); one keeps renders in
+# order, 0 renders inline after commit
+BLOG_PUBLISHING_WORKERS = int(os.environ.get('BLOG_PUBLISHING_WORKERS', 1))
+
+# Points PUBLISHED_ROOT at a temporary directory for the test run
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:3000',
@@ -280,6 +340,21 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        'blog': {
+            'handlers': ['console', 'file'],
+            'level': 'INFO',
+            'propagate': True,
+        },
+        'imaging': {
+            'handlers': ['console', 'file'],
+            'level': 'INFO',
+            'propagate': True,
+        },
+        'feeds': {
+            'handlers': ['console', 'file'],
+            'level': 'INFO',
+            'propagate': True,
+        },
     },
 }
 
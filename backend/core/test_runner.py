@@ -0,0 +1,30 @@
+"""
+Test runner keeping the test suite's files out of the working tree.
+
+Publishing (core.published) writes under `PUBLISHED_ROOT` whenever a test
+saves something that is published, so the whole run points it at a
+temporary directory that is removed afterwards. Blog JSON is rendered
+inline rather than by background workers, so it lands within the test that
+caused it.
+"""
+
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._published_root = settings.PUBLISHED_ROOT
+        settings.PUBLISHED_ROOT = tempfile.mkdtemp(prefix='published-')
+        self._publishing_workers = settings.BLOG_PUBLISHING_WORKERS
+        settings.BLOG_PUBLISHING_WORKERS = 0
+
+    def teardown_test_environment(self, **kwargs):
+        shutil.rmtree(settings.PUBLISHED_ROOT, ignore_errors=True)
+        settings.PUBLISHED_ROOT = self._published_root
+        settings.BLOG_PUBLISHING_WORKERS = self._publishing_workers
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,24 @@
+"""
+Helpers for turning CKEditor rich text into plain text.
+"""
+
+import html
+import re
+
+from django.utils.html import strip_tags
+
+# Script and style bodies are not prose; drop them before stripping tags.
+NON_TEXT_BLOCKS = re.compile(r'<(script|style)\b[^>]*>.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+BLOCK_BOUNDARIES = re.compile(r'<\s*(br|/p|/div|/li|/h[1-6]|/tr|/td|/th|/blockquote)\b[^>]*>', re.IGNORECASE)
+WHITESPACE = re.compile(r'\s+')
+
+
+def html_to_text(value):
+    """Return the readable text of an HTML fragment with entities decoded and whitespace collapsed."""
+    if not value:
+        return ''
+    value = NON_TEXT_BLOCKS.sub(' ', value)
+    # Keep words from adjacent blocks apart ("<p>a</p><p>b</p>" -> "a b").
+    value = BLOCK_BOUNDARIES.sub(lambda match: match.group(0) + ' ', value)
+    value = html.unescape(strip_tags(value))
+    return WHITESPACE.sub(' ', value).strip()
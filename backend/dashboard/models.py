@@ -29,6 +29,10 @@ class PageVisit(models.Model):
     class Meta:
         unique_together = ['path', 'date']
         ordering = ['-date', '-views']
+        indexes = [
+            # Backs keyset pagination
+            models.Index(fields=['-created_at', '-id'], name='pagevisit_keyset'),
+        ]
     
     def __str__(self):
         return f"{self.path} - {self.date}"
@@ -118,6 +122,11 @@ class UserActivity(models.Model):
     class Meta:
         verbose_name_plural = 'User Activities'
         ordering = ['-timestamp']
+        indexes = [
+            # Back keyset pagination of all activity and of one user's activity
+            models.Index(fields=['-timestamp', '-id'], name='useractivity_keyset'),
+            models.Index(fields=['user', '-timestamp', '-id'], name='useractivity_user_keyset'),
+        ]
     
     def __str__(self):
         user_identifier = self.user.username if self.user else self.session_id
@@ -0,0 +1,306 @@
+"""
+Sitemaps and blog feeds published as static, precompressed files.
+
+Layout under `PUBLISHED_ROOT` (see core.published):
+
+    sitemap.xml                              index of every sitemap shard
+    sitemaps/<section>-<n>.xml               published rows of a section with ids in shard n
+    feeds/blog/{rss,atom}.xml                latest published posts
+    feeds/blog/category/<slug>/{rss,atom}.xml  posts in a category or its subcategories
+    feeds/blog/tag/<slug>/{rss,atom}.xml     posts with a tag
+
+Shards cover fixed id ranges, so a changed row touches exactly one of them,
+and the index is rebuilt from one grouped query per section. A post change
+rewrites its shard, the index and only the feeds it appeared in before or
+appears in after. Feeds also show category and tag names, so renaming,
+moving or deleting either rewrites the feeds that show it. The writing runs
+after commit in the blog publishing worker (see blog.publishing).
+"""
+
+import logging
+import os
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F, Max, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from taggit.models import Tag, TaggedItem
+
+from blog.categories import category_posts
+from blog.models import BlogCategory, BlogPost
+from blog.publishing import submit
+from core.published import publish, published_path, unpublish
+from services.models import Service, ServicePackage
+
+logger = logging.getLogger(__name__)
+
+# Ids per sitemap shard; well under the 50,000 URLs a sitemap may list.
+SHARD_SIZE = 5000
+FEED_LENGTH = 20
+FEED_TITLE = 'Career Services Blog'
+FEED_DESCRIPTION = 'Career advice, CV tips and interview preparation.'
+
+# section -> (model, public page path, filter for published rows)
+SECTIONS = {
+    'blog': (BlogPost, '/blog/{slug}', Q(status='published')),
+    'services': (Service, '/services/{slug}', Q(is_active=True)),
+    'packages': (ServicePackage, '/packages/{slug}', Q(is_active=True)),
+}
+
+FEED_FORMATS = (('rss.xml', Rss201rev2Feed), ('atom.xml', Atom1Feed))
+
+
+def site_url(path):
+    return f'{settings.SITE_URL}{path}'
+
+
+def shard_of(pk):
+    return pk // SHARD_SIZE
+
+
+def shard_name(section, number):
+    return f'sitemaps/{section}-{number}.xml'
+
+
+def w3c_datetime(value):
+    return value.isoformat(timespec='seconds')
+
+
+def write_shard(section, number):
+    """Write (or remove, when empty) one sitemap shard. Returns its path if written."""
+    model, path, published = SECTIONS[section]
+    rows = (
+        model.objects.filter(published, pk__gte=number * SHARD_SIZE, pk__lt=(number + 1) * SHARD_SIZE)
+        .order_by('pk')
+        .values_list('slug', 'updated_at')
+    )
+    entries = [
+        f'<url><loc>{escape(site_url(path.format(slug=slug)))}</loc>'
+        f'<lastmod>{w3c_datetime(updated_at)}</lastmod></url>'
+        for slug, updated_at in rows
+    ]
+    name = shard_name(section, number)
+    if not entries:
+        unpublish(name)
+        return None
+    publish(name, ''.join([
+        '<?xml version="1.0" encoding="UTF-8"?>\n',
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">',
+        *entries,
+        '</urlset>\n',
+    ]))
+    return name
+
+
+def shard_stats(section):
+    """`(shard number, newest update)` for every non-empty shard of `section`."""
+    model, path, published = SECTIONS[section]
+    return (
+        model.objects.filter(published)
+        .annotate(shard=F('pk') / Value(SHARD_SIZE))
+        .values('shard')
+        .annotate(lastmod=Max('updated_at'))
+        .order_by('shard')
+        .values_list('shard', 'lastmod')
+    )
+
+
+def write_sitemap_index():
+    entries = [
+        f'<sitemap><loc>{escape(site_url("/" + shard_name(section, number)))}</loc>'
+        f'<lastmod>{w3c_datetime(lastmod)}</lastmod></sitemap>'
+        for section in SECTIONS
+        for number, lastmod in shard_stats(section)
+    ]
+    publish('sitemap.xml', ''.join([
+        '<?xml version="1.0" encoding="UTF-8"?>\n',
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">',
+        *entries,
+        '</sitemapindex>\n',
+    ]))
+
+
+def feed_directory(kind, key=None):
+    if kind == 'all':
+        return 'feeds/blog'
+    return f'feeds/blog/{kind}/{key}'
+
+
+def feed_posts(kind, key=None):
+    """The latest published posts of a feed, or None when its category or tag is gone."""
+    if kind == 'category':
+        category = BlogCategory.objects.filter(slug=key, is_active=True).first()
+        if category is None:
+            return None, None
+        title, posts = f'{FEED_TITLE}: {category.name}', category_posts(category)
+    elif kind == 'tag':
+        tag = Tag.objects.filter(slug=key).first()
+        if tag is None:
+            return None, None
+        title, posts = f'{FEED_TITLE}: {tag.name}', BlogPost.objects.filter(status='published', tags=tag)
+    else:
+        title, posts = FEED_TITLE, BlogPost.objects.filter(status='published')
+    posts = (
+        posts.select_related('author')
+        .prefetch_related('tags')
+        .defer('search_vector')
+        .order_by(Coalesce('published_at', 'created_at').desc(), '-id')
+    )
+    return title, list(posts[:FEED_LENGTH])
+
+
+def write_feed(kind, key=None):
+    """Write the RSS and Atom files of one feed, or remove them if it has nothing to show."""
+    directory = feed_directory(kind, key)
+    title, posts = feed_posts(kind, key)
+    if posts is None or (kind != 'all' and not posts):
+        for name, feed_class in FEED_FORMATS:
+            unpublish(f'{directory}/{name}')
+        return []
+    written = []
+    for name, feed_class in FEED_FORMATS:
+        feed = feed_class(
+            title=title,
+            link=site_url('/blog'),
+            description=FEED_DESCRIPTION,
+            language=settings.LANGUAGE_CODE,
+            feed_url=site_url(f'/{directory}/{name}'),
+        )
+        for post in posts:
+            link = site_url(f'/blog/{post.slug}')
+            feed.add_item(
+                title=post.title,
+                link=link,
+                unique_id=link,
+                description=post.summary,
+                author_name=post.author.get_full_name() or post.author.username,
+                pubdate=post.published_at or post.created_at,
+                updateddate=post.updated_at,
+                categories=[tag.name for tag in post.tags.all()],
+            )
+        path = f'{directory}/{name}'
+        publish(path, feed.writeString('utf-8'))
+        written.append(path)
+    return written
+
+
+def post_snapshot(pk):
+    """What decides which feeds post `pk` appears in, read from the database (None if gone)."""
+    post = BlogPost.objects.filter(pk=pk).select_related('category').first()
+    if post is None:
+        return None
+    categories = []
+    if post.category is not None:
+        categories = list(post.category.get_ancestors(include_self=True).values_list('slug', flat=True))
+    return {
+        'status': post.status,
+        'categories': categories,
+        'tags': list(post.tags.values_list('slug', flat=True)),
+    }
+
+
+def feed_scopes(snapshot):
+    """The `(kind, key)` feeds a post with `snapshot` appears in."""
+    if not snapshot or snapshot['status'] != 'published':
+        return set()
+    return {
+        ('all', None),
+        *(('category', slug) for slug in snapshot['categories']),
+        *(('tag', slug) for slug in snapshot['tags']),
+    }
+
+
+def category_scopes(pk):
+    """The feeds of category `pk`, its ancestors and its descendants, which a change to it can affect."""
+    category = BlogCategory.objects.filter(pk=pk).first()
+    if category is None:
+        return set()
+    return {('category', slug) for slug in category.get_family().values_list('slug', flat=True)}
+
+
+def write_feeds(scopes):
+    for kind, key in sorted(scopes, key=lambda scope: (scope[0], scope[1] or '')):
+        write_feed(kind, key)
+
+
+def refresh_post(pk, previous, current):
+    """Rewrite what a change of post `pk` from `previous` to `current` can affect."""
+    scopes = feed_scopes(previous) | feed_scopes(current)
+    if not scopes:
+        # A draft before and after appears nowhere.
+        return
+    write_shard('blog', shard_of(pk))
+    write_sitemap_index()
+    write_feeds(scopes)
+
+
+def refresh_posts(post_ids):
+    """Rewrite the shards and feeds of posts published by a bulk update."""
+    for number in sorted({shard_of(pk) for pk in post_ids}):
+        write_shard('blog', number)
+    write_sitemap_index()
+    write_feeds(set().union(*(feed_scopes(post_snapshot(pk)) for pk in post_ids)))
+
+
+def refresh_category(pk, previous_scopes):
+    """Rewrite the feeds a change to category `pk` can affect, before (`previous_scopes`) and after."""
+    write_feeds(set(previous_scopes) | category_scopes(pk))
+
+
+def refresh_tag(slug, post_ids):
+    """Rewrite the feed of a renamed or deleted tag, formerly `slug`, and the feeds showing its posts."""
+    write_feeds({('tag', slug)}.union(*(feed_scopes(post_snapshot(pk)) for pk in post_ids)))
+
+
+def refresh_row(section, pk):
+    """Rewrite the shard holding catalog row `pk`, and the index."""
+    write_shard(section, shard_of(pk))
+    write_sitemap_index()
+
+
+def _run_safely(function, *args):
+    try:
+        function(*args)
+    except Exception:
+        logger.exception('Could not publish feeds and sitemaps')
+
+
+def schedule(function, *args):
+    """Run `function(*args)` in the publishing worker once the current transaction commits.
+
+    Failures are logged, not raised.
+    """
+    transaction.on_commit(lambda: submit(_run_safely, function, *args))
+
+
+def rebuild_all():
+    """Write every shard, feed and the index, removing files nothing produces any more.
+
+    Returns the number of files written.
+    """
+    written = set()
+    for section in SECTIONS:
+        for number, lastmod in shard_stats(section):
+            written.add(write_shard(section, number))
+    write_sitemap_index()
+    written.add('sitemap.xml')
+
+    written.update(write_feed('all'))
+    for slug in BlogCategory.objects.filter(is_active=True).values_list('slug', flat=True):
+        written.update(write_feed('category', slug))
+    tags = TaggedItem.objects.filter(
+        content_type=ContentType.objects.get_for_model(BlogPost)
+    ).values_list('tag__slug', flat=True).distinct()
+    for slug in tags:
+        written.update(write_feed('tag', slug))
+
+    for directory in ('sitemaps', 'feeds'):
+        for root, dirs, files in os.walk(published_path(directory)):
+            for name in files:
+                relative = os.path.relpath(os.path.join(root, name), settings.PUBLISHED_ROOT)
+                if not name.endswith('.gz') and relative not in written:
+                    unpublish(relative)
+    return len(written)
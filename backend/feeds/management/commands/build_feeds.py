@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from feeds.generator import rebuild_all
+
+
+class Command(BaseCommand):
+    help = 'Write the sitemap, its shards and the blog RSS/Atom feeds to PUBLISHED_ROOT.'
+
+    def handle(self, *args, **options):
+        written = rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f'Published {written} sitemap and feed files.'))
@@ -0,0 +1,106 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from taggit.models import Tag
+
+from blog.models import BlogCategory, BlogPost
+from blog.signals import posts_published
+from services.models import Service, ServicePackage
+
+from .generator import (
+    category_scopes, post_snapshot, refresh_category, refresh_post, refresh_posts, refresh_row, refresh_tag,
+    schedule,
+)
+
+CATALOG_SECTIONS = {Service: 'services', ServicePackage: 'packages'}
+
+
+@receiver(pre_save, sender=BlogPost)
+@receiver(pre_delete, sender=BlogPost)
+def remember_feed_scope(sender, instance, raw=False, **kwargs):
+    instance._previous_feed_snapshot = None
+    if instance.pk and not raw:
+        instance._previous_feed_snapshot = post_snapshot(instance.pk)
+
+
+@receiver(post_save, sender=BlogPost)
+def publish_saved_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        previous = getattr(instance, '_previous_feed_snapshot', None)
+        schedule(refresh_post, instance.pk, previous, post_snapshot(instance.pk))
+
+
+@receiver(post_delete, sender=BlogPost)
+def publish_deleted_post(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_feed_snapshot', None)
+    schedule(refresh_post, instance.pk, previous, None)
+
+
+@receiver(posts_published, sender=BlogPost)
+def publish_bulk_published_posts(sender, post_ids, **kwargs):
+    schedule(refresh_posts, post_ids)
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def publish_retagged_post(sender, instance, action, pk_set=None, **kwargs):
+    if not isinstance(instance, BlogPost):
+        return
+    if action == 'pre_clear':
+        instance._cleared_feed_tags = list(instance.tags.values_list('slug', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    current = post_snapshot(instance.pk)
+    previous = None
+    if current is not None:
+        # Feeds of tags taken off still list the post until they are rewritten too.
+        if action == 'post_clear':
+            changed = getattr(instance, '_cleared_feed_tags', [])
+        else:
+            changed = Tag.objects.filter(pk__in=pk_set or ()).values_list('slug', flat=True)
+        previous = {**current, 'tags': [*current['tags'], *changed]}
+    schedule(refresh_post, instance.pk, previous, current)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=ServicePackage)
+@receiver(post_delete, sender=ServicePackage)
+def publish_catalog_row(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule(refresh_row, CATALOG_SECTIONS[sender], instance.pk)
+
+
+@receiver(pre_save, sender=BlogCategory)
+@receiver(pre_delete, sender=BlogCategory)
+def remember_category_feeds(sender, instance, raw=False, **kwargs):
+    instance._previous_feed_scopes = set()
+    if instance.pk and not raw:
+        instance._previous_feed_scopes = category_scopes(instance.pk)
+
+
+@receiver(post_save, sender=BlogCategory)
+@receiver(post_delete, sender=BlogCategory)
+def publish_category_feeds(sender, instance, raw=False, **kwargs):
+    # Category feeds carry the category's name and list the posts of its active subtree.
+    if not raw:
+        schedule(refresh_category, instance.pk, getattr(instance, '_previous_feed_scopes', set()))
+
+
+@receiver(pre_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def remember_tag_feeds(sender, instance, raw=False, **kwargs):
+    instance._previous_feed_tag = None
+    if instance.pk and not raw:
+        instance._previous_feed_tag = (
+            Tag.objects.filter(pk=instance.pk).values_list('slug', flat=True).first(),
+            list(BlogPost.objects.filter(tags=instance, status='published').values_list('pk', flat=True)),
+        )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def publish_tag_feeds(sender, instance, raw=False, **kwargs):
+    # Feed items list their tags' names; a tag's own feed is titled and located by it.
+    previous = getattr(instance, '_previous_feed_tag', None)
+    if not raw and previous and previous[0]:
+        schedule(refresh_tag, *previous)
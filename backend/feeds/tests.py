@@ -0,0 +1,221 @@
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from xml.etree import ElementTree
+
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from taggit.models import Tag
+
+from blog.models import BlogCategory, BlogPost
+from services.models import Service, ServiceCategory
+
+from .generator import SHARD_SIZE, refresh_post, shard_name
+
+SITEMAP = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+
+class PublishedFeedTests(TestCase):
+    """Sitemaps and feeds are static files rewritten only where a change lands."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        settings = override_settings(PUBLISHED_ROOT=self.root, SITE_URL='https://example.com')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.author = User.objects.create_user('author')
+        self.careers = BlogCategory.objects.create(name='Careers')
+        self.interviews = BlogCategory.objects.create(name='Interviews', parent=self.careers)
+
+    def path(self, relative):
+        return os.path.join(self.root, relative)
+
+    def read(self, relative):
+        with open(self.path(relative), 'rb') as fh:
+            return ElementTree.fromstring(fh.read())
+
+    def create_post(self, title, status='published', **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return BlogPost.objects.create(
+                title=title, author=self.author, content='<p>Body</p>', status=status, **kwargs
+            )
+
+    def sitemap_urls(self, relative):
+        return [url.findtext(f'{SITEMAP}loc') for url in self.read(relative).iter(f'{SITEMAP}url')]
+
+    def rss_titles(self, relative):
+        return [item.findtext('title') for item in self.read(relative).iter('item')]
+
+    def test_publishing_a_post_writes_its_shard_index_and_feeds(self):
+        post = self.create_post('Mock interviews', category=self.interviews)
+        shard = shard_name('blog', post.pk // SHARD_SIZE)
+
+        self.assertEqual(self.sitemap_urls(shard), ['https://example.com/blog/mock-interviews'])
+        index = [loc.text for loc in self.read('sitemap.xml').iter(f'{SITEMAP}loc')]
+        self.assertEqual(index, [f'https://example.com/{shard}'])
+        self.assertTrue(os.path.exists(self.path(shard) + '.gz'))
+        self.assertEqual(self.rss_titles('feeds/blog/rss.xml'), ['Mock interviews'])
+        # Category feeds include posts from subcategories.
+        self.assertEqual(self.rss_titles('feeds/blog/category/careers/rss.xml'), ['Mock interviews'])
+        self.assertEqual(self.rss_titles('feeds/blog/category/interviews/rss.xml'), ['Mock interviews'])
+        atom = self.read('feeds/blog/atom.xml')
+        self.assertEqual(len(atom.findall('{http://www.w3.org/2005/Atom}entry')), 1)
+
+    def test_drafts_write_nothing(self):
+        self.create_post('Draft', status='draft')
+
+        self.assertFalse(os.path.exists(self.path('sitemap.xml')))
+        self.assertFalse(os.path.exists(self.path('feeds')))
+
+    def test_unpublishing_removes_the_post_and_emptied_feeds(self):
+        post = self.create_post('Salary talks', category=self.interviews)
+        with self.captureOnCommitCallbacks(execute=True):
+            post.tags.add('salary')
+        self.assertEqual(self.rss_titles('feeds/blog/tag/salary/rss.xml'), ['Salary talks'])
+
+        post.status = 'draft'
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+
+        self.assertFalse(os.path.exists(self.path(shard_name('blog', post.pk // SHARD_SIZE))))
+        self.assertFalse(os.path.exists(self.path('feeds/blog/category/interviews/rss.xml')))
+        self.assertFalse(os.path.exists(self.path('feeds/blog/tag/salary/rss.xml')))
+        self.assertEqual(self.rss_titles('feeds/blog/rss.xml'), [])
+
+    def test_moving_a_post_rewrites_old_and_new_category_feeds(self):
+        other = BlogCategory.objects.create(name='Networking')
+        post = self.create_post('Coffee chats', category=self.interviews)
+        self.create_post('Cold emails', category=other)
+
+        post.category = other
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+
+        self.assertFalse(os.path.exists(self.path('feeds/blog/category/interviews/rss.xml')))
+        self.assertEqual(
+            sorted(self.rss_titles('feeds/blog/category/networking/rss.xml')), ['Coffee chats', 'Cold emails']
+        )
+
+    def test_untagging_rewrites_the_tag_feed(self):
+        post = self.create_post('Portfolio')
+        self.create_post('Case studies').tags.add('design')
+        with self.captureOnCommitCallbacks(execute=True):
+            post.tags.add('design')
+        self.assertEqual(len(self.rss_titles('feeds/blog/tag/design/rss.xml')), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.tags.remove('design')
+
+        self.assertEqual(self.rss_titles('feeds/blog/tag/design/rss.xml'), ['Case studies'])
+
+    def test_bulk_publishing_writes_shards_and_feeds(self):
+        post = self.create_post('Offer letters', status='draft', category=self.interviews)
+        request = RequestFactory().post('/')
+        request._messages = CookieStorage(request)
+        with self.captureOnCommitCallbacks(execute=True):
+            site._registry[BlogPost].make_published(request, BlogPost.objects.filter(pk=post.pk))
+
+        shard = shard_name('blog', post.pk // SHARD_SIZE)
+        self.assertEqual(self.sitemap_urls(shard), ['https://example.com/blog/offer-letters'])
+        self.assertEqual(self.rss_titles('feeds/blog/rss.xml'), ['Offer letters'])
+        self.assertEqual(self.rss_titles('feeds/blog/category/careers/rss.xml'), ['Offer letters'])
+
+    def test_category_changes_rewrite_their_feeds(self):
+        self.create_post('Mock interviews', category=self.interviews)
+        self.interviews.name = 'Interview prep'
+        self.interviews.slug = 'interview-prep'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.interviews.save()
+        self.assertFalse(os.path.exists(self.path('feeds/blog/category/interviews/rss.xml')))
+        channel = self.read('feeds/blog/category/interview-prep/rss.xml').find('channel')
+        self.assertEqual(channel.findtext('title'), 'Career Services Blog: Interview prep')
+
+        # An inactive category hides its subcategories' posts from its ancestors' feeds too.
+        self.interviews.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.interviews.save()
+        self.assertFalse(os.path.exists(self.path('feeds/blog/category/interview-prep/rss.xml')))
+        self.assertFalse(os.path.exists(self.path('feeds/blog/category/careers/rss.xml')))
+
+        self.interviews.is_active = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.interviews.save()
+        self.assertEqual(self.rss_titles('feeds/blog/category/careers/rss.xml'), ['Mock interviews'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.careers.delete()
+        self.assertFalse(os.path.exists(self.path('feeds/blog/category/careers/rss.xml')))
+        self.assertEqual(self.rss_titles('feeds/blog/category/interview-prep/rss.xml'), ['Mock interviews'])
+
+    def test_tag_changes_rewrite_their_feeds(self):
+        post = self.create_post('Portfolio')
+        with self.captureOnCommitCallbacks(execute=True):
+            post.tags.add('design')
+        tag = Tag.objects.get(name='design')
+        tag.name = tag.slug = 'ux'
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.save()
+        self.assertFalse(os.path.exists(self.path('feeds/blog/tag/design/rss.xml')))
+        self.assertEqual(self.rss_titles('feeds/blog/tag/ux/rss.xml'), ['Portfolio'])
+        self.assertEqual([item.findtext('category') for item in self.read('feeds/blog/rss.xml').iter('item')], ['ux'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.delete()
+        self.assertFalse(os.path.exists(self.path('feeds/blog/tag/ux/rss.xml')))
+        self.assertIsNone(next(self.read('feeds/blog/rss.xml').iter('item')).find('category'))
+
+    def test_writing_runs_in_the_publishing_worker(self):
+        with mock.patch('feeds.generator.submit') as submit:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                post = BlogPost.objects.create(title='Queued', author=self.author, content='x', status='published')
+            submit.assert_not_called()
+            for callback in callbacks:
+                callback()
+        self.assertEqual(submit.call_args.args[1:3], (refresh_post, post.pk))
+        self.assertFalse(os.path.exists(self.path('feeds')))
+
+    def test_unchanged_files_keep_their_modification_time(self):
+        self.create_post('Stable')
+        feed = self.path('feeds/blog/rss.xml')
+        os.utime(feed, (0, 0))
+
+        call_command('build_feeds', stdout=StringIO())
+
+        self.assertEqual(os.stat(feed).st_mtime, 0)
+
+    def test_services_are_listed_while_active(self):
+        category = ServiceCategory.objects.create(name='Resumes')
+        with self.captureOnCommitCallbacks(execute=True):
+            service = Service.objects.create(
+                name='CV review', short_description='Short', description='<p>Long</p>',
+                category=category, price=Decimal('50.00'),
+            )
+        shard = shard_name('services', service.pk // SHARD_SIZE)
+        self.assertEqual(self.sitemap_urls(shard), ['https://example.com/services/cv-review'])
+
+        service.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            service.save()
+
+        self.assertFalse(os.path.exists(self.path(shard)))
+        self.assertEqual(list(self.read('sitemap.xml')), [])
+
+    def test_build_feeds_writes_everything_and_prunes_stale_files(self):
+        BlogPost.objects.create(title='Quiet import', author=self.author, content='x', status='published')
+        os.makedirs(self.path('feeds/blog/tag/gone'))
+        with open(self.path('feeds/blog/tag/gone/rss.xml'), 'w') as fh:
+            fh.write('stale')
+
+        out = StringIO()
+        call_command('build_feeds', stdout=out)
+
+        self.assertIn('Published', out.getvalue())
+        self.assertEqual(self.rss_titles('feeds/blog/rss.xml'), ['Quiet import'])
+        self.assertTrue(os.path.exists(self.path('sitemap.xml.gz')))
+        self.assertFalse(os.path.exists(self.path('feeds/blog/tag/gone/rss.xml')))
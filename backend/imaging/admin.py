@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import ImageVariant
+
+@admin.register(ImageVariant)
+class ImageVariantAdmin(admin.ModelAdmin):
+    list_display = ('source', 'format', 'width', 'height', 'created_at')
+    list_filter = ('format', 'width')
+    search_fields = ('source', 'file')
+    readonly_fields = ('source', 'format', 'width', 'height', 'file', 'created_at')
@@ -0,0 +1,26 @@
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+
+from .pipeline import get_manifest
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """`srcset` strings per format for an image field, e.g. `{'webp': '/media/a.320w.webp 320w, ...'}`.
+
+    Images without variants yet render as an empty map.
+    """
+
+    def to_representation(self, value):
+        if not value:
+            return {}
+        request = self.context.get('request')
+        srcset = {}
+        for image_format, entries in get_manifest(value.name).items():
+            urls = []
+            for width, name in entries:
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls.append(f'{url} {width}w')
+            srcset[image_format] = ', '.join(urls)
+        return srcset
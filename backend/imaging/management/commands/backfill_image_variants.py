@@ -0,0 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from imaging.pipeline import IMAGE_FIELDS, process_in_thread
+
+
+class Command(BaseCommand):
+    help = 'Generate the resized variants of every stored image, in parallel.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--force', action='store_true', help='Regenerate images that already have variants.')
+
+    def handle(self, *args, **options):
+        jobs = {}
+        for label, field_names in IMAGE_FIELDS.items():
+            model = apps.get_model(label)
+            for field_name in field_names:
+                names = (
+                    model.objects.exclude(**{f'{field_name}__isnull': True})
+                    .exclude(**{field_name: ''})
+                    .values_list(field_name, flat=True)
+                    .distinct()
+                )
+                for name in names:
+                    jobs.setdefault(name, model)
+
+        generated = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {
+                pool.submit(process_in_thread, model, name, options['force']): name
+                for name, model in jobs.items()
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'{futures[future]}: {exc}')
+                else:
+                    generated += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {generated} images ({failed} failed).'))
@@ -0,0 +1,23 @@
+from django.db import models
+
+class ImageVariant(models.Model):
+    FORMAT_CHOICES = [
+        ('webp', 'WebP'),
+        ('jpeg', 'JPEG'),
+    ]
+    
+    source = models.CharField(max_length=255, db_index=True)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    file = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['source', 'format', 'width']
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'format', 'width'], name='imagevariant_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.source} ({self.format}, {self.width}w)"
@@ -0,0 +1,188 @@
+"""
+Resized WebP/JPEG derivatives of uploaded images.
+
+After an upload is committed its image is resized to each configured width
+that is smaller than the original (plus the original width itself when it is
+within range) and encoded once per format. Variant files are named after a
+hash of the source bytes, so a URL never changes meaning and can be cached
+forever. The variants of each source are recorded in `ImageVariant` and
+mirrored into the cache as a manifest for the serializers.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from .models import ImageVariant
+from .signals import variants_generated
+
+logger = logging.getLogger(__name__)
+
+# Model label -> image fields that get variants.
+IMAGE_FIELDS = {
+    'services.ServiceCategory': ('icon',),
+    'services.Service': ('image',),
+    'services.ServicePackage': ('image',),
+    'services.Testimonial': ('image',),
+    'blog.BlogCategory': ('image',),
+    'blog.BlogPost': ('featured_image',),
+    'users.UserProfile': ('profile_picture',),
+}
+
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+SAVE_OPTIONS = {
+    'webp': {'format': 'WEBP', 'method': 6},
+    'jpeg': {'format': 'JPEG', 'optimize': True, 'progressive': True},
+}
+
+# Sources without variants are re-checked after this long.
+MISSING_TIMEOUT = 5 * 60
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def manifest_key(source):
+    return 'imaging:variants:%s' % hashlib.sha1(source.encode()).hexdigest()
+
+
+def variant_name(source, digest, width, image_format):
+    stem = os.path.splitext(source)[0]
+    return f'variants/{stem}.{digest}.{width}w.{EXTENSIONS[image_format]}'
+
+
+def target_widths(original_width):
+    """The configured widths below the original, plus the original when it is in range."""
+    widths = sorted(settings.IMAGE_VARIANT_WIDTHS)
+    targets = [width for width in widths if width < original_width]
+    if original_width <= widths[-1]:
+        targets.append(original_width)
+    return targets
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def prepare(image, image_format):
+    """Convert to a mode the format can encode; JPEG gets transparency flattened onto white."""
+    if not has_alpha(image):
+        return image.convert('RGB')
+    image = image.convert('RGBA')
+    if image_format == 'webp':
+        return image
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def build_manifest(rows):
+    """Group `(format, width, file)` rows into `{format: [(width, file), ...]}`."""
+    manifest = {}
+    for image_format, width, name in sorted(rows):
+        manifest.setdefault(image_format, []).append((width, name))
+    return manifest
+
+
+def get_manifest(source):
+    """Return the variants of `source`, from the cache where possible."""
+    key = manifest_key(source)
+    manifest = cache.get(key)
+    if manifest is None:
+        manifest = build_manifest(
+            ImageVariant.objects.filter(source=source).values_list('format', 'width', 'file')
+        )
+        cache.set(key, manifest, None if manifest else MISSING_TIMEOUT)
+    return manifest
+
+
+def generate_variants(source, force=False):
+    """Write every variant of the stored image `source` and record them.
+
+    Sources that already have variants are left alone unless `force` is set.
+    Returns the manifest.
+    """
+    if not force and ImageVariant.objects.filter(source=source).exists():
+        return get_manifest(source)
+
+    with default_storage.open(source, 'rb') as fh:
+        data = fh.read()
+    digest = hashlib.sha1(data).hexdigest()[:12]
+    image = ImageOps.exif_transpose(Image.open(BytesIO(data)))
+    original_width, original_height = image.size
+
+    variants = []
+    for image_format in settings.IMAGE_VARIANT_FORMATS:
+        prepared = prepare(image, image_format)
+        for width in target_widths(original_width):
+            height = max(1, round(original_height * width / original_width))
+            name = variant_name(source, digest, width, image_format)
+            # The name is derived from the content, so an existing file is identical.
+            if not default_storage.exists(name):
+                resized = prepared if width == original_width else prepared.resize((width, height), Image.LANCZOS)
+                buffer = BytesIO()
+                resized.save(buffer, quality=settings.IMAGE_VARIANT_QUALITY, **SAVE_OPTIONS[image_format])
+                name = default_storage.save(name, ContentFile(buffer.getvalue()))
+            variants.append(ImageVariant(
+                source=source, format=image_format, width=width, height=height, file=name
+            ))
+
+    with transaction.atomic():
+        ImageVariant.objects.filter(source=source).delete()
+        ImageVariant.objects.bulk_create(variants)
+    manifest = build_manifest((variant.format, variant.width, variant.file) for variant in variants)
+    cache.set(manifest_key(source), manifest, None)
+    return manifest
+
+
+def process(model, source, force=False):
+    """Generate the variants of `source` and announce them for `model`."""
+    manifest = generate_variants(source, force=force)
+    variants_generated.send(sender=model, source=source, manifest=manifest)
+    return manifest
+
+
+def process_in_thread(model, source, force=False):
+    """Run `process` from a worker thread, releasing its database connection afterwards."""
+    try:
+        return process(model, source, force=force)
+    finally:
+        connections.close_all()
+
+
+def _background(model, source):
+    try:
+        process_in_thread(model, source)
+    except Exception:
+        logger.exception('Could not generate image variants for %s', source)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS, thread_name_prefix='imaging'
+            )
+        return _executor
+
+
+def schedule(model, source):
+    """Generate the variants of `source` in the worker pool once the current transaction commits."""
+    def submit():
+        if settings.IMAGE_VARIANT_WORKERS:
+            get_executor().submit(_background, model, source)
+        else:
+            process(model, source)
+
+    transaction.on_commit(submit)
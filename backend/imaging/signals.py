@@ -0,0 +1,30 @@
+from django.apps import apps
+from django.db.models.signals import pre_save, post_save
+from django.dispatch import Signal
+
+# Sent with `source` and `manifest` after the variants of an image of the sender model are written.
+variants_generated = Signal()
+
+
+def mark_new_uploads(sender, instance, raw=False, **kwargs):
+    from .pipeline import IMAGE_FIELDS
+    # Uncommitted files are fresh uploads that the field is about to store.
+    instance._imaging_new_uploads = [
+        field_name for field_name in IMAGE_FIELDS[sender._meta.label]
+        if not raw and getattr(instance, field_name) and not getattr(instance, field_name)._committed
+    ]
+
+
+def queue_variants(sender, instance, raw=False, **kwargs):
+    from .pipeline import schedule
+    for field_name in getattr(instance, '_imaging_new_uploads', ()):
+        schedule(sender, getattr(instance, field_name).name)
+    instance._imaging_new_uploads = []
+
+
+def connect_image_fields():
+    from .pipeline import IMAGE_FIELDS
+    for label in IMAGE_FIELDS:
+        model = apps.get_model(label)
+        pre_save.connect(mark_new_uploads, sender=model, dispatch_uid=f'imaging-mark-{label}')
+        post_save.connect(queue_variants, sender=model, dispatch_uid=f'imaging-queue-{label}')
@@ -0,0 +1,80 @@
+import shutil
+import tempfile
+from decimal import Decimal
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from services.models import ServiceCategory, Service
+from services.serializers import ServiceSerializer
+
+from .models import ImageVariant
+from .pipeline import get_manifest
+
+
+def upload(name, size=(900, 600), mode='RGB'):
+    buffer = BytesIO()
+    Image.new(mode, size, 'red').save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class ImageVariantPipelineTests(TestCase):
+    """Uploads get content-hashed WebP/JPEG variants exposed as srcset maps."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(
+            MEDIA_ROOT=self.media_root, IMAGE_VARIANT_WORKERS=0, IMAGE_VARIANT_WIDTHS=(320, 640, 1600)
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+        self.category = ServiceCategory.objects.create(name='Resumes')
+
+    def create_service(self, image, name='Review'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Service.objects.create(
+                name=name, short_description='Short', description='Long',
+                category=self.category, price=Decimal('10.00'), image=image,
+            )
+
+    def test_upload_generates_variants(self):
+        service = self.create_service(upload('photo.png', mode='RGBA'))
+        widths = sorted(ImageVariant.objects.filter(format='jpeg').values_list('width', flat=True))
+        self.assertEqual(widths, [320, 640, 900])
+        variant = ImageVariant.objects.get(format='webp', width=320)
+        self.assertEqual(variant.height, 213)
+        self.assertRegex(variant.file, r'^variants/service_images/photo\.[0-9a-f]{12}\.320w\.webp$')
+
+        srcset = ServiceSerializer(service).data['image_variants']
+        self.assertEqual(set(srcset), {'webp', 'jpeg'})
+        self.assertTrue(srcset['jpeg'].endswith(' 900w'))
+
+    def test_names_hash_the_content(self):
+        first = self.create_service(upload('a.png'), name='First')
+        second = self.create_service(upload('b.png', size=(901, 600)), name='Second')
+        same = self.create_service(upload('c.png'), name='Same')
+
+        def digest(service):
+            return ImageVariant.objects.filter(source=service.image.name).first().file.split('.')[1]
+
+        self.assertEqual(digest(first), digest(same))
+        self.assertNotEqual(digest(first), digest(second))
+
+    def test_resave_does_not_regenerate(self):
+        service = self.create_service(upload('photo.png'))
+        ImageVariant.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            service.save()
+        self.assertFalse(ImageVariant.objects.exists())
+
+    def test_manifest_cached(self):
+        service = self.create_service(upload('photo.png'))
+        cache.clear()
+        get_manifest(service.image.name)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(get_manifest(service.image.name)['webp']), 3)
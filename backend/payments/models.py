@@ -28,6 +28,11 @@ class Order(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Back keyset pagination of all orders and of one user's orders
+            models.Index(fields=['-created_at', '-id'], name='order_keyset'),
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_keyset'),
+        ]
     
     def __str__(self):
         return f"Order {self.order_id}"
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from core.serializers import DynamicFieldsMixin
 from services.serializers import ServiceSerializer, ServicePackageSerializer
 from .models import Order, OrderItem, Payment, Coupon, Invoice
 
@@ -91,7 +92,7 @@ class InvoiceSerializer(serializers.ModelSerializer):
         read_only_fields = ['invoice_number', 'created_at', 'updated_at']
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for the Order model."""
     user = UserBasicSerializer(read_only=True)
     user_id = serializers.PrimaryKeyRelatedField(
@@ -115,6 +116,7 @@ class OrderSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['order_number', 'subtotal', 'tax_amount', 'discount_amount', 
                            'total_amount', 'created_at', 'updated_at']
+        expandable_fields = ['user', 'items', 'payments', 'invoice', 'coupon']
     
     def create(self, validated_data):
         """Create an order with items."""
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ServicesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'services'
+    
+    def ready(self):
+        from core.search import install_indexes
+        from . import signals  # noqa: F401
+        from .pricing import backfill_effective_prices
+        post_migrate.connect(install_indexes, sender=self)
+        post_migrate.connect(backfill_effective_prices, sender=self)
@@ -0,0 +1,41 @@
+from core.response_cache import ResponseCache
+from .models import ServiceCategory, Service, ServicePackage, Testimonial
+
+
+def featured_services_sources():
+    return [
+        (Service.objects.filter(is_featured=True, is_active=True), 'updated_at'),
+        (ServiceCategory.objects.all(), 'updated_at'),
+    ]
+
+
+def featured_packages_sources():
+    return [
+        (ServicePackage.objects.filter(is_featured=True, is_active=True), 'updated_at'),
+        (Service.objects.all(), 'updated_at'),
+    ]
+
+
+def featured_testimonials_sources():
+    return [
+        (Testimonial.objects.filter(is_featured=True), 'created_at'),
+        (Service.objects.all(), 'updated_at'),
+        (ServicePackage.objects.all(), 'updated_at'),
+    ]
+
+
+def catalog_facets_sources():
+    return [
+        (Service.objects.all(), 'updated_at'),
+        (ServiceCategory.objects.all(), 'updated_at'),
+    ]
+
+
+featured_services_cache = ResponseCache('featured-services', featured_services_sources)
+featured_packages_cache = ResponseCache('featured-packages', featured_packages_sources)
+featured_testimonials_cache = ResponseCache('featured-testimonials', featured_testimonials_sources)
+catalog_facets_cache = ResponseCache(
+    'catalog-facets', catalog_facets_sources,
+    params=('category', 'tag', 'tags', 'tag_mode', 'level', 'search', 'min_price', 'max_price'),
+    public_only=True,
+)
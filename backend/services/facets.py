@@ -0,0 +1,82 @@
+"""
+Facet counts for the service catalog.
+
+Every facet is read from one grouped query: services are grouped by
+category, level, price band, featured and discounted state, and the
+per-facet counts are summed from those groups in Python.
+"""
+
+from django.db.models import BooleanField, Case, Count, F, Value, When, CharField
+
+from .models import Service
+
+# (key, lower bound inclusive, upper bound exclusive) on the effective price.
+PRICE_BANDS = (
+    ('under-50', None, 50),
+    ('50-100', 50, 100),
+    ('100-250', 100, 250),
+    ('250-500', 250, 500),
+    ('500-plus', 500, None),
+)
+
+
+def price_band():
+    """Expression naming the price band of each service's effective price."""
+    whens = [
+        When(effective_price__lt=upper, then=Value(key))
+        for key, lower, upper in PRICE_BANDS
+        if upper is not None
+    ]
+    return Case(*whens, default=Value(PRICE_BANDS[-1][0]), output_field=CharField())
+
+
+def compute_facets(queryset):
+    """Count the services in `queryset` per category, level, price band, featured and discounted."""
+    groups = (
+        queryset.order_by()
+        .annotate(
+            band=price_band(),
+            discounted=Case(
+                When(discounted_price__lt=F('price'), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+        )
+        .values('category__slug', 'category__name', 'level', 'band', 'is_featured', 'discounted')
+        .annotate(count=Count('pk'))
+    )
+
+    total = featured = discounted = 0
+    categories = {}
+    levels = dict.fromkeys((value for value, label in Service.LEVEL_CHOICES), 0)
+    bands = dict.fromkeys((key for key, lower, upper in PRICE_BANDS), 0)
+    for group in groups:
+        count = group['count']
+        total += count
+        category = categories.setdefault(
+            group['category__slug'],
+            {'slug': group['category__slug'], 'name': group['category__name'], 'count': 0},
+        )
+        category['count'] += count
+        levels[group['level']] = levels.get(group['level'], 0) + count
+        bands[group['band']] += count
+        if group['is_featured']:
+            featured += count
+        if group['discounted']:
+            discounted += count
+
+    level_labels = dict(Service.LEVEL_CHOICES)
+    return {
+        'total': total,
+        'category': sorted(categories.values(), key=lambda category: category['name']),
+        'level': [
+            {'value': value, 'label': level_labels.get(value, value), 'count': count}
+            for value, count in levels.items()
+        ],
+        'price': [
+            {'key': key, 'min': lower, 'max': upper, 'count': bands[key]}
+            for key, lower, upper in PRICE_BANDS
+        ],
+        'featured': featured,
+        'discounted': discounted,
+    }
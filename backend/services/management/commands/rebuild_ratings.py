@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from services.caching import featured_services_cache, featured_packages_cache, featured_testimonials_cache
+from services.ratings import rebuild_ratings
+from services.snapshot import catalog_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Recompute the rating summaries of every service and package from their testimonials.'
+
+    def handle(self, *args, **options):
+        written = rebuild_ratings()
+        catalog_snapshot.invalidate()
+        for response_cache in (featured_services_cache, featured_packages_cache, featured_testimonials_cache):
+            response_cache.invalidate()
+        for model, count in written.items():
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} {model._meta.verbose_name_plural}.'))
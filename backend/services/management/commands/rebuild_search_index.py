@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.search import registry
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of every registered model.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        for index in registry:
+            count = index.rebuild(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Indexed {count} {index.model._meta.verbose_name_plural}.'))
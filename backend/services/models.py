@@ -1,6 +1,10 @@
+from decimal import Decimal
+
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils.text import slugify
 from ckeditor.fields import RichTextField
+from taggit.managers import TaggableManager
 
 class ServiceCategory(models.Model):
     name = models.CharField(max_length=100)
@@ -42,14 +46,21 @@ class Service(models.Model):
     image = models.ImageField(upload_to='service_images/', blank=True, null=True)
     level = models.CharField(max_length=20, choices=LEVEL_CHOICES, default='all')
     duration = models.CharField(max_length=100, blank=True, help_text='e.g., "2-3 days"')
+    tags = TaggableManager(blank=True)
     is_featured = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     order = models.PositiveIntegerField(default=0)
+    # The price actually paid; kept in step with the prices by save()
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['order', 'name']
+        indexes = [
+            models.Index(fields=['effective_price', 'id'], name='service_effective_price'),
+        ]
     
     def __str__(self):
         return self.name
@@ -57,6 +68,9 @@ class Service(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        self.effective_price = self.discounted_price if self.is_discounted else self.price
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'effective_price'}
         super().save(*args, **kwargs)
     
     @property
@@ -85,11 +99,17 @@ class ServicePackage(models.Model):
     is_featured = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     order = models.PositiveIntegerField(default=0)
+    # The price actually paid; kept in step with the prices by save()
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['order', 'name']
+        indexes = [
+            models.Index(fields=['effective_price', 'id'], name='package_effective_price'),
+        ]
     
     def __str__(self):
         return self.name
@@ -97,6 +117,9 @@ class ServicePackage(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        self.effective_price = self.discounted_price if self.is_discounted else self.price
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'effective_price'}
         super().save(*args, **kwargs)
     
     @property
@@ -159,3 +182,37 @@ class Testimonial(models.Model):
     
     def __str__(self):
         return f"Testimonial from {self.name}"
+
+class RatingSummary(models.Model):
+    count = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    star_1 = models.PositiveIntegerField(default=0)
+    star_2 = models.PositiveIntegerField(default=0)
+    star_3 = models.PositiveIntegerField(default=0)
+    star_4 = models.PositiveIntegerField(default=0)
+    star_5 = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        abstract = True
+    
+    @property
+    def average(self):
+        if not self.count:
+            return None
+        return round(Decimal(self.total) / self.count, 2)
+    
+    @property
+    def histogram(self):
+        return {star: getattr(self, f'star_{star}') for star in range(1, 6)}
+
+class ServiceRating(RatingSummary):
+    service = models.OneToOneField(Service, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    
+    def __str__(self):
+        return f"Ratings for {self.service_id}"
+
+class PackageRating(RatingSummary):
+    package = models.OneToOneField(ServicePackage, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    
+    def __str__(self):
+        return f"Ratings for {self.package_id}"
@@ -0,0 +1,114 @@
+"""
+Package pricing engine.
+
+Computes what each package costs against the sum of its services: the
+effective price, the services' effective total, the absolute and percent
+savings, whether it has savings over its services and whether it is
+discounted, in the same sense as `ServicePackage.is_discounted`. Results are computed for all
+active packages in one aggregate query, cached per package, and recomputed
+for just the affected packages when prices or memberships change.
+"""
+
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Q, Sum, When, Value
+from django.db.models.functions import Coalesce
+
+from .models import Service, ServicePackage, PackageService
+
+CACHE_TIMEOUT = 60 * 60
+CENTS = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+
+def cache_key(package_id):
+    return f'pricing:v2:package:{package_id}'
+
+
+def effective_price(prefix=''):
+    """Expression for the price actually paid: the discounted price when it is lower."""
+    price = F(f'{prefix}price')
+    discounted_price = F(f'{prefix}discounted_price')
+    return Case(
+        When(**{f'{prefix}discounted_price__lt': price}, then=discounted_price),
+        default=price,
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def compute_pricing(queryset):
+    """Price every package in `queryset` in one grouped query."""
+    rows = queryset.order_by().values('pk').annotate(
+        effective=effective_price(),
+        services_total=Coalesce(
+            Sum(effective_price('services__')),
+            Value(ZERO),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    ).values('pk', 'price', 'discounted_price', 'effective', 'services_total')
+
+    pricing = {}
+    for row in rows:
+        effective = row['effective'].quantize(CENTS)
+        services_total = row['services_total'].quantize(CENTS)
+        savings = services_total - effective
+        percent = (savings / services_total * 100).quantize(CENTS) if services_total else ZERO
+        pricing[row['pk']] = {
+            'effective_price': effective,
+            'services_total': services_total,
+            'savings': savings,
+            'savings_percent': percent,
+            'has_savings': savings > 0,
+            # Same rule as ServicePackage.is_discounted
+            'is_discounted': row['discounted_price'] is not None and row['discounted_price'] < row['price'],
+        }
+    return pricing
+
+
+def get_package_pricing(package_ids):
+    """Return `{package_id: pricing}` for the given packages, from the cache where possible.
+
+    On a miss every active package is recomputed in the same pass, so a cold
+    cache costs one query however many packages are being rendered.
+    """
+    package_ids = set(package_ids)
+    cached = cache.get_many([cache_key(package_id) for package_id in package_ids])
+    pricing = {package_id: cached[cache_key(package_id)] for package_id in package_ids if cache_key(package_id) in cached}
+    missing = package_ids - set(pricing)
+    if missing:
+        fresh = compute_pricing(ServicePackage.objects.filter(Q(is_active=True) | Q(pk__in=missing)))
+        cache.set_many({cache_key(package_id): value for package_id, value in fresh.items()}, CACHE_TIMEOUT)
+        pricing.update({package_id: fresh[package_id] for package_id in missing if package_id in fresh})
+    return pricing
+
+
+def refresh_package_pricing(package_ids=None):
+    """Recompute and cache pricing for some packages, or for every active package."""
+    if package_ids is None:
+        queryset = ServicePackage.objects.filter(is_active=True)
+    else:
+        queryset = ServicePackage.objects.filter(pk__in=package_ids)
+    fresh = compute_pricing(queryset)
+    cache.set_many({cache_key(package_id): value for package_id, value in fresh.items()}, CACHE_TIMEOUT)
+    if package_ids is not None:
+        cache.delete_many([cache_key(package_id) for package_id in set(package_ids) - set(fresh)])
+    return fresh
+
+
+def schedule_refresh(package_ids):
+    """Recompute pricing for `package_ids` once the current transaction commits."""
+    package_ids = set(package_ids)
+    if package_ids:
+        transaction.on_commit(lambda: refresh_package_pricing(package_ids))
+
+
+def packages_containing(service):
+    return PackageService.objects.filter(service=service).values_list('package_id', flat=True)
+
+
+def backfill_effective_prices(sender, using='default', **kwargs):
+    """post_migrate receiver filling in the stored effective price of rows saved before it existed."""
+    for model in (Service, ServicePackage):
+        model.objects.using(using).filter(effective_price__isnull=True).update(effective_price=effective_price())
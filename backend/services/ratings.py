@@ -0,0 +1,90 @@
+"""
+Maintained testimonial rating aggregates per service and package.
+
+Each summary row holds the count, the sum and a 1-5 histogram of the ratings
+pointing at its service or package. Testimonial signals apply each change as
+an atomic F() delta; `rebuild_ratings` recomputes every row in bulk.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Testimonial, ServiceRating, PackageRating
+
+# (testimonial foreign key attname, summary model)
+TARGETS = (
+    ('service_id', ServiceRating),
+    ('package_id', PackageRating),
+)
+
+
+def contributions(values):
+    """The `(summary model, key, rating)` entries a testimonial's values count towards."""
+    return {
+        (model, values[attname], values['rating'])
+        for attname, model in TARGETS
+        if values[attname] is not None
+    }
+
+
+def apply(model, key, rating, sign):
+    """Add (sign=1) or remove (sign=-1) one rating from a summary row."""
+    model.objects.get_or_create(pk=key)
+    star = f'star_{rating}'
+    model.objects.filter(pk=key).update(
+        count=F('count') + sign,
+        total=F('total') + sign * rating,
+        **{star: F(star) + sign},
+    )
+
+
+def snapshot(testimonial):
+    return {
+        'service_id': testimonial.service_id,
+        'package_id': testimonial.package_id,
+        'rating': testimonial.rating,
+    }
+
+
+def update_ratings(previous, current):
+    """Move a testimonial's contribution from the `previous` values to the `current` ones.
+
+    Either side may be None for a created or deleted testimonial. Returns
+    whether any summary changed.
+    """
+    before = contributions(previous) if previous else set()
+    after = contributions(current) if current else set()
+    for model, key, rating in before - after:
+        apply(model, key, rating, -1)
+    for model, key, rating in after - before:
+        apply(model, key, rating, 1)
+    return before != after
+
+
+def aggregate(attname):
+    """Count, sum and histogram of the ratings grouped by `attname`, in one query."""
+    histogram = {
+        f'star_{star}': Count('pk', filter=Q(rating=star))
+        for star in range(1, 6)
+    }
+    return (
+        Testimonial.objects.filter(**{f'{attname}__isnull': False})
+        .order_by()
+        .values(attname)
+        .annotate(count=Count('pk'), total=Sum('rating'), **histogram)
+    )
+
+
+@transaction.atomic
+def rebuild_ratings():
+    """Recompute every summary from the testimonials. Returns the rows written per model."""
+    written = {}
+    for attname, model in TARGETS:
+        rows = [
+            model(pk=row.pop(attname), **row)
+            for row in aggregate(attname)
+        ]
+        model.objects.all().delete()
+        model.objects.bulk_create(rows)
+        written[model] = len(rows)
+    return written
@@ -0,0 +1,15 @@
+from core import search
+from .models import Service, ServicePackage
+
+# Weighted so a hit in the name outranks one buried in the description.
+service_index = search.register(Service, [
+    ('name', 'A'),
+    ('short_description', 'B'),
+    ('description', 'C'),
+])
+
+package_index = search.register(ServicePackage, [
+    ('name', 'A'),
+    ('short_description', 'B'),
+    ('description', 'C'),
+])
@@ -1,27 +1,58 @@
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Prefetch
 from rest_framework import serializers
 from taggit.serializers import TagListSerializerField, TaggitSerializer
-from .models import ServiceCategory, Service, ServicePackage, ServiceFeature, Testimonial
+from core.serializers import DynamicFieldsMixin, RenderedHTMLField, RenderedHTMLListSerializer, include_field, expand_field
+from imaging.fields import ImageVariantsField
+from .models import ServiceCategory, Service, ServicePackage, ServiceFeature, PackageFeature, Testimonial
+from .pricing import get_package_pricing
 
 
-class ServiceCategorySerializer(serializers.ModelSerializer):
+class ServiceCategorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for the ServiceCategory model."""
+    icon_variants = ImageVariantsField(source='icon')
     
     class Meta:
         model = ServiceCategory
-        fields = ['id', 'name', 'description', 'slug', 'icon', 'is_active', 'created_at', 'updated_at']
+        fields = [
+            'id', 'name', 'description', 'slug', 'icon', 'icon_variants', 'is_active', 
+            'created_at', 'updated_at'
+        ]
         read_only_fields = ['slug', 'created_at', 'updated_at']
 
 
-class ServiceFeatureSerializer(serializers.ModelSerializer):
+class ServiceFeatureSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for the ServiceFeature model."""
     
     class Meta:
         model = ServiceFeature
-        fields = ['id', 'name', 'description', 'icon', 'created_at', 'updated_at']
-        read_only_fields = ['created_at', 'updated_at']
+        fields = ['id', 'name', 'description', 'is_highlighted', 'order']
+
+
+class PackageFeatureSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Serializer for the PackageFeature model."""
+    
+    class Meta:
+        model = PackageFeature
+        fields = ['id', 'name', 'description', 'is_highlighted', 'order']
 
 
-class ServiceSerializer(TaggitSerializer, serializers.ModelSerializer):
+class RatingSummarySerializer(serializers.Serializer):
+    """Serializer for a service's or package's testimonial rating summary."""
+    count = serializers.IntegerField()
+    average = serializers.DecimalField(max_digits=3, decimal_places=2, allow_null=True)
+    total = serializers.IntegerField()
+    histogram = serializers.DictField(child=serializers.IntegerField())
+    
+    def get_attribute(self, instance):
+        # Rows without testimonials have no summary yet; report them as empty.
+        try:
+            return getattr(instance, self.source)
+        except ObjectDoesNotExist:
+            return instance._meta.get_field(self.source).related_model(pk=instance.pk)
+
+
+class ServiceSerializer(DynamicFieldsMixin, TaggitSerializer, serializers.ModelSerializer):
     """Serializer for the Service model."""
     category = ServiceCategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
@@ -29,20 +60,67 @@ class ServiceSerializer(TaggitSerializer, serializers.ModelSerializer):
         source='category',
         write_only=True
     )
+    description = RenderedHTMLField()
     features = ServiceFeatureSerializer(many=True, read_only=True)
     tags = TagListSerializerField()
+    image_variants = ImageVariantsField(source='image')
+    rating = RatingSummarySerializer(source='rating_summary', read_only=True)
     
     class Meta:
         model = Service
+        list_serializer_class = RenderedHTMLListSerializer
         fields = [
             'id', 'name', 'slug', 'description', 'short_description', 'category', 
-            'category_id', 'price', 'duration', 'image', 'features', 'is_featured', 
-            'is_active', 'tags', 'created_at', 'updated_at'
+            'category_id', 'price', 'effective_price', 'duration', 'image', 'image_variants', 'features', 
+            'is_featured', 'is_active', 'tags', 'rating', 'created_at', 'updated_at'
         ]
         read_only_fields = ['slug', 'created_at', 'updated_at']
+        expandable_fields = ['category', 'features']
+    
+    @staticmethod
+    def setup_eager_loading(queryset, fields=None, expand=None):
+        """Load the nested category, features and tags in a fixed number of queries.
+        
+        Relations left out of the sparse fieldset are not loaded, and collapsed
+        ones only load their primary keys.
+        """
+        queryset = queryset.defer('search_vector')
+        if expand_field('category', fields, expand):
+            queryset = queryset.select_related('category')
+        if expand_field('features', fields, expand):
+            queryset = queryset.prefetch_related('features')
+        elif include_field('features', fields):
+            queryset = queryset.prefetch_related(
+                Prefetch('features', queryset=ServiceFeature.objects.only('id', 'service'))
+            )
+        if include_field('tags', fields):
+            queryset = queryset.prefetch_related('tags')
+        if include_field('rating', fields):
+            queryset = queryset.select_related('rating_summary')
+        return queryset
 
 
-class ServicePackageSerializer(serializers.ModelSerializer):
+class PackagePricingSerializer(serializers.Serializer):
+    """Serializer for a package's computed pricing."""
+    effective_price = serializers.DecimalField(max_digits=12, decimal_places=2)
+    services_total = serializers.DecimalField(max_digits=12, decimal_places=2)
+    savings = serializers.DecimalField(max_digits=12, decimal_places=2)
+    savings_percent = serializers.DecimalField(max_digits=6, decimal_places=2)
+    has_savings = serializers.BooleanField()
+    is_discounted = serializers.BooleanField()
+
+
+class ServicePackageListSerializer(RenderedHTMLListSerializer):
+    """Fetches pricing and rich text renders for the whole list in one cache round trip each."""
+    
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        if 'pricing' in self.child.fields:
+            self.pricing = get_package_pricing([item.pk for item in items])
+        return super().to_representation(items)
+
+
+class ServicePackageSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for the ServicePackage model."""
     services = ServiceSerializer(many=True, read_only=True)
     service_ids = serializers.PrimaryKeyRelatedField(
@@ -51,27 +129,64 @@ class ServicePackageSerializer(serializers.ModelSerializer):
         write_only=True,
         many=True
     )
-    features = ServiceFeatureSerializer(many=True, read_only=True)
+    features = PackageFeatureSerializer(many=True, read_only=True)
     feature_ids = serializers.PrimaryKeyRelatedField(
         queryset=ServiceFeature.objects.all(),
         source='features',
         write_only=True,
         many=True
     )
+    description = RenderedHTMLField()
+    pricing = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField(source='image')
+    rating = RatingSummarySerializer(source='rating_summary', read_only=True)
     
     class Meta:
         model = ServicePackage
+        list_serializer_class = ServicePackageListSerializer
         fields = [
             'id', 'name', 'slug', 'description', 'short_description', 'price', 
-            'discounted_price', 'duration', 'image', 'services', 'service_ids',
-            'features', 'feature_ids', 'is_featured', 'is_active', 'created_at', 
-            'updated_at'
+            'discounted_price', 'effective_price', 'pricing', 'image', 'image_variants', 'services', 'service_ids',
+            'features', 'feature_ids', 'is_featured', 'is_active', 'rating', 
+            'created_at', 'updated_at'
         ]
         read_only_fields = ['slug', 'created_at', 'updated_at']
+        expandable_fields = ['services', 'features']
+    
+    def get_pricing(self, obj):
+        """Return the package's cached pricing, batched when serializing a list."""
+        pricing = getattr(self.parent, 'pricing', None)
+        if pricing is None or obj.pk not in pricing:
+            pricing = get_package_pricing([obj.pk])
+        if obj.pk not in pricing:
+            return None
+        return PackagePricingSerializer(pricing[obj.pk]).data
+    
+    @staticmethod
+    def setup_eager_loading(queryset, fields=None, expand=None):
+        """Load the nested services (with their own relations) and features."""
+        queryset = queryset.defer('search_vector')
+        if expand_field('services', fields, expand):
+            services = ServiceSerializer.setup_eager_loading(Service.objects.all())
+            queryset = queryset.prefetch_related(Prefetch('services', queryset=services))
+        elif include_field('services', fields):
+            queryset = queryset.prefetch_related(
+                Prefetch('services', queryset=Service.objects.only('id'))
+            )
+        if expand_field('features', fields, expand):
+            queryset = queryset.prefetch_related('features')
+        elif include_field('features', fields):
+            queryset = queryset.prefetch_related(
+                Prefetch('features', queryset=PackageFeature.objects.only('id', 'package'))
+            )
+        if include_field('rating', fields):
+            queryset = queryset.select_related('rating_summary')
+        return queryset
 
 
-class TestimonialSerializer(serializers.ModelSerializer):
+class TestimonialSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for the Testimonial model."""
+    image_variants = ImageVariantsField(source='image')
     service = ServiceSerializer(read_only=True)
     service_id = serializers.PrimaryKeyRelatedField(
         queryset=Service.objects.all(),
@@ -92,11 +207,23 @@ class TestimonialSerializer(serializers.ModelSerializer):
     class Meta:
         model = Testimonial
         fields = [
-            'id', 'client_name', 'client_title', 'client_company', 'client_image',
+            'id', 'name', 'position', 'company', 'image', 'image_variants',
             'content', 'rating', 'service', 'service_id', 'package', 'package_id',
-            'is_featured', 'is_active', 'created_at', 'updated_at'
+            'is_featured', 'order', 'created_at'
         ]
-        read_only_fields = ['created_at', 'updated_at']
+        read_only_fields = ['created_at']
+        expandable_fields = ['service', 'package']
+    
+    @staticmethod
+    def setup_eager_loading(queryset, fields=None, expand=None):
+        """Load the nested service and package the same way their own endpoints do."""
+        if expand_field('service', fields, expand):
+            services = ServiceSerializer.setup_eager_loading(Service.objects.all())
+            queryset = queryset.prefetch_related(Prefetch('service', queryset=services))
+        if expand_field('package', fields, expand):
+            packages = ServicePackageSerializer.setup_eager_loading(ServicePackage.objects.all())
+            queryset = queryset.prefetch_related(Prefetch('package', queryset=packages))
+        return queryset
         
     def validate(self, attrs):
         """Validate that at least one of service or package is provided."""
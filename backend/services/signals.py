@@ -0,0 +1,167 @@
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from taggit.models import Tag
+
+from core.richtext import prerender
+from imaging.signals import variants_generated
+
+from .models import (
+    ServiceCategory, Service, ServicePackage, PackageService, ServiceFeature, PackageFeature,
+    Testimonial
+)
+from .caching import (
+    featured_services_cache, featured_packages_cache, featured_testimonials_cache, catalog_facets_cache
+)
+from .pricing import schedule_refresh, packages_containing
+from .ratings import snapshot as rating_snapshot, update_ratings
+from .search import service_index, package_index
+from .snapshot import catalog_snapshot
+from .tag_index import tag_index
+
+CATALOG_MODELS = (ServiceCategory, Service, ServicePackage, PackageService, ServiceFeature, PackageFeature)
+
+# Models whose rows the tag posting index reads.
+TAG_INDEX_MODELS = (ServiceCategory, Service, Tag)
+
+# Which cached responses embed rows of each model. Packages nest their
+# services and testimonials nest both, so changes cascade outwards.
+RESPONSE_CACHES = {
+    ServiceCategory: (
+        featured_services_cache, featured_packages_cache, featured_testimonials_cache, catalog_facets_cache
+    ),
+    Service: (
+        featured_services_cache, featured_packages_cache, featured_testimonials_cache, catalog_facets_cache
+    ),
+    ServiceFeature: (featured_services_cache, featured_packages_cache, featured_testimonials_cache),
+    ServicePackage: (featured_packages_cache, featured_testimonials_cache),
+    PackageService: (featured_packages_cache, featured_testimonials_cache),
+    PackageFeature: (featured_packages_cache, featured_testimonials_cache),
+    Testimonial: (featured_testimonials_cache,),
+}
+
+
+@receiver(post_save, sender=Service)
+def index_service(sender, instance, raw=False, **kwargs):
+    if not raw:
+        service_index.update(instance)
+
+
+@receiver(post_delete, sender=Service)
+def unindex_service(sender, instance, **kwargs):
+    service_index.remove(instance)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_save, sender=ServicePackage)
+def prerender_description(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and (update_fields is None or 'description' in update_fields):
+        prerender(sender, instance.description)
+
+
+@receiver(post_save, sender=ServicePackage)
+def index_package(sender, instance, raw=False, **kwargs):
+    if not raw:
+        package_index.update(instance)
+
+
+@receiver(post_delete, sender=ServicePackage)
+def unindex_package(sender, instance, **kwargs):
+    package_index.remove(instance)
+
+
+@receiver(pre_save, sender=Testimonial)
+def remember_rating(sender, instance, raw=False, **kwargs):
+    instance._previous_rating = None
+    if instance.pk and not raw:
+        previous = Testimonial.objects.filter(pk=instance.pk).values('service_id', 'package_id', 'rating').first()
+        instance._previous_rating = previous
+
+
+def invalidate_rated_catalog():
+    # Services and packages embed their rating summaries.
+    catalog_snapshot.invalidate()
+    for response_cache in RESPONSE_CACHES[ServicePackage]:
+        response_cache.invalidate()
+    featured_services_cache.invalidate()
+
+
+@receiver(post_save, sender=Testimonial)
+def update_rating_on_save(sender, instance, raw=False, **kwargs):
+    if not raw and update_ratings(getattr(instance, '_previous_rating', None), rating_snapshot(instance)):
+        invalidate_rated_catalog()
+
+
+@receiver(post_delete, sender=Testimonial)
+def update_rating_on_delete(sender, instance, **kwargs):
+    if update_ratings(rating_snapshot(instance), None):
+        invalidate_rated_catalog()
+
+
+@receiver(post_save, sender=Service)
+def reprice_packages_for_service(sender, instance, created=False, raw=False, **kwargs):
+    # A new service belongs to no package yet.
+    if not raw and not created:
+        schedule_refresh(packages_containing(instance))
+
+
+@receiver(post_save, sender=ServicePackage)
+@receiver(post_delete, sender=ServicePackage)
+def reprice_package(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        schedule_refresh([instance.pk])
+
+
+@receiver(post_save, sender=PackageService)
+@receiver(post_delete, sender=PackageService)
+def reprice_package_on_membership(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        schedule_refresh([instance.package_id])
+
+
+@receiver(m2m_changed, sender=ServicePackage.services.through)
+def reprice_packages_on_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # The cleared packages cannot be looked up afterwards.
+        instance._pricing_package_ids = list(packages_containing(instance))
+    elif action.startswith('post_'):
+        if not reverse:
+            schedule_refresh([instance.pk])
+        elif action == 'post_clear':
+            schedule_refresh(getattr(instance, '_pricing_package_ids', ()))
+        else:
+            schedule_refresh(pk_set or ())
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_catalog_caches(sender, **kwargs):
+    if sender in CATALOG_MODELS:
+        catalog_snapshot.invalidate()
+    if sender in TAG_INDEX_MODELS:
+        tag_index.invalidate()
+    for response_cache in RESPONSE_CACHES.get(sender, ()):
+        response_cache.invalidate()
+
+
+@receiver(variants_generated)
+def invalidate_catalog_caches_on_variants(sender, **kwargs):
+    # Image variants are written after the upload's own save.
+    invalidate_catalog_caches(sender)
+
+
+@receiver(m2m_changed, sender=ServicePackage.services.through)
+def invalidate_catalog_caches_on_membership(sender, action, **kwargs):
+    if action.startswith('post_'):
+        catalog_snapshot.invalidate()
+        for response_cache in RESPONSE_CACHES[PackageService]:
+            response_cache.invalidate()
+
+
+@receiver(m2m_changed, sender=Service.tags.through)
+def invalidate_catalog_caches_on_tags(sender, instance, action, model, **kwargs):
+    # The tag through table is shared with the blog; only service tags matter here.
+    if action.startswith('post_') and (isinstance(instance, Service) or model is Service):
+        catalog_snapshot.invalidate()
+        tag_index.invalidate()
+        for response_cache in RESPONSE_CACHES[Service]:
+            response_cache.invalidate()
@@ -0,0 +1,133 @@
+"""
+In-process snapshot of the public service catalog.
+
+The active catalog is serialized once into a plain document and kept in
+memory, so anonymous catalog reads are answered without touching the
+database. Every worker holds its own copy; a version counter in the shared
+cache tells each of them when the catalog changed in another process.
+
+Rows are serialized without a request, so media URLs are stored relative
+and made absolute against the live request when served (`absolute_urls`),
+as they are when the same endpoints read the database.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ServiceCategory, Service, ServicePackage
+from .serializers import ServiceCategorySerializer, ServiceSerializer, ServicePackageSerializer
+
+VERSION_KEY = 'catalog:snapshot:version'
+
+
+# Keys of serialized rows holding a media URL and a `{format: srcset}` map of them.
+IMAGE_FIELDS = {'image', 'icon'}
+VARIANT_FIELDS = {'image_variants', 'icon_variants'}
+
+
+def absolute_srcset(srcset, request):
+    entries = (entry.rsplit(' ', 1) for entry in srcset.split(', '))
+    return ', '.join(f'{request.build_absolute_uri(url)} {width}' for url, width in entries)
+
+
+def absolute_urls(value, request):
+    """A copy of snapshot rows with their media URLs made absolute for `request`."""
+    if isinstance(value, list):
+        return [absolute_urls(item, request) for item in value]
+    if not isinstance(value, dict):
+        return value
+    row = {}
+    for key, item in value.items():
+        if key in IMAGE_FIELDS and isinstance(item, str) and item:
+            item = request.build_absolute_uri(item)
+        elif key in VARIANT_FIELDS and isinstance(item, dict):
+            item = {image_format: absolute_srcset(srcset, request) for image_format, srcset in item.items()}
+        else:
+            item = absolute_urls(item, request)
+        row[key] = item
+    return row
+
+
+def index_by_slug(rows):
+    return {row['slug']: row for row in rows}
+
+
+class CatalogSnapshot:
+    """Versioned, pre-serialized copy of the active categories, services and packages."""
+
+    def __init__(self):
+        self._document = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'CATALOG_SNAPSHOT_ENABLED', True)
+
+    def current_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            # Seed from the clock so a lost counter never reuses an old version.
+            cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def get(self):
+        """Return the snapshot document, rebuilding it if the catalog changed."""
+        version = self.current_version()
+        document = self._document
+        if document is not None and document['version'] == version:
+            return document
+        with self._lock:
+            if self._document is None or self._document['version'] != version:
+                self._document = self.build(version)
+            return self._document
+
+    def build(self, version):
+        """Serialize the active catalog into a new document tagged with `version`."""
+        categories = ServiceCategorySerializer(
+            ServiceCategory.objects.filter(is_active=True), many=True
+        ).data
+        services = ServiceSerializer(
+            ServiceSerializer.setup_eager_loading(Service.objects.filter(is_active=True)), many=True
+        ).data
+        packages = ServicePackageSerializer(
+            ServicePackageSerializer.setup_eager_loading(ServicePackage.objects.filter(is_active=True)),
+            many=True
+        ).data
+
+        services_by_category = {}
+        for row in services:
+            services_by_category.setdefault(row['category']['slug'], []).append(row)
+
+        return {
+            'version': version,
+            'built_at': timezone.now().isoformat(),
+            'categories': categories,
+            'categories_by_slug': index_by_slug(categories),
+            'services': services,
+            'services_by_slug': index_by_slug(services),
+            'services_by_category': services_by_category,
+            'featured_services': [row for row in services if row['is_featured']],
+            'packages': packages,
+            'packages_by_slug': index_by_slug(packages),
+            'featured_packages': [row for row in packages if row['is_featured']],
+        }
+
+    def invalidate(self):
+        """Mark every worker's snapshot stale once the current transaction commits."""
+        transaction.on_commit(self._bump_version)
+
+    def _bump_version(self):
+        self._document = None
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+catalog_snapshot = CatalogSnapshot()
@@ -0,0 +1,150 @@
+"""
+In-memory tag posting index for the service catalog.
+
+Services are numbered in catalog order and every tag, category, level and
+the active flag maps to a bitmap (a Python int) over those positions, so
+multi-tag filters are bitwise ANDs/ORs and per-tag counts are popcounts.
+Like the catalog snapshot, each worker holds its own copy and a version
+counter in the shared cache tells it when to rebuild.
+
+Tag lookups follow taggit: with `TAGGIT_CASE_INSENSITIVE` set, `Django` and
+`django` name the same tag.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+from taggit.models import TaggedItem
+
+from .models import Service
+
+VERSION_KEY = 'catalog:tag-index:version'
+
+
+class TagPostings:
+    """Bitmaps over the services of one index build."""
+
+    def __init__(self, version, ids, tags, categories, levels, active):
+        self.version = version
+        self.ids = ids
+        self.tags = tags
+        self.categories = categories
+        self.levels = levels
+        self.active = active
+        self.everything = (1 << len(ids)) - 1
+        self.lookup = {}
+        for tag, posting in tags.items():
+            key = self.normalize(tag)
+            self.lookup[key] = self.lookup.get(key, 0) | posting
+
+    @staticmethod
+    def normalize(tag):
+        """The lookup key for `tag`, case-folded the way taggit matches names."""
+        return tag.lower() if getattr(settings, 'TAGGIT_CASE_INSENSITIVE', False) else tag
+
+    def match(self, tags=(), mode='and', category=None, level=None, active_only=True):
+        """Bitmap of the services carrying all (`mode='and'`) or any of `tags`, narrowed by the other filters."""
+        bitmap = self.active if active_only else self.everything
+        if tags:
+            postings = [self.lookup.get(self.normalize(tag), 0) for tag in tags]
+            combined = postings[0]
+            for posting in postings[1:]:
+                combined = combined | posting if mode == 'or' else combined & posting
+            bitmap &= combined
+        if category:
+            bitmap &= self.categories.get(category, 0)
+        if level:
+            bitmap &= self.levels.get(level, 0)
+        return bitmap
+
+    def service_ids(self, bitmap):
+        """The ids in `bitmap`, in catalog order."""
+        ids = []
+        while bitmap:
+            low = bitmap & -bitmap
+            ids.append(self.ids[low.bit_length() - 1])
+            bitmap ^= low
+        return ids
+
+    def tag_counts(self, bitmap):
+        """How many services in `bitmap` carry each tag, for the tags that occur, busiest first."""
+        counts = [
+            (tag, (posting & bitmap).bit_count())
+            for tag, posting in self.tags.items()
+        ]
+        return sorted(
+            ((tag, count) for tag, count in counts if count),
+            key=lambda item: (-item[1], item[0]),
+        )
+
+
+class TagIndex:
+    """Versioned posting index, rebuilt lazily after tag or catalog changes."""
+
+    def __init__(self):
+        self._postings = None
+        self._lock = threading.Lock()
+
+    def current_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            # Seed from the clock so a lost counter never reuses an old version.
+            cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def get(self):
+        """Return the postings, rebuilding them if the catalog changed."""
+        version = self.current_version()
+        postings = self._postings
+        if postings is not None and postings.version == version:
+            return postings
+        with self._lock:
+            if self._postings is None or self._postings.version != version:
+                self._postings = self.build(version)
+            return self._postings
+
+    def build(self, version):
+        """Read every service and service tag in two queries and build the bitmaps."""
+        rows = Service.objects.values_list('id', 'category__slug', 'level', 'is_active')
+        ids = []
+        position = {}
+        categories = {}
+        levels = {}
+        active = 0
+        for service_id, category_slug, level, is_active in rows:
+            bit = 1 << len(ids)
+            position[service_id] = bit
+            ids.append(service_id)
+            categories[category_slug] = categories.get(category_slug, 0) | bit
+            levels[level] = levels.get(level, 0) | bit
+            if is_active:
+                active |= bit
+
+        tags = {}
+        tagged = TaggedItem.objects.filter(
+            content_type=ContentType.objects.get_for_model(Service)
+        ).values_list('object_id', 'tag__name')
+        for service_id, tag in tagged:
+            if service_id in position:
+                tags[tag] = tags.get(tag, 0) | position[service_id]
+
+        return TagPostings(version, ids, tags, categories, levels, active)
+
+    def invalidate(self):
+        """Mark every worker's index stale once the current transaction commits."""
+        transaction.on_commit(self._bump_version)
+
+    def _bump_version(self):
+        self._postings = None
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+tag_index = TagIndex()
@@ -1,3 +1,605 @@
-from django.test import TestCase
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from imaging.models import ImageVariant
+
+from .caching import featured_services_cache
+from .models import (
+    ServiceCategory, Service, ServicePackage, PackageService, ServiceFeature,
+    PackageFeature, Testimonial, ServiceRating, PackageRating
+)
+from .pricing import get_package_pricing, refresh_package_pricing
+from .search import service_index
+from .snapshot import catalog_snapshot
+
+
+def create_catalog(size):
+    """Create `size` featured services and packages with every nested relation populated."""
+    category = ServiceCategory.objects.create(name='Resumes')
+    services = []
+    for i in range(size):
+        service = Service.objects.create(
+            name=f'Service {i}',
+            short_description='Short',
+            description='<p>Long</p>',
+            category=category,
+            price=Decimal('100.00'),
+            is_featured=True,
+        )
+        service.tags.add('resume', f'tag-{i}')
+        ServiceFeature.objects.create(service=service, name='Feature A')
+        ServiceFeature.objects.create(service=service, name='Feature B')
+        services.append(service)
+    for i in range(size):
+        package = ServicePackage.objects.create(
+            name=f'Package {i}',
+            package_type='professional',
+            short_description='Short',
+            description='<p>Long</p>',
+            price=Decimal('250.00'),
+            is_featured=True,
+        )
+        for order, service in enumerate(services[:3]):
+            PackageService.objects.create(package=package, service=service, order=order)
+        PackageFeature.objects.create(package=package, name='Bundle feature')
+        Testimonial.objects.create(
+            name=f'Client {i}', content='Great', service=services[i], package=package,
+            is_featured=True,
+        )
+    return services
+
+
+@override_settings(ROOT_URLCONF='services.urls', CATALOG_SNAPSHOT_ENABLED=False)
+class CatalogQueryBudgetTests(TestCase):
+    """Every catalog endpoint runs a fixed number of queries, whatever the page size."""
+
+    def assertQueryBudget(self, budget, url_for_size):
+        for size in (1, 8):
+            with self.subTest(size=size):
+                Service.objects.all().delete()
+                ServicePackage.objects.all().delete()
+                ServiceCategory.objects.all().delete()
+                cache.clear()
+                url = url_for_size(create_catalog(size))
+                with self.assertNumQueries(budget):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_service_list(self):
+        self.assertQueryBudget(4, lambda services: reverse('service-list'))
+
+    def test_service_detail(self):
+        self.assertQueryBudget(
+            3, lambda services: reverse('service-detail', args=[services[0].slug])
+        )
+
+    def test_service_features(self):
+        self.assertQueryBudget(
+            2, lambda services: reverse('service-features', args=[services[0].slug])
+        )
+
+    # Package budgets include one pricing aggregate, since the cache starts cold.
+    def test_package_list(self):
+        self.assertQueryBudget(7, lambda services: reverse('servicepackage-list'))
+
+    def test_package_detail(self):
+        self.assertQueryBudget(
+            6, lambda services: reverse(
+                'servicepackage-detail', args=[ServicePackage.objects.first().slug]
+            )
+        )
+
+    def test_package_services(self):
+        self.assertQueryBudget(
+            4, lambda services: reverse(
+                'servicepackage-services', args=[ServicePackage.objects.first().slug]
+            )
+        )
+
+    def test_package_features(self):
+        self.assertQueryBudget(
+            2, lambda services: reverse(
+                'servicepackage-features', args=[ServicePackage.objects.first().slug]
+            )
+        )
+
+    # The featured budgets include one ETag aggregate per source model.
+    def test_featured_services(self):
+        self.assertQueryBudget(3 + 2, lambda services: reverse('featured-services'))
+
+    def test_featured_packages(self):
+        self.assertQueryBudget(6 + 2, lambda services: reverse('featured-packages'))
+
+    def test_featured_testimonials(self):
+        self.assertQueryBudget(10 + 3, lambda services: reverse('featured-testimonials'))
+
+
+@override_settings(ROOT_URLCONF='services.urls')
+class CatalogSnapshotTests(TestCase):
+    """Public catalog reads are served from the in-memory snapshot."""
+
+    def setUp(self):
+        # A fresh cache means a fresh snapshot version for this test's data.
+        cache.clear()
+        self.services = create_catalog(3)
+        # Warm the snapshot and the featured response caches.
+        for name in ('service-list', 'featured-services', 'featured-packages'):
+            self.client.get(reverse(name))
+
+    def test_reads_run_no_queries(self):
+        urls = [
+            reverse('servicecategory-list'),
+            reverse('service-list'),
+            reverse('service-list') + '?category=resumes',
+            reverse('service-detail', args=[self.services[0].slug]),
+            reverse('servicepackage-list'),
+            reverse('servicepackage-detail', args=[ServicePackage.objects.first().slug]),
+            reverse('featured-services'),
+            reverse('featured-packages'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with self.assertNumQueries(0):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_unknown_slug_is_404(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('service-detail', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_category_filter(self):
+        response = self.client.get(reverse('service-list'), {'category': 'resumes'})
+        self.assertEqual(response.json()['count'], 3)
+        response = self.client.get(reverse('service-list'), {'category': 'missing'})
+        self.assertEqual(response.json()['count'], 0)
+
+    def test_save_rebuilds_snapshot(self):
+        service = self.services[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            service.name = 'Renamed'
+            service.save()
+        response = self.client.get(reverse('service-detail', args=[service.slug]))
+        self.assertEqual(response.json()['name'], 'Renamed')
+
+    @override_settings(DEBUG=False, ALLOWED_HOSTS=['api.example.com'], SITE_URL='https://www.example.com')
+    def test_image_urls_match_database_reads(self):
+        Service.objects.filter(pk=self.services[0].pk).update(image='services/cv.jpg')
+        ServiceCategory.objects.update(icon='categories/resumes.png')
+        ImageVariant.objects.create(
+            source='services/cv.jpg', format='webp', width=320, height=200, file='variants/services/cv.320w.webp',
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            catalog_snapshot.invalidate()
+            featured_services_cache.invalidate()
+        response = self.client.get(reverse('service-list'), HTTP_HOST='api.example.com')
+        self.assertEqual(response.status_code, 200)
+        snapshot = {row['id']: row for row in response.json()['results']}
+        # A search is answered from the database.
+        searched = self.client.get(
+            reverse('service-list'), {'search': 'service'}, HTTP_HOST='api.example.com'
+        ).json()['results']
+        row = {row['id']: row for row in searched}[self.services[0].pk]
+        self.assertEqual(row['image'], 'http://api.example.com/media/services/cv.jpg')
+        self.assertEqual(row['image_variants'], {'webp': 'http://api.example.com/media/variants/services/cv.320w.webp 320w'})
+        for field in ('image', 'image_variants', 'category'):
+            self.assertEqual(snapshot[self.services[0].pk][field], row[field])
+        self.assertEqual(
+            self.client.get(reverse('featured-services'), HTTP_HOST='api.example.com').json()[0]['category']['icon'],
+            'http://api.example.com/media/categories/resumes.png',
+        )
+
+    def test_deactivated_service_leaves_snapshot(self):
+        service = self.services[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            service.is_active = False
+            service.save()
+        response = self.client.get(reverse('service-detail', args=[service.slug]))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(ROOT_URLCONF='services.urls')
+class FeaturedResponseCacheTests(TestCase):
+    """Featured endpoints are served from rendered bytes and honour If-None-Match."""
+
+    def setUp(self):
+        cache.clear()
+        self.services = create_catalog(2)
+
+    def test_conditional_requests(self):
+        for name in ('featured-services', 'featured-packages', 'featured-testimonials'):
+            with self.subTest(name=name):
+                url = reverse(name)
+                first = self.client.get(url)
+                etag = first['ETag']
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(second.content, first.content)
+                with self.assertNumQueries(0):
+                    not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertEqual(not_modified['ETag'], etag)
+
+    def test_save_invalidates_dependent_responses(self):
+        etags = {
+            name: self.client.get(reverse(name))['ETag']
+            for name in ('featured-services', 'featured-packages', 'featured-testimonials')
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            Testimonial.objects.create(name='New', content='Good', is_featured=True)
+        self.assertEqual(self.client.get(reverse('featured-services'))['ETag'], etags['featured-services'])
+        self.assertEqual(self.client.get(reverse('featured-packages'))['ETag'], etags['featured-packages'])
+        response = self.client.get(reverse('featured-testimonials'), HTTP_IF_NONE_MATCH=etags['featured-testimonials'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ServiceFeature.objects.create(service=self.services[0], name='Extra')
+        for name, etag in etags.items():
+            with self.subTest(name=name):
+                self.assertNotEqual(self.client.get(reverse(name))['ETag'], etag)
+
+
+@override_settings(ROOT_URLCONF='services.urls')
+class SparseFieldsetTests(TestCase):
+    """?fields= and ?expand= trim both the payload and the queries behind it."""
+
+    def setUp(self):
+        cache.clear()
+        create_catalog(2)
+
+    def get_first(self, url, params):
+        return self.client.get(url, params).json()['results'][0]
+
+    def test_fields_from_database(self):
+        with override_settings(CATALOG_SNAPSHOT_ENABLED=False):
+            with self.assertNumQueries(2) as context:
+                row = self.get_first(reverse('service-list'), {'fields': 'name,slug,price,image'})
+        self.assertEqual(set(row), {'name', 'slug', 'price', 'image'})
+        self.assertNotIn('description', context.captured_queries[1]['sql'])
+
+    def test_expand_collapses_relations_from_database(self):
+        with override_settings(CATALOG_SNAPSHOT_ENABLED=False):
+            with self.assertNumQueries(5):
+                row = self.get_first(reverse('servicepackage-list'), {'expand': 'features'})
+        self.assertTrue(all(isinstance(service, int) for service in row['services']))
+        self.assertEqual(row['features'][0]['name'], 'Bundle feature')
+
+    def test_snapshot_matches_database(self):
+        params = {'fields': 'id,name,services,features', 'expand': 'features'}
+        with override_settings(CATALOG_SNAPSHOT_ENABLED=False):
+            expected = self.client.get(reverse('servicepackage-list'), params).json()
+        self.client.get(reverse('servicepackage-list'))
+        with self.assertNumQueries(0):
+            actual = self.client.get(reverse('servicepackage-list'), params).json()
+        self.assertEqual(actual, expected)
+
+
+class PackagePricingTests(TestCase):
+    """Package pricing is computed in bulk, cached and kept current."""
+
+    def setUp(self):
+        cache.clear()
+        self.services = create_catalog(3)
+        self.package = ServicePackage.objects.first()
+
+    def test_pricing_against_services(self):
+        pricing = get_package_pricing([self.package.pk])[self.package.pk]
+        self.assertEqual(pricing['effective_price'], Decimal('250.00'))
+        self.assertEqual(pricing['services_total'], Decimal('300.00'))
+        self.assertEqual(pricing['savings'], Decimal('50.00'))
+        self.assertEqual(pricing['savings_percent'], Decimal('16.67'))
+        self.assertTrue(pricing['has_savings'])
+        self.assertFalse(pricing['is_discounted'])
+
+    def test_is_discounted_matches_the_model(self):
+        self.package.discounted_price = Decimal('320.00')
+        self.package.save()
+        self.assertFalse(refresh_package_pricing([self.package.pk])[self.package.pk]['is_discounted'])
+        self.package.discounted_price = Decimal('200.00')
+        self.package.save()
+        pricing = refresh_package_pricing([self.package.pk])[self.package.pk]
+        self.assertEqual((pricing['is_discounted'], pricing['has_savings']), (self.package.is_discounted, True))
+
+    def test_one_query_for_every_package(self):
+        package_ids = list(ServicePackage.objects.values_list('pk', flat=True))
+        with self.assertNumQueries(1):
+            get_package_pricing([self.package.pk])
+        with self.assertNumQueries(0):
+            pricing = get_package_pricing(package_ids)
+        self.assertEqual(len(pricing), 3)
+
+    def test_service_price_change_reprices_packages(self):
+        get_package_pricing([self.package.pk])
+        self.services[0].discounted_price = Decimal('40.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.services[0].save()
+        with self.assertNumQueries(0):
+            pricing = get_package_pricing([self.package.pk])[self.package.pk]
+        self.assertEqual(pricing['services_total'], Decimal('240.00'))
+        self.assertFalse(pricing['has_savings'])
+
+    def test_membership_change_reprices_package(self):
+        get_package_pricing([self.package.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.package.services.remove(self.services[2])
+        pricing = get_package_pricing([self.package.pk])[self.package.pk]
+        self.assertEqual(pricing['services_total'], Decimal('200.00'))
+        self.assertEqual(pricing['savings'], Decimal('-50.00'))
+
+    @override_settings(ROOT_URLCONF='services.urls', CATALOG_SNAPSHOT_ENABLED=False)
+    def test_exposed_on_package_endpoints(self):
+        row = self.client.get(reverse('servicepackage-detail', args=[self.package.slug])).json()
+        self.assertEqual(row['pricing']['savings'], '50.00')
+
+
+class RatingSummaryTests(TestCase):
+    """Rating summaries follow testimonial changes and match a full rebuild."""
+
+    def setUp(self):
+        cache.clear()
+        self.services = create_catalog(2)
+        self.package = ServicePackage.objects.first()
+
+    def summary(self, service):
+        return ServiceRating.objects.get(pk=service.pk)
+
+    def test_incremental_updates(self):
+        testimonial = Testimonial.objects.create(
+            name='Client', content='Fine', rating=3, service=self.services[0]
+        )
+        summary = self.summary(self.services[0])
+        self.assertEqual((summary.count, summary.total), (2, 8))
+        self.assertEqual(summary.average, Decimal('4.00'))
+        self.assertEqual(summary.histogram, {1: 0, 2: 0, 3: 1, 4: 0, 5: 1})
+
+        testimonial.rating = 1
+        testimonial.service = self.services[1]
+        testimonial.save()
+        self.assertEqual(self.summary(self.services[0]).histogram[3], 0)
+        self.assertEqual(self.summary(self.services[1]).histogram[1], 1)
+
+        testimonial.delete()
+        summary = self.summary(self.services[1])
+        self.assertEqual((summary.count, summary.total), (1, 5))
+
+    def test_rebuild_matches_incremental(self):
+        Testimonial.objects.create(name='Client', content='Fine', rating=2, package=self.package)
+        expected = list(PackageRating.objects.order_by('pk').values())
+        PackageRating.objects.all().delete()
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.assertEqual(list(PackageRating.objects.order_by('pk').values()), expected)
+
+    @override_settings(ROOT_URLCONF='services.urls', CATALOG_SNAPSHOT_ENABLED=False)
+    def test_exposed_without_summary_row(self):
+        ServiceRating.objects.all().delete()
+        row = self.client.get(reverse('service-detail', args=[self.services[0].slug])).json()
+        self.assertEqual(row['rating']['count'], 0)
+        self.assertIsNone(row['rating']['average'])
+
+
+@override_settings(ROOT_URLCONF='services.urls')
+class CatalogFacetTests(TestCase):
+    """Facet counts come from one grouped query and are cached per filter combination."""
+
+    def setUp(self):
+        cache.clear()
+        self.services = create_catalog(4)
+        other = ServiceCategory.objects.create(name='Interviews')
+        Service.objects.create(
+            name='Mock interview', short_description='Practice', description='<p>Long</p>',
+            category=other, price=Decimal('600.00'), discounted_price=Decimal('45.00'), level='executive',
+        )
+        self.url = reverse('service-facets')
+
+    def test_counts(self):
+        # One grouped query plus the ETag aggregate per source model.
+        with self.assertNumQueries(1 + 2):
+            facets = self.client.get(self.url).json()
+        self.assertEqual(facets['total'], 5)
+        self.assertEqual(
+            [(category['slug'], category['count']) for category in facets['category']],
+            [('interviews', 1), ('resumes', 4)],
+        )
+        levels = {level['value']: level['count'] for level in facets['level']}
+        self.assertEqual(levels, {'entry': 0, 'mid': 0, 'executive': 1, 'all': 4})
+        bands = {band['key']: band['count'] for band in facets['price']}
+        self.assertEqual(bands['under-50'], 1)
+        self.assertEqual(bands['100-250'], 4)
+        self.assertEqual((facets['featured'], facets['discounted']), (4, 1))
+
+    def test_filters_match_list(self):
+        for params in ({'category': 'interviews'}, {'tag': 'tag-1'}, {'search': 'interview'}):
+            with self.subTest(params=params):
+                facets = self.client.get(self.url, params).json()
+                with override_settings(CATALOG_SNAPSHOT_ENABLED=False):
+                    listed = self.client.get(reverse('service-list'), params).json()
+                self.assertEqual(facets['total'], listed['count'])
+
+    def test_cached_per_filter_combination(self):
+        self.client.get(self.url)
+        self.client.get(self.url, {'category': 'resumes'})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).json()['total'], 5)
+            self.assertEqual(self.client.get(self.url, {'category': 'resumes'}).json()['total'], 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.services[0].is_active = False
+            self.services[0].save()
+        self.assertEqual(self.client.get(self.url).json()['total'], 4)
+
+
+@override_settings(ROOT_URLCONF='services.urls')
+class TagIndexTests(TestCase):
+    """Multi-tag filters run on the in-memory posting index."""
+
+    def setUp(self):
+        cache.clear()
+        self.services = create_catalog(4)
+        self.services[0].tags.add('ats', 'tech')
+        self.services[1].tags.add('ats')
+        self.services[2].tags.add('tech')
+        self.services[3].level = 'executive'
+        self.services[3].save()
+        self.services[3].tags.add('ats')
+        self.url = reverse('service-tags')
+
+    def get(self, **params):
+        return self.client.get(self.url, params).json()
+
+    def test_and_or(self):
+        ids = [service.id for service in self.services]
+        self.assertEqual(self.get(tags='ats,tech')['ids'], [ids[0]])
+        self.assertEqual(self.get(tags='ats,tech', tag_mode='or')['ids'], [ids[0], ids[1], ids[2], ids[3]])
+        self.assertEqual(self.get(tags='ats', level='executive')['ids'], [ids[3]])
+        self.assertEqual(self.get(tags='ats', category='missing')['count'], 0)
+
+    def test_counts_for_remaining_tags(self):
+        result = self.get(tags='ats')
+        self.assertEqual(result['count'], 3)
+        counts = {tag['name']: tag['count'] for tag in result['tags']}
+        self.assertEqual(counts, {'ats': 3, 'resume': 3, 'tech': 1, 'tag-0': 1, 'tag-1': 1, 'tag-3': 1})
+        self.assertEqual(result['tags'][0], {'name': 'ats', 'count': 3})
+
+    def test_warm_index_runs_no_queries(self):
+        self.get(tags='ats')
+        with self.assertNumQueries(0):
+            self.get(tags='ats,tech', tag_mode='or', level='all')
+
+    def test_list_filters_through_index(self):
+        with override_settings(CATALOG_SNAPSHOT_ENABLED=False):
+            listed = self.client.get(reverse('service-list'), {'tags': 'ats,tech'}).json()
+            single = self.client.get(reverse('service-list'), {'tag': 'tech'}).json()
+        self.assertEqual([row['id'] for row in listed['results']], [self.services[0].id])
+        self.assertEqual(single['count'], 2)
+
+    def test_tag_change_rebuilds_index(self):
+        self.get(tags='tech')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.services[1].tags.add('tech')
+        self.assertEqual(self.get(tags='ats,tech')['count'], 2)
+
+    def test_tag_case_follows_taggit(self):
+        ids = [service.id for service in self.services]
+        self.assertEqual(self.get(tags='ATS,Tech')['ids'], [ids[0]])
+        with override_settings(TAGGIT_CASE_INSENSITIVE=False):
+            cache.clear()
+            self.assertEqual(self.get(tags='ATS,Tech')['count'], 0)
+
+
+@override_settings(ROOT_URLCONF='services.urls', CATALOG_SNAPSHOT_ENABLED=False)
+class CatalogSearchTests(TestCase):
+    """Catalog search ranks name hits first and follows every save and delete."""
+
+    def setUp(self):
+        category = ServiceCategory.objects.create(name='Writing')
+        self.review = Service.objects.create(
+            name='Resume review', short_description='Line by line', description='<p>Feedback in two days</p>',
+            category=category, price=Decimal('80.00'),
+        )
+        self.letter = Service.objects.create(
+            name='Cover letter', short_description='Tailored',
+            description='<p>Includes a <strong>resume</strong> check</p>',
+            category=category, price=Decimal('60.00'),
+        )
+
+    def search(self, query, url='service-list'):
+        return [row['name'] for row in self.client.get(reverse(url), {'search': query}).json()['results']]
+
+    def indexed(self, service):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT description FROM {service_index.fts_table} WHERE rowid = %s', [service.pk])
+            return cursor.fetchall()
+
+    def test_name_hits_rank_first(self):
+        self.assertEqual(self.search('resume'), ['Resume review', 'Cover letter'])
+        self.assertEqual(self.search('resu chec'), ['Cover letter'])
+
+    def test_html_is_stripped(self):
+        self.assertEqual(self.indexed(self.letter), [('Includes a resume check',)])
+        self.assertEqual(self.search('strong'), [])
+
+    def test_saves_and_deletes_update_the_index(self):
+        self.review.name = 'Profile audit'
+        self.review.save()
+        self.assertEqual(self.search('audit'), ['Profile audit'])
+        self.assertEqual(self.search('resume'), ['Cover letter'])
+
+        self.letter.delete()
+        self.assertEqual(self.indexed(self.letter), [])
+        self.assertEqual(self.search('resume'), [])
+
+    def test_empty_queries_match_nothing(self):
+        for query in ('', '  ', '?!-'):
+            with self.subTest(query=query), self.assertNumQueries(0):
+                self.assertEqual(list(service_index.search(Service.objects.all(), query)), [])
+
+    def test_packages(self):
+        ServicePackage.objects.create(
+            name='Job hunt bundle', package_type='professional', short_description='Everything',
+            description='<p>Resume and letter</p>', price=Decimal('120.00'),
+        )
+        self.assertEqual(self.search('bundle', url='servicepackage-list'), ['Job hunt bundle'])
+        self.assertEqual(self.search('letter', url='servicepackage-list'), ['Job hunt bundle'])
+
+    def test_rebuild_search_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {service_index.fts_table}')
+        self.assertEqual(self.search('resume'), [])
+
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+
+        self.assertIn('Indexed 2 services.', out.getvalue())
+        self.assertEqual(self.search('resume'), ['Resume review', 'Cover letter'])
+
+
+@override_settings(ROOT_URLCONF='services.urls', CATALOG_SNAPSHOT_ENABLED=False)
+class EffectivePriceTests(TestCase):
+    """Price filters and ordering use the stored effective price."""
+
+    def setUp(self):
+        cache.clear()
+        self.category = ServiceCategory.objects.create(name='Resumes')
+        self.cheap = self.create('Cheap', '40.00')
+        self.discounted = self.create('Discounted', '300.00', discounted_price='90.00')
+        self.dear = self.create('Dear', '200.00', discounted_price='250.00')
+
+    def create(self, name, price, discounted_price=None):
+        return Service.objects.create(
+            name=name, short_description='Short', description='Long', category=self.category,
+            price=Decimal(price), discounted_price=discounted_price and Decimal(discounted_price),
+        )
+
+    def names(self, url, **params):
+        return [row['name'] for row in self.client.get(url, params).json()['results']]
+
+    def test_maintained_on_save(self):
+        self.assertEqual(self.discounted.effective_price, Decimal('90.00'))
+        self.assertEqual(self.dear.effective_price, Decimal('200.00'))
+        self.dear.discounted_price = Decimal('150.00')
+        self.dear.save(update_fields=['discounted_price'])
+        self.dear.refresh_from_db()
+        self.assertEqual(self.dear.effective_price, Decimal('150.00'))
+
+    def test_filter_and_order(self):
+        url = reverse('service-list')
+        self.assertEqual(self.names(url, ordering='effective_price'), ['Cheap', 'Discounted', 'Dear'])
+        self.assertEqual(self.names(url, ordering='-effective_price', max_price='100'), ['Discounted', 'Cheap'])
+        self.assertEqual(self.names(url, min_price='50', max_price='100'), ['Discounted'])
+        self.assertEqual(self.client.get(url, {'min_price': 'cheap'}).status_code, 400)
+
+    def test_packages(self):
+        package = ServicePackage.objects.create(
+            name='Bundle', package_type='entry', short_description='Short', description='Long',
+            price=Decimal('120.00'), discounted_price=Decimal('99.00'),
+        )
+        self.assertEqual(package.effective_price, Decimal('99.00'))
+        self.assertEqual(self.names(reverse('servicepackage-list'), max_price='99'), ['Bundle'])
+        self.assertEqual(self.names(reverse('servicepackage-list'), max_price='98.99'), [])
@@ -1,23 +1,101 @@
-from django.db.models import Q
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Prefetch
+from django.http import Http404
 
 from rest_framework import viewsets, permissions, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 
+from core.mixins import SparseFieldsetMixin
+from core.serializers import parse_field_list, select_fields
 from .models import ServiceCategory, Service, ServicePackage, ServiceFeature, Testimonial
 from .serializers import (
     ServiceCategorySerializer, ServiceSerializer, ServicePackageSerializer,
-    ServiceFeatureSerializer, TestimonialSerializer
+    ServiceFeatureSerializer, PackageFeatureSerializer, TestimonialSerializer
+)
+from .caching import (
+    featured_services_cache, featured_packages_cache, featured_testimonials_cache, catalog_facets_cache
 )
+from .facets import compute_facets
+from .search import service_index, package_index
+from .snapshot import absolute_urls, catalog_snapshot
+from .tag_index import tag_index
+
+
+def filter_by_price(queryset, query_params):
+    """Apply `min_price`/`max_price` on the stored, indexed effective price.
+    
+    Sorting by it is `?ordering=effective_price`, through the default OrderingFilter.
+    """
+    for param, lookup in (('min_price', 'gte'), ('max_price', 'lte')):
+        value = query_params.get(param, None)
+        if value:
+            try:
+                value = Decimal(value)
+            except InvalidOperation:
+                value = None
+            if value is None or not value.is_finite():
+                raise ValidationError({param: 'A valid number is required.'})
+            queryset = queryset.filter(**{f'effective_price__{lookup}': value})
+    return queryset
+
+
+class CatalogSnapshotMixin:
+    """Answer public list and retrieve requests from the in-memory catalog snapshot.
+    
+    Staff users and requests with filters the snapshot cannot answer fall
+    through to the regular database-backed implementation.
+    """
+    snapshot_section = None
+    snapshot_query_params = {'page', 'format', 'fields', 'expand'}
+    
+    def use_snapshot(self, request):
+        return (
+            catalog_snapshot.enabled
+            and not request.user.is_staff
+            and set(request.query_params) <= self.snapshot_query_params
+        )
+    
+    def get_snapshot_rows(self, document):
+        return document[self.snapshot_section]
+    
+    def select_snapshot_fields(self, rows):
+        """Apply ?fields= and ?expand= to pre-serialized rows."""
+        fields, expand = self.get_field_selection()
+        if fields is None and expand is None:
+            return rows
+        expandable_fields = getattr(self.get_serializer_class().Meta, 'expandable_fields', ())
+        return [select_fields(row, fields, expand, expandable_fields) for row in rows]
+    
+    def list(self, request, *args, **kwargs):
+        if not self.use_snapshot(request):
+            return super().list(request, *args, **kwargs)
+        rows = self.get_snapshot_rows(catalog_snapshot.get())
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(absolute_urls(self.select_snapshot_fields(page), request))
+        return Response(absolute_urls(self.select_snapshot_fields(rows), request))
+    
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_snapshot(request):
+            return super().retrieve(request, *args, **kwargs)
+        by_slug = catalog_snapshot.get()[f'{self.snapshot_section}_by_slug']
+        row = by_slug.get(kwargs[self.lookup_field])
+        if row is None:
+            raise Http404
+        return Response(absolute_urls(self.select_snapshot_fields([row])[0], request))
 
 
-class ServiceCategoryViewSet(viewsets.ModelViewSet):
+class ServiceCategoryViewSet(CatalogSnapshotMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for the ServiceCategory model."""
     queryset = ServiceCategory.objects.all()
     serializer_class = ServiceCategorySerializer
     lookup_field = 'slug'
+    snapshot_section = 'categories'
     
     def get_permissions(self):
         """Set permissions based on action."""
@@ -35,18 +113,20 @@ class ServiceCategoryViewSet(viewsets.ModelViewSet):
         if not self.request.user.is_staff:
             queryset = queryset.filter(is_active=True)
             
-        return queryset
+        return self.restrict_queryset(queryset)
 
 
-class ServiceViewSet(viewsets.ModelViewSet):
+class ServiceViewSet(CatalogSnapshotMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for the Service model."""
     queryset = Service.objects.all()
     serializer_class = ServiceSerializer
     lookup_field = 'slug'
+    snapshot_section = 'services'
+    snapshot_query_params = CatalogSnapshotMixin.snapshot_query_params | {'category'}
     
     def get_permissions(self):
         """Set permissions based on action."""
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'features', 'facets', 'tags']:
             permission_classes = [AllowAny]
         else:
             permission_classes = [IsAdminUser]
@@ -54,8 +134,11 @@ class ServiceViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filter queryset based on user permissions and query parameters."""
-        queryset = Service.objects.all()
-        
+        queryset = self.filter_services(Service.objects.all())
+        return self.setup_eager_loading(queryset)
+    
+    def filter_services(self, queryset):
+        """Apply the list filters shared by the list and facets endpoints."""
         # Filter active services for non-admin users
         if not self.request.user.is_staff:
             queryset = queryset.filter(is_active=True)
@@ -65,21 +148,45 @@ class ServiceViewSet(viewsets.ModelViewSet):
         if category_slug:
             queryset = queryset.filter(category__slug=category_slug)
         
-        # Filter by tag
-        tag = self.request.query_params.get('tag', None)
-        if tag:
-            queryset = queryset.filter(tags__name__in=[tag])
+        # Filter by tags and level through the in-memory posting index
+        tags, mode = self.get_tag_filter()
+        level = self.request.query_params.get('level', None)
+        if tags or level:
+            postings = tag_index.get()
+            bitmap = postings.match(tags, mode, level=level, active_only=False)
+            queryset = queryset.filter(pk__in=postings.service_ids(bitmap))
         
-        # Search by name or description
+        # Full-text search, best matches first
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | 
-                Q(description__icontains=search) |
-                Q(short_description__icontains=search)
-            )
-            
-        return queryset
+            queryset = service_index.search(queryset, search)
+        
+        return filter_by_price(queryset, self.request.query_params)
+    
+    def get_tag_filter(self):
+        """Return the requested tags and whether all (`and`) or any (`or`) must match.
+        
+        `tags` takes a comma-separated list; the older single `tag` is still accepted.
+        """
+        tags = parse_field_list(self.request.query_params.get('tags', None)) or set()
+        tag = self.request.query_params.get('tag', None)
+        if tag:
+            tags.add(tag)
+        mode = 'or' if self.request.query_params.get('tag_mode', None) == 'or' else 'and'
+        return sorted(tags), mode
+    
+    def setup_eager_loading(self, queryset):
+        """Shape the queryset for whatever the current action serializes."""
+        if self.action == 'features':
+            return queryset.prefetch_related('features')
+        queryset = self.get_serializer_class().setup_eager_loading(queryset, *self.get_field_selection())
+        return self.restrict_queryset(queryset)
+    
+    def get_snapshot_rows(self, document):
+        category_slug = self.request.query_params.get('category', None)
+        if category_slug:
+            return document['services_by_category'].get(category_slug, [])
+        return document['services']
     
     @action(detail=True, methods=['get'])
     def features(self, request, slug=None):
@@ -88,17 +195,42 @@ class ServiceViewSet(viewsets.ModelViewSet):
         features = service.features.all()
         serializer = ServiceFeatureSerializer(features, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    @catalog_facets_cache
+    def facets(self, request):
+        """Get category, level, price band, featured and discounted counts for the current filters."""
+        queryset = self.filter_services(Service.objects.all())
+        return Response(compute_facets(queryset))
+    
+    @action(detail=False, methods=['get'])
+    def tags(self, request):
+        """Get the services matching the tag, category and level filters, with a count per tag among them."""
+        tags, mode = self.get_tag_filter()
+        postings = tag_index.get()
+        bitmap = postings.match(
+            tags, mode,
+            category=request.query_params.get('category', None),
+            level=request.query_params.get('level', None),
+            active_only=not request.user.is_staff,
+        )
+        return Response({
+            'count': bitmap.bit_count(),
+            'ids': postings.service_ids(bitmap),
+            'tags': [{'name': tag, 'count': count} for tag, count in postings.tag_counts(bitmap)],
+        })
 
 
-class ServicePackageViewSet(viewsets.ModelViewSet):
+class ServicePackageViewSet(CatalogSnapshotMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for the ServicePackage model."""
     queryset = ServicePackage.objects.all()
     serializer_class = ServicePackageSerializer
     lookup_field = 'slug'
+    snapshot_section = 'packages'
     
     def get_permissions(self):
         """Set permissions based on action."""
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'services', 'features']:
             permission_classes = [AllowAny]
         else:
             permission_classes = [IsAdminUser]
@@ -112,16 +244,23 @@ class ServicePackageViewSet(viewsets.ModelViewSet):
         if not self.request.user.is_staff:
             queryset = queryset.filter(is_active=True)
         
-        # Search by name or description
+        # Full-text search, best matches first
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | 
-                Q(description__icontains=search) |
-                Q(short_description__icontains=search)
-            )
-            
-        return queryset
+            queryset = package_index.search(queryset, search)
+        
+        queryset = filter_by_price(queryset, self.request.query_params)
+        return self.setup_eager_loading(queryset)
+    
+    def setup_eager_loading(self, queryset):
+        """Shape the queryset for whatever the current action serializes."""
+        if self.action == 'services':
+            services = ServiceSerializer.setup_eager_loading(Service.objects.all())
+            return queryset.prefetch_related(Prefetch('services', queryset=services))
+        if self.action == 'features':
+            return queryset.prefetch_related('features')
+        queryset = self.get_serializer_class().setup_eager_loading(queryset, *self.get_field_selection())
+        return self.restrict_queryset(queryset)
     
     @action(detail=True, methods=['get'])
     def services(self, request, slug=None):
@@ -136,11 +275,11 @@ class ServicePackageViewSet(viewsets.ModelViewSet):
         """Get features for a package."""
         package = self.get_object()
         features = package.features.all()
-        serializer = ServiceFeatureSerializer(features, many=True)
+        serializer = PackageFeatureSerializer(features, many=True)
         return Response(serializer.data)
 
 
-class TestimonialViewSet(viewsets.ModelViewSet):
+class TestimonialViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for the Testimonial model."""
     queryset = Testimonial.objects.all()
     serializer_class = TestimonialSerializer
@@ -157,10 +296,6 @@ class TestimonialViewSet(viewsets.ModelViewSet):
         """Filter queryset based on user permissions and query parameters."""
         queryset = Testimonial.objects.all()
         
-        # Filter active testimonials for non-admin users
-        if not self.request.user.is_staff:
-            queryset = queryset.filter(is_active=True)
-        
         # Filter by service
         service_slug = self.request.query_params.get('service', None)
         if service_slug:
@@ -171,16 +306,22 @@ class TestimonialViewSet(viewsets.ModelViewSet):
         if package_slug:
             queryset = queryset.filter(package__slug=package_slug)
             
-        return queryset
+        queryset = TestimonialSerializer.setup_eager_loading(queryset, *self.get_field_selection())
+        return self.restrict_queryset(queryset)
 
 
 class FeaturedServicesView(APIView):
     """View for getting featured services."""
     permission_classes = [AllowAny]
     
+    @featured_services_cache
     def get(self, request):
-        services = Service.objects.filter(is_featured=True, is_active=True)
-        serializer = ServiceSerializer(services, many=True)
+        if catalog_snapshot.enabled:
+            return Response(absolute_urls(catalog_snapshot.get()['featured_services'], request))
+        services = ServiceSerializer.setup_eager_loading(
+            Service.objects.filter(is_featured=True, is_active=True)
+        )
+        serializer = ServiceSerializer(services, many=True, context={'request': request})
         return Response(serializer.data)
 
 
@@ -188,9 +329,14 @@ class FeaturedPackagesView(APIView):
     """View for getting featured packages."""
     permission_classes = [AllowAny]
     
+    @featured_packages_cache
     def get(self, request):
-        packages = ServicePackage.objects.filter(is_featured=True, is_active=True)
-        serializer = ServicePackageSerializer(packages, many=True)
+        if catalog_snapshot.enabled:
+            return Response(absolute_urls(catalog_snapshot.get()['featured_packages'], request))
+        packages = ServicePackageSerializer.setup_eager_loading(
+            ServicePackage.objects.filter(is_featured=True, is_active=True)
+        )
+        serializer = ServicePackageSerializer(packages, many=True, context={'request': request})
         return Response(serializer.data)
 
 
@@ -198,7 +344,10 @@ class FeaturedTestimonialsView(APIView):
     """View for getting featured testimonials."""
     permission_classes = [AllowAny]
     
+    @featured_testimonials_cache
     def get(self, request):
-        testimonials = Testimonial.objects.filter(is_featured=True, is_active=True)
+        testimonials = TestimonialSerializer.setup_eager_loading(
+            Testimonial.objects.filter(is_featured=True)
+        )
         serializer = TestimonialSerializer(testimonials, many=True)
         return Response(serializer.data)
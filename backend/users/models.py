@@ -48,6 +48,10 @@ class Notification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Backs keyset pagination of a user's notifications
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_user_keyset'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.user.username}"
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
+from imaging.fields import ImageVariantsField
 from .models import UserProfile, Notification, UserPreference, SavedService, SavedPackage
 
 
@@ -16,12 +17,13 @@ class UserSerializer(serializers.ModelSerializer):
 class UserProfileSerializer(serializers.ModelSerializer):
     """Serializer for the UserProfile model."""
     user = UserSerializer(read_only=True)
+    profile_picture_variants = ImageVariantsField(source='profile_picture')
     
     class Meta:
         model = UserProfile
         fields = [
-            'id', 'user', 'bio', 'profile_picture', 'phone_number', 'job_title', 
-            'company', 'industry', 'years_of_experience', 'linkedin_url', 
+            'id', 'user', 'bio', 'profile_picture', 'profile_picture_variants', 
+            'phone_number', 'job_title', 'company', 'industry', 'years_of_experience', 'linkedin_url', 
             'website_url', 'twitter_url', 'address_line1', 'address_line2', 
             'city', 'state', 'postal_code', 'country', 'timezone', 'created_at', 
             'updated_at'
@@ -35,8 +37,7 @@ class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = [
-            'id', 'user', 'title', 'message', 'notification_type', 'related_object_id',
-            'related_object_type', 'is_read', 'created_at'
+            'id', 'user', 'title', 'message', 'notification_type', 'is_read', 'created_at'
         ]
         read_only_fields = ['created_at']
 
@@ -1,3 +1,39 @@
-from django.test import TestCase
+from datetime import datetime, timezone
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .models import Notification
+
+
+@override_settings(ROOT_URLCONF='users.urls')
+class NotificationKeysetPaginationTests(TestCase):
+    """Notification cursors walk every notification once, both ways, newest first."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', is_staff=True)
+        for i in range(5):
+            Notification.objects.create(
+                user=self.admin, notification_type='system', title=f'Notice {i}', message='Hello'
+            )
+        # Every notification shares a timestamp, so only the id orders them.
+        Notification.objects.update(created_at=datetime(2030, 1, 1, tzinfo=timezone.utc))
+        self.expected = list(Notification.objects.order_by('-id').values_list('pk', flat=True))
+        self.client.force_login(self.admin)
+
+    def ids(self, response):
+        return [notification['id'] for notification in response.json()['results']]
+
+    def test_forward_and_back(self):
+        first = self.client.get(reverse('notification-list'), {'pagination': 'cursor', 'page_size': 3})
+        second = self.client.get(first.json()['next'])
+        self.assertEqual(self.ids(first) + self.ids(second), self.expected)
+        self.assertIsNone(second.json()['next'])
+        self.assertEqual(self.ids(self.client.get(second.json()['previous'])), self.ids(first))
+
+    def test_invalid_cursor_and_approximate_count(self):
+        self.assertEqual(self.client.get(reverse('notification-list'), {'cursor': 'tampered'}).status_code, 404)
+        data = self.client.get(reverse('notification-list'), {'pagination': 'cursor', 'count': 'approximate'}).json()
+        self.assertIn('approximate_count', data)
+        self.assertEqual([notification['id'] for notification in data['results']], self.expected)
@@ -12,6 +12,7 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, AllowAny
 
+from core.pagination import KeysetPagination
 from .models import UserProfile, Notification, UserPreference, SavedService, SavedPackage
 from .serializers import (
     UserSerializer, UserProfileSerializer, NotificationSerializer, 
@@ -45,6 +46,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAdminUser]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         """Filter queryset based on user permissions."""